@@ -0,0 +1,124 @@
+"""Micro-benchmark do motor de layouts contra os antigos métodos por corretora.
+
+Uso: python -m benchmarks.benchmark_layouts [--operacoes N] [--repeticoes N]
+"""
+import argparse
+import random
+import re
+import timeit
+from datetime import datetime
+
+from models.layouts_corretoras import LAYOUTS
+
+
+# Implementação anterior (_processar_rico/_processar_agora e _extrair_taxas), mantida aqui
+# apenas como referência de desempenho.
+def _legado_extrair_taxas(texto):
+    taxas = {
+        'Taxa de liquidação': r'Taxa de liquidação\s+([\d.,]+)',
+        'Taxa de registro': r'Taxa de Registro\s+([\d.,]+)',
+        'Emolumentos': r'Emolumentos\s+([\d.,]+)',
+        'Taxa operacional': r'Taxa Operacional\s+([\d.,]+)',
+        'Execução': r'Execução\s+([\d.,]+)',
+        'Taxa de custódia': r'Taxa de Custódia\s+([\d.,]+)',
+        'Impostos': r'Impostos\s+([\d.,]+)',
+        'IRRF': r'I.R.R.F. s/ operações\s+([\d.,]+)',
+        'Outros': r'Outros\s+([\d.,]+)'
+    }
+    taxas_extraidas = {}
+    for nome_taxa, padrao in taxas.items():
+        if match := re.search(padrao, texto):
+            taxas_extraidas[nome_taxa] = float(match.group(1).replace('.', '').replace(',', '.'))
+    return taxas_extraidas
+
+
+def _legado_processar_bovespa(texto_completo, corretora='RICO'):
+    dados_nota = {'corretora': corretora, 'operacoes': [], 'taxas': {}, 'data_pregao': None, 'numero_nota': None}
+    if match := re.search(r'Data pregão:\s*(\d{2}/\d{2}/\d{4})', texto_completo):
+        dados_nota['data_pregao'] = datetime.strptime(match.group(1), '%d/%m/%Y')
+    if match := re.search(r'Nr\. nota:\s*(\d+)', texto_completo):
+        dados_nota['numero_nota'] = match.group(1)
+    padrao_operacao = r'(\d+)\s+(\d+)\s+([CV])\s+(VISTA|FRACIONARIO)\s+(\w+)\s+(\d+)\s+([\d.,]+)\s+([\d.,]+)'
+    for match in re.finditer(padrao_operacao, texto_completo):
+        _, _, tipo, mercado, ativo, quantidade, preco, valor = match.groups()
+        dados_nota['operacoes'].append({
+            'tipo': 'Compra' if tipo == 'C' else 'Venda',
+            'ativo': ativo,
+            'quantidade': int(quantidade),
+            'preco': float(preco.replace('.', '').replace(',', '.')),
+            'valor': float(valor.replace('.', '').replace(',', '.')),
+            'mercado': mercado
+        })
+    dados_nota['taxas'] = _legado_extrair_taxas(texto_completo)
+    return dados_nota
+
+
+def _legado_em_centavos(dados_nota):
+    """Operações e taxas do resultado legado (em reais) com valores em centavos, como nos layouts."""
+    operacoes = [
+        {**operacao, 'preco': round(operacao['preco'] * 100), 'valor': round(operacao['valor'] * 100)}
+        for operacao in dados_nota['operacoes']
+    ]
+    return operacoes, {nome: round(valor * 100) for nome, valor in dados_nota['taxas'].items()}
+
+
+def gerar_texto_nota(quantidade_operacoes, semente=0):
+    """Gera o texto de uma nota no layout padrão B3, como extraído do PDF."""
+    aleatorio = random.Random(semente)
+    linhas = [
+        'NOTA DE NEGOCIAÇÃO',
+        'Nr. nota: 123456  Folha: 1',
+        'Data pregão: 02/01/2024',
+        'CORRETORA DE CAMBIO TITULOS E VALORES MOBILIARIOS S.A.',
+        'Av. Presidente Juscelino Kubitschek, 1909 - Torre Sul 25o ANDAR VILA OLIMPIA 4543-907 SÃO PAULO - SP',
+        'Tel. 3003-3710 Fax: (11) 3027-2208 Internet: www.corretora.com.br SAC: 0800-77-20202',
+        'Ouvidoria: Tel. 0800-722-3730 E-mail: ouvidoria@corretora.com.br C.N.P.J: 02.332.886/0011-78',
+        'Cliente C.P.F./C.N.P.J/C.V.M./C.O.B. Código cliente Assessor Participante destino do repasse',
+        'FULANO DE TAL 123.456.789-00 1234567 9999 Cliente Valor Custodiante C.I',
+        'Banco Agência Conta corrente Acionista Administrador Complemento nome P.Vinc',
+    ]
+    linhas += [
+        'Em atendimento ao disposto na regulamentação vigente, informamos que as operações '
+        'realizadas pelo cliente foram executadas conforme as ordens transmitidas.'
+    ] * 10
+    linhas += [
+        'Negócios realizados',
+        'Q Negociação C/V Tipo mercado Prazo Especificação do título Obs. Quantidade Preço/Ajuste Valor Operação D/C',
+    ]
+    for _ in range(quantidade_operacoes):
+        quantidade = aleatorio.randint(1, 1000)
+        preco = aleatorio.uniform(1, 200)
+        linhas.append(
+            f"1 1 {aleatorio.choice('CV')} VISTA {aleatorio.choice(['PETR4', 'VALE3', 'ITUB4', 'BBDC4'])} "
+            f"{quantidade} {preco:.2f} {quantidade * preco:,.2f} D".replace(',', '_').replace('.', ',').replace('_', '.')
+        )
+    linhas += [
+        'Resumo dos Negócios',
+        'Taxa de liquidação 12,34', 'Taxa de Registro 0,00', 'Emolumentos 1,23',
+        'Taxa Operacional 0,00', 'Execução 0,00', 'Taxa de Custódia 0,00',
+        'Impostos 0,00', 'I.R.R.F. s/ operações 0,05', 'Outros 0,00',
+        'Líquido para 04/01/2024 1.234,56',
+    ]
+    return '\n'.join(linhas)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--operacoes', type=int, nargs='+', default=[10, 100, 1000])
+    parser.add_argument('--repeticoes', type=int, default=200)
+    args = parser.parse_args()
+
+    layout = LAYOUTS['RICO']
+    for quantidade in args.operacoes:
+        texto = gerar_texto_nota(quantidade)
+        extraido = layout.extrair(texto)
+        assert (extraido['operacoes'], extraido['taxas']) == _legado_em_centavos(_legado_processar_bovespa(texto)), \
+            'resultados divergentes'
+        legado = min(timeit.repeat(lambda: _legado_processar_bovespa(texto), number=args.repeticoes, repeat=3))
+        atual = min(timeit.repeat(lambda: layout.extrair(texto), number=args.repeticoes, repeat=3))
+        print(f"{quantidade:>6} operações: legado {legado / args.repeticoes * 1e6:9.1f} µs | "
+              f"layout {atual / args.repeticoes * 1e6:9.1f} µs | {legado / atual:5.2f}x")
+
+
+if __name__ == '__main__':
+    main()
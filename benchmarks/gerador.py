@@ -0,0 +1,179 @@
+"""Geração de dados sintéticos para os benchmarks: notas de corretagem em PDF e bancos de operações.
+
+Uso:
+    python -m benchmarks.gerador notas <diretorio> --corretora RICO [--notas N] [--operacoes N]
+    python -m benchmarks.gerador banco <arquivo.db> --linhas N
+"""
+import argparse
+import logging
+import os
+import random
+import time
+from datetime import date, timedelta
+from typing import List, Sequence, Tuple
+import numpy as np
+from fpdf import FPDF
+
+logger = logging.getLogger(__name__)
+
+ATIVOS_SINTETICOS = [f'{prefixo}{sufixo}' for prefixo in (
+    'PETR', 'VALE', 'ITUB', 'BBDC', 'BBAS', 'ABEV', 'WEGE', 'RENT', 'SUZB', 'GGBR',
+    'CSNA', 'USIM', 'ELET', 'CMIG', 'SBSP', 'RADL', 'LREN', 'MGLU', 'JBSS', 'BRFS',
+) for sufixo in ('3', '4')]
+CORRETORAS_SINTETICAS = ('XP', 'RICO', 'AGORA')
+OPERACOES_POR_PAGINA = 35
+INICIO_HISTORICO = date(2010, 1, 1)
+FIM_HISTORICO = date(2024, 12, 31)
+TAMANHO_BLOCO_INSERCAO = 100_000
+
+
+def formatar_numero(valor: float) -> str:
+    """Formata no padrão brasileiro (1.234,56), como aparece nas notas."""
+    return f'{valor:,.2f}'.replace(',', '_').replace('.', ',').replace('_', '.')
+
+
+def gerar_operacoes_nota(quantidade: int, aleatorio: random.Random) -> List[Tuple[str, str, int, float]]:
+    """Gera operações (ativo, C/V, quantidade, preço) para uma nota."""
+    return [
+        (aleatorio.choice(ATIVOS_SINTETICOS), aleatorio.choice('CV'),
+         aleatorio.randint(1, 10) * 100, round(aleatorio.uniform(5, 120), 2))
+        for _ in range(quantidade)
+    ]
+
+
+def _linha_operacao(corretora: str, ativo: str, tipo: str, quantidade: int, preco: float) -> str:
+    if corretora == 'XP':
+        # Layout simplificado da XP: "PETR4 C 100 30,50"
+        return f'{ativo} {tipo} {quantidade} {formatar_numero(preco)}'
+    # Layout padrão B3 (RICO, AGORA): "1 1 C VISTA PETR4 100 30,50 3.050,00 D"
+    return f'1 1 {tipo} VISTA {ativo} {quantidade} {formatar_numero(preco)} {formatar_numero(quantidade * preco)} D'
+
+
+def gerar_nota_pdf(corretora: str, numero: str, data_pregao: date,
+                   operacoes: Sequence[Tuple[str, str, int, float]]) -> bytes:
+    """Gera o PDF de uma nota no layout da corretora, com o cabeçalho repetido em cada página."""
+    pdf = FPDF()
+    pdf.set_font('Arial', '', 9)
+    cabecalho = [f'Nr. nota: {numero}', f'Data pregão: {data_pregao:%d/%m/%Y}', f'nota de corretagem {corretora.lower()}']
+    paginas = [operacoes[inicio:inicio + OPERACOES_POR_PAGINA]
+               for inicio in range(0, len(operacoes), OPERACOES_POR_PAGINA)] or [[]]
+
+    for indice, pagina in enumerate(paginas):
+        pdf.add_page()
+        for linha in cabecalho:
+            pdf.cell(0, 5, linha, ln=1)
+        for operacao in pagina:
+            pdf.cell(0, 5, _linha_operacao(corretora, *operacao), ln=1)
+        if indice == len(paginas) - 1:
+            total = sum(quantidade * preco for _, _, quantidade, preco in operacoes)
+            liquidacao = data_pregao + timedelta(days=2)
+            for linha in ('Taxa de liquidação 1,23', 'Emolumentos 0,45', 'Taxa Operacional 0,00',
+                          f'Líquido para {liquidacao:%d/%m/%Y} {formatar_numero(total)}'):
+                pdf.cell(0, 5, linha, ln=1)
+    return pdf.output(dest='S').encode('latin-1')
+
+
+def gerar_notas(diretorio: str, corretora: str, notas: int, operacoes_por_nota: int, semente: int = 0) -> List[str]:
+    """Grava `notas` PDFs em `diretorio` e retorna os caminhos."""
+    os.makedirs(diretorio, exist_ok=True)
+    aleatorio = random.Random(semente)
+    caminhos = []
+    for indice in range(notas):
+        data_pregao = INICIO_HISTORICO + timedelta(days=aleatorio.randrange((FIM_HISTORICO - INICIO_HISTORICO).days))
+        caminho = os.path.join(diretorio, f'{corretora.lower()}_{indice:06d}.pdf')
+        with open(caminho, 'wb') as arquivo:
+            arquivo.write(gerar_nota_pdf(corretora, str(100000 + indice), data_pregao,
+                                         gerar_operacoes_nota(operacoes_por_nota, aleatorio)))
+        caminhos.append(caminho)
+    return caminhos
+
+
+def _blocos_operacoes(linhas: int, ids_ativos: np.ndarray, semente: int):
+    """Gera as linhas de `operacoes` em blocos, com datas em ordem crescente como em uma carga real."""
+    gerador = np.random.default_rng(semente)
+    dias = (FIM_HISTORICO - INICIO_HISTORICO).days
+    precos_base = gerador.uniform(5, 120, len(ids_ativos))
+    for inicio in range(0, linhas, TAMANHO_BLOCO_INSERCAO):
+        tamanho = min(TAMANHO_BLOCO_INSERCAO, linhas - inicio)
+        # Cada bloco cobre a sua fração do período, mantendo a ordem das datas entre blocos
+        deslocamentos = np.sort(gerador.integers(inicio * dias // linhas, (inicio + tamanho) * dias // linhas + 1, tamanho))
+        datas = (np.datetime64(INICIO_HISTORICO) + deslocamentos).astype(str)
+        indices_ativos = gerador.integers(0, len(ids_ativos), tamanho)
+        compras = gerador.random(tamanho) < 0.55
+        quantidades = gerador.integers(1, 11, tamanho) * 100
+        # Preços e valores em centavos, como gravados pelo registro de notas
+        precos = np.rint(precos_base[indices_ativos] * gerador.lognormal(0, 0.2, tamanho) * 100).astype(np.int64)
+        yield list(zip(
+            ids_ativos[indices_ativos].tolist(),
+            np.where(compras, 'Compra', 'Venda').tolist(),
+            quantidades.tolist(),
+            precos.tolist(),
+            datas.tolist(),
+            (quantidades * precos).tolist(),
+        ))
+
+
+def gerar_banco(caminho: str, linhas: int, semente: int = 0) -> float:
+    """Cria um banco com `linhas` operações sintéticas e as tabelas derivadas; retorna operações/s da carga.
+
+    As operações são inseridas direto em `operacoes`; posições, resumos e apuração são
+    preenchidos em seguida pelas próprias classes, como em um banco migrado.
+    """
+    # Importados aqui para que a geração de PDFs não dependa do banco
+    from database.database import Database
+    from models.operacoes import Operacoes
+
+    for sufixo in ('', '-wal', '-shm'):
+        if os.path.exists(caminho + sufixo):
+            os.remove(caminho + sufixo)
+
+    database = Database(caminho)
+    try:
+        with database.transaction() as conn:
+            conn.executemany('INSERT INTO ativos (codigo) VALUES (?)', [(codigo,) for codigo in ATIVOS_SINTETICOS])
+            ids_ativos = np.array([id_ativo for id_ativo, in conn.execute('SELECT id FROM ativos ORDER BY id')])
+
+        inicio = time.perf_counter()
+        for bloco in _blocos_operacoes(linhas, ids_ativos, semente):
+            with database.transaction() as conn:
+                conn.executemany('''
+                    INSERT INTO operacoes (ativo_id, tipo, quantidade, preco, data, valor, corretagem)
+                    VALUES (?, ?, ?, ?, ?, ?, 0)
+                ''', bloco)
+        taxa_insercao = linhas / (time.perf_counter() - inicio)
+
+        Operacoes(database)
+        database.execute_query('ANALYZE')
+    finally:
+        database.close()
+    return taxa_insercao
+
+
+def main():
+    parser = argparse.ArgumentParser(prog='python -m benchmarks.gerador', description=__doc__.splitlines()[0])
+    comandos = parser.add_subparsers(dest='comando', required=True)
+
+    notas = comandos.add_parser('notas', help="Gera notas de corretagem em PDF")
+    notas.add_argument('diretorio')
+    notas.add_argument('--corretora', choices=CORRETORAS_SINTETICAS, default='RICO')
+    notas.add_argument('--notas', type=int, default=100)
+    notas.add_argument('--operacoes', type=int, default=20, help="Operações por nota")
+    notas.add_argument('--semente', type=int, default=0)
+
+    banco = comandos.add_parser('banco', help="Gera um banco com operações sintéticas")
+    banco.add_argument('arquivo')
+    banco.add_argument('--linhas', type=int, default=100_000)
+    banco.add_argument('--semente', type=int, default=0)
+
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(name)s: %(message)s')
+    if args.comando == 'notas':
+        caminhos = gerar_notas(args.diretorio, args.corretora, args.notas, args.operacoes, args.semente)
+        print(f"{len(caminhos)} notas geradas em {args.diretorio}")
+    else:
+        taxa = gerar_banco(args.arquivo, args.linhas, args.semente)
+        print(f"{args.linhas} operações geradas em {args.arquivo} ({taxa:,.0f} operações/s na carga)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,264 @@
+"""Suíte de benchmarks: leitura de notas, inserção, consultas por período, impostos e relatórios.
+
+Uso:
+    python -m benchmarks.suite [--linhas 10000 100000 ...] [--saida resultados.json] [--comparar anterior.json]
+
+Os bancos sintéticos ficam em --dados e são reaproveitados entre execuções. O resultado
+é um JSON com uma entrada por (benchmark, parâmetros), que pode ser comparado com o de
+uma execução anterior via --comparar.
+"""
+import argparse
+import json
+import logging
+import os
+import platform
+import random
+import shutil
+import sqlite3
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+from typing import Callable, Dict, List
+import numpy as np
+from benchmarks.gerador import CORRETORAS_SINTETICAS, FIM_HISTORICO, gerar_banco, gerar_notas, gerar_operacoes_nota
+from config.config import WORKERS_PROCESSAMENTO
+from utils.dinheiro import para_centavos
+
+logger = logging.getLogger(__name__)
+
+DIRETORIO_DADOS = os.path.join('.cache', 'benchmarks')
+JANELAS_CONSULTA = (30, 365)  # dias, contados para trás a partir do fim do histórico
+
+
+def _resultado(benchmark: str, parametros: Dict, metricas: Dict) -> Dict:
+    return {'benchmark': benchmark, 'parametros': parametros, 'metricas': metricas}
+
+
+def _latencias(funcao: Callable, repeticoes: int) -> Dict:
+    duracoes = []
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        funcao()
+        duracoes.append(time.perf_counter() - inicio)
+    p50, p95 = np.percentile(duracoes, [50, 95]) * 1000
+    return {'p50_ms': float(p50), 'p95_ms': float(p95), 'min_ms': min(duracoes) * 1000, 'repeticoes': repeticoes}
+
+
+def benchmark_leitura_notas(diretorio: str, notas: int, operacoes_por_nota: int, workers: int) -> List[Dict]:
+    """Extração e interpretação de PDFs sintéticos de cada corretora, sem cache."""
+    from models.processador_notas import ProcessadorNotas
+
+    resultados = []
+    for corretora in CORRETORAS_SINTETICAS:
+        caminhos = gerar_notas(os.path.join(diretorio, corretora), corretora, notas, operacoes_por_nota)
+        tamanho = sum(os.path.getsize(caminho) for caminho in caminhos)
+        for quantidade_workers in sorted({1, workers}):
+            inicio = time.perf_counter()
+            lidas = ProcessadorNotas(None).processar_lote(caminhos, corretora, quantidade_workers)
+            decorrido = time.perf_counter() - inicio
+            operacoes = sum(len(nota['operacoes']) for resultado in lidas for nota in resultado['notas'] or [])
+            if operacoes != notas * operacoes_por_nota:
+                raise RuntimeError(f"{corretora}: {operacoes} operações lidas, esperadas {notas * operacoes_por_nota}")
+            resultados.append(_resultado('leitura_notas', {
+                'corretora': corretora, 'notas': notas, 'operacoes_por_nota': operacoes_por_nota,
+                'workers': quantidade_workers,
+            }, {
+                'segundos': decorrido,
+                'notas_por_s': notas / decorrido,
+                'operacoes_por_s': operacoes / decorrido,
+                'mb_por_s': tamanho / 1024 / 1024 / decorrido,
+            }))
+    return resultados
+
+
+def benchmark_insercao(diretorio: str, notas: int, operacoes_por_nota: int) -> List[Dict]:
+    """Registro de notas pelo caminho normal (posições, resumos e apuração na mesma transação)."""
+    from database.database import Database
+    from models.operacoes import Operacoes
+
+    caminho = os.path.join(diretorio, 'insercao.db')
+    for sufixo in ('', '-wal', '-shm'):
+        if os.path.exists(caminho + sufixo):
+            os.remove(caminho + sufixo)
+
+    aleatorio = random.Random(0)
+    dados_notas = []
+    data_pregao = datetime(2020, 1, 2)
+    for indice in range(notas):
+        data_pregao += timedelta(days=1)
+        dados_notas.append({
+            'numero_nota': str(indice), 'data_pregao': data_pregao, 'corretora': 'RICO', 'taxas': {},
+            'operacoes': [
+                {'ativo': ativo, 'tipo': 'Compra' if tipo == 'C' else 'Venda', 'quantidade': quantidade,
+                 'preco': para_centavos(preco)}
+                for ativo, tipo, quantidade, preco in gerar_operacoes_nota(operacoes_por_nota, aleatorio)
+            ],
+        })
+
+    database = Database(caminho)
+    try:
+        operacoes = Operacoes(database)
+        inicio = time.perf_counter()
+        for dados_nota in dados_notas:
+            operacoes.registrar_nota(dados_nota)
+        decorrido = time.perf_counter() - inicio
+    finally:
+        database.close()
+
+    return [_resultado('insercao', {'notas': notas, 'operacoes_por_nota': operacoes_por_nota}, {
+        'segundos': decorrido,
+        'notas_por_s': notas / decorrido,
+        'operacoes_por_s': notas * operacoes_por_nota / decorrido,
+    })]
+
+
+def obter_banco(diretorio: str, linhas: int) -> Dict:
+    """Retorna o caminho do banco sintético com `linhas` operações, gerando-o se necessário."""
+    caminho = os.path.join(diretorio, f'operacoes_{linhas}.db')
+    if os.path.exists(caminho):
+        return {'caminho': caminho, 'resultado': None}
+    logger.info(f"Gerando banco sintético com {linhas} operações em {caminho}")
+    inicio = time.perf_counter()
+    taxa = gerar_banco(caminho, linhas)
+    return {'caminho': caminho, 'resultado': _resultado('carga_em_massa', {'linhas': linhas}, {
+        'operacoes_por_s': taxa,
+        'segundos_com_derivadas': time.perf_counter() - inicio,
+    })}
+
+
+def benchmark_banco(caminho: str, linhas: int, repeticoes: int) -> List[Dict]:
+    """Consultas por período, apuração de impostos e geração de relatório em um banco sintético."""
+    from database.database import Database
+    from models.operacoes import Operacoes
+    from models.relatorios import GeradorRelatorios
+
+    resultados = []
+    database = Database(caminho)
+    try:
+        # Sem cache de consultas: cada repetição vai ao banco
+        operacoes = Operacoes(database)
+        for dias in JANELAS_CONSULTA:
+            inicio, fim = FIM_HISTORICO - timedelta(days=dias - 1), FIM_HISTORICO
+            parametros = {'linhas': linhas, 'janela_dias': dias}
+            resultados.append(_resultado('consulta_operacoes', parametros, _latencias(
+                lambda: operacoes.obter_operacoes(inicio, fim), repeticoes)))
+            resultados.append(_resultado('resumo_por_ativo', parametros, _latencias(
+                lambda: operacoes.obter_resumo_por_ativo(inicio, fim), repeticoes)))
+
+        resultados.append(_resultado('apuracao_completa', {'linhas': linhas}, _latencias(
+            operacoes.apuracao.recalcular, max(1, repeticoes // 5))))
+        ultimo_mes = FIM_HISTORICO.replace(day=1).isoformat()
+        resultados.append(_resultado('apuracao_ultimo_mes', {'linhas': linhas}, _latencias(
+            lambda: operacoes.apuracao.recalcular(ultimo_mes), repeticoes)))
+
+        gerador = GeradorRelatorios(database)
+        inicio_relatorio = FIM_HISTORICO - timedelta(days=JANELAS_CONSULTA[-1] - 1)
+        inicio = time.perf_counter()
+        arquivo = gerador.gerar(inicio_relatorio, FIM_HISTORICO, incluir_operacoes=True)
+        decorrido = time.perf_counter() - inicio
+        with database.leitura() as conn:
+            operacoes_relatorio = conn.execute(
+                'SELECT COUNT(*) FROM operacoes WHERE data >= ? AND data < date(?, \'+1 day\')',
+                (str(inicio_relatorio), str(FIM_HISTORICO))
+            ).fetchone()[0]
+        resultados.append(_resultado('relatorio_pdf', {'linhas': linhas, 'janela_dias': JANELAS_CONSULTA[-1]}, {
+            'segundos': decorrido,
+            'operacoes': operacoes_relatorio,
+            'operacoes_por_s': operacoes_relatorio / decorrido,
+            'bytes': os.path.getsize(arquivo),
+        }))
+        os.remove(arquivo)
+    finally:
+        database.close()
+    return resultados
+
+
+def comparar(atual: Dict, anterior: Dict) -> List[str]:
+    """Lista, para cada métrica presente nas duas execuções, o valor anterior, o atual e a razão."""
+    def indexar(execucao):
+        return {
+            (resultado['benchmark'], json.dumps(resultado['parametros'], sort_keys=True)): resultado['metricas']
+            for resultado in execucao['resultados']
+        }
+
+    anteriores = indexar(anterior)
+    linhas = []
+    for (benchmark, parametros), metricas in indexar(atual).items():
+        for nome, valor in metricas.items():
+            valor_anterior = anteriores.get((benchmark, parametros), {}).get(nome)
+            if valor_anterior in (None, 0) or nome == 'repeticoes':
+                continue
+            linhas.append(f"{benchmark} {parametros} {nome}: {valor_anterior:.4g} -> {valor:.4g} "
+                          f"({valor / valor_anterior:.2f}x)")
+    return linhas
+
+
+def criar_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog='python -m benchmarks.suite', description=__doc__.splitlines()[0])
+    parser.add_argument('--linhas', type=int, nargs='+', default=[10_000, 100_000],
+                        help="Tamanhos dos bancos sintéticos (ex.: 10000 100000 1000000 10000000)")
+    parser.add_argument('--notas', type=int, default=50, help="Notas em PDF por corretora")
+    parser.add_argument('--operacoes-por-nota', type=int, default=20)
+    parser.add_argument('--notas-insercao', type=int, default=200)
+    parser.add_argument('--workers', type=int, default=WORKERS_PROCESSAMENTO)
+    parser.add_argument('--repeticoes', type=int, default=20)
+    parser.add_argument('--dados', default=DIRETORIO_DADOS, help="Diretório dos bancos sintéticos")
+    parser.add_argument('--saida', help="Arquivo JSON dos resultados (padrão: <dados>/resultados_<data>.json)")
+    parser.add_argument('--comparar', metavar='ANTERIOR', help="JSON de uma execução anterior")
+    parser.add_argument('--apenas', nargs='+', choices=('notas', 'insercao', 'banco'),
+                        default=['notas', 'insercao', 'banco'])
+    return parser
+
+
+def main():
+    args = criar_parser().parse_args()
+    logging.basicConfig(level=logging.WARNING, format='%(asctime)s %(levelname)s %(name)s: %(message)s')
+    logger.setLevel(logging.INFO)
+    os.makedirs(args.dados, exist_ok=True)
+
+    execucao = {
+        'data': datetime.now().isoformat(timespec='seconds'),
+        'ambiente': {
+            'python': platform.python_version(),
+            'plataforma': platform.platform(),
+            'cpus': os.cpu_count(),
+            'sqlite': sqlite3.sqlite_version,
+            'numpy': np.__version__,
+        },
+        'resultados': [],
+    }
+    resultados = execucao['resultados']
+
+    temporario = tempfile.mkdtemp(prefix='benchmarks_')
+    try:
+        if 'notas' in args.apenas:
+            resultados += benchmark_leitura_notas(temporario, args.notas, args.operacoes_por_nota, args.workers)
+        if 'insercao' in args.apenas:
+            resultados += benchmark_insercao(temporario, args.notas_insercao, args.operacoes_por_nota)
+    finally:
+        shutil.rmtree(temporario, ignore_errors=True)
+
+    if 'banco' in args.apenas:
+        for linhas in args.linhas:
+            banco = obter_banco(args.dados, linhas)
+            if banco['resultado']:
+                resultados.append(banco['resultado'])
+            resultados += benchmark_banco(banco['caminho'], linhas, args.repeticoes)
+
+    for resultado in resultados:
+        metricas = ', '.join(f"{nome}={valor:.4g}" for nome, valor in resultado['metricas'].items())
+        print(f"{resultado['benchmark']} {resultado['parametros']}: {metricas}")
+
+    saida = args.saida or os.path.join(args.dados, f"resultados_{datetime.now():%Y%m%d_%H%M%S}.json")
+    with open(saida, 'w', encoding='utf-8') as arquivo:
+        json.dump(execucao, arquivo, ensure_ascii=False, indent=2)
+    print(f"Resultados gravados em {saida}")
+
+    if args.comparar:
+        with open(args.comparar, encoding='utf-8') as arquivo:
+            print("\nComparação com a execução anterior:")
+            print('\n'.join(comparar(execucao, json.load(arquivo))) or "Nenhuma métrica em comum.")
+
+
+if __name__ == '__main__':
+    main()
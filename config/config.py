@@ -7,6 +7,20 @@ load_dotenv()
 # Configurações do banco de dados
 DATABASE_PATH = os.getenv('DATABASE_PATH', 'investimentos.db')
 
+# Contas: cada conta tem seu próprio arquivo SQLite, registrado no catálogo
+CONTAS_DIR = os.getenv('CONTAS_DIR', 'contas')
+CATALOGO_CONTAS_PATH = os.getenv('CATALOGO_CONTAS_PATH', os.path.join(CONTAS_DIR, 'catalogo.db'))
+CONTA_PADRAO = os.getenv('CONTA_PADRAO', 'principal')  # usa o banco de DATABASE_PATH
+WORKERS_CONSOLIDACAO = int(os.getenv('WORKERS_CONSOLIDACAO', 8))  # contas consultadas em paralelo
+
+# Ajustes do SQLite aplicados a cada conexão
+SQLITE_JOURNAL_MODE = os.getenv('SQLITE_JOURNAL_MODE', 'WAL')
+SQLITE_SYNCHRONOUS = os.getenv('SQLITE_SYNCHRONOUS', 'NORMAL')
+SQLITE_CACHE_SIZE = int(os.getenv('SQLITE_CACHE_SIZE', -64000))  # negativo: KiB (64 MB)
+SQLITE_MMAP_SIZE = int(os.getenv('SQLITE_MMAP_SIZE', 256 * 1024 * 1024))  # bytes
+SQLITE_CACHED_STATEMENTS = int(os.getenv('SQLITE_CACHED_STATEMENTS', 256))  # comandos preparados por conexão
+SQLITE_MAX_LEITORES = int(os.getenv('SQLITE_MAX_LEITORES', 8))  # conexões de leitura simultâneas
+
 # Configurações da aplicação
 APP_NAME = "EVS Controle de investimentos em ações"
 VERSION = "1.0.0"
@@ -23,4 +37,36 @@ TIPOS_EVENTOS = ["DIVIDENDO", "JCP", "DESDOBRAMENTO", "GRUPAMENTO"]
 # Configurações de impostos
 ALIQUOTA_DAY_TRADE = 0.20
 ALIQUOTA_SWING_TRADE = 0.15
-ISENCAO_SWING_TRADE = 20000  # Isenção para vendas até R$ 20.000,00 no mês
\ No newline at end of file
+ISENCAO_SWING_TRADE = 20000  # Isenção para vendas até R$ 20.000,00 no mês
+ALIQUOTA_JCP = 0.15  # Retida na fonte sobre juros sobre capital próprio
+
+# Configurações de processamento de notas
+WORKERS_PROCESSAMENTO = int(os.getenv('WORKERS_PROCESSAMENTO', os.cpu_count() or 1))
+BACKEND_PDF = os.getenv('BACKEND_PDF', 'pypdf2')  # pypdf2 ou pdfplumber
+
+# Configurações do cache de notas processadas
+CACHE_NOTAS_DIR = os.getenv('CACHE_NOTAS_DIR', os.path.join('.cache', 'notas'))
+CACHE_NOTAS_TAMANHO_MAXIMO = int(os.getenv('CACHE_NOTAS_TAMANHO_MAXIMO', 100 * 1024 * 1024))  # bytes
+
+# Configurações do cache de consultas (memória, compartilhado entre sessões)
+CACHE_CONSULTAS_TAMANHO_MAXIMO = int(os.getenv('CACHE_CONSULTAS_TAMANHO_MAXIMO', 64 * 1024 * 1024))  # bytes
+
+# Configurações dos gráficos
+MAX_PONTOS_GRAFICO = int(os.getenv('MAX_PONTOS_GRAFICO', 1000))  # pontos por série, próximo da largura da tela
+
+# Configurações das tarefas em segundo plano (importação de notas e relatórios)
+TAREFAS_DB_PATH = os.getenv('TAREFAS_DB_PATH', os.path.join('.cache', 'tarefas.db'))
+TAREFAS_DIR = os.getenv('TAREFAS_DIR', os.path.join('.cache', 'tarefas'))  # uploads e relatórios gerados
+TAREFAS_WORKERS = int(os.getenv('TAREFAS_WORKERS', 2))
+TAREFAS_MANTIDAS = int(os.getenv('TAREFAS_MANTIDAS', 50))  # tarefas finalizadas guardadas; as mais antigas são apagadas
+
+# Configurações das métricas de desempenho (desativadas por padrão)
+METRICAS_ATIVAS = os.getenv('METRICAS_ATIVAS', 'false').lower() in ('1', 'true', 'sim')
+METRICAS_AMOSTRAS = int(os.getenv('METRICAS_AMOSTRAS', 10000))  # durações guardadas por métrica para os percentis
+# Loga o tempo de cada etapa da inicialização e de cada execução da página
+MEDIR_INICIALIZACAO = os.getenv('MEDIR_INICIALIZACAO', 'false').lower() in ('1', 'true', 'sim')
+
+# Configurações das cotações
+PROVEDOR_PRECOS = os.getenv('PROVEDOR_PRECOS', 'arquivo')  # arquivo ou yfinance
+ARQUIVO_PRECOS = os.getenv('ARQUIVO_PRECOS', 'precos.csv')  # CSV ou Parquet com codigo, data e fechamento
+TAMANHO_LOTE_PRECOS = int(os.getenv('TAMANHO_LOTE_PRECOS', 50))  # ativos por requisição ao provedor
@@ -0,0 +1,87 @@
+import logging
+import os
+import sqlite3
+import threading
+from datetime import datetime
+from typing import Dict, List, Optional
+from config.config import CATALOGO_CONTAS_PATH, CONTA_PADRAO, CONTAS_DIR, DATABASE_PATH
+
+logger = logging.getLogger(__name__)
+
+TABELA_CONTAS = '''
+    CREATE TABLE IF NOT EXISTS contas (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        nome TEXT NOT NULL UNIQUE,
+        corretora TEXT,
+        caminho TEXT NOT NULL UNIQUE,
+        criada_em TEXT NOT NULL
+    )
+'''
+
+
+class CatalogoContas:
+    """Catálogo das contas de investimento (tabela `contas` em CATALOGO_CONTAS_PATH).
+
+    Cada conta tem o seu próprio arquivo SQLite (shard) com o esquema completo, então a
+    importação de uma conta não bloqueia nem aumenta as consultas das outras. A conta
+    CONTA_PADRAO é registrada na criação do catálogo apontando para DATABASE_PATH, o
+    banco usado antes das contas existirem.
+    """
+
+    def __init__(self, caminho: str = CATALOGO_CONTAS_PATH, diretorio: str = CONTAS_DIR,
+                 banco_padrao: str = DATABASE_PATH):
+        self.caminho = caminho
+        self.diretorio = diretorio
+        if caminho != ':memory:' and os.path.dirname(caminho):
+            os.makedirs(os.path.dirname(caminho), exist_ok=True)
+        self.conn = sqlite3.connect(caminho, check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        self._lock = threading.Lock()
+        with self._lock, self.conn:
+            self.conn.execute(TABELA_CONTAS)
+            self.conn.execute(
+                'INSERT OR IGNORE INTO contas (nome, caminho, criada_em) VALUES (?, ?, ?)',
+                (CONTA_PADRAO, banco_padrao, datetime.now().isoformat(timespec='seconds'))
+            )
+
+    def listar(self) -> List[Dict]:
+        """Contas registradas, da mais antiga para a mais nova."""
+        with self._lock:
+            return [dict(linha) for linha in self.conn.execute('SELECT * FROM contas ORDER BY id')]
+
+    def obter(self, nome: str) -> Optional[Dict]:
+        with self._lock:
+            linha = self.conn.execute('SELECT * FROM contas WHERE nome = ?', (nome,)).fetchone()
+        return dict(linha) if linha else None
+
+    def caminho_conta(self, nome: str) -> str:
+        """Arquivo SQLite da conta; levanta ValueError se ela não estiver no catálogo."""
+        conta = self.obter(nome)
+        if conta is None:
+            raise ValueError(f"Conta {nome} não cadastrada")
+        return conta['caminho']
+
+    def registrar(self, nome: str, corretora: Optional[str] = None) -> Dict:
+        """Cadastra a conta com um arquivo próprio em `diretorio` e retorna o registro.
+
+        O arquivo é criado (com as migrações) na primeira vez que o banco da conta é aberto.
+        """
+        nome = nome.strip()
+        if not nome:
+            raise ValueError("Informe o nome da conta")
+        os.makedirs(self.diretorio, exist_ok=True)
+        with self._lock, self.conn:
+            if self.conn.execute('SELECT 1 FROM contas WHERE nome = ?', (nome,)).fetchone():
+                raise ValueError(f"Conta {nome} já cadastrada")
+            cursor = self.conn.execute(
+                "INSERT INTO contas (nome, corretora, caminho, criada_em) VALUES (?, ?, '', ?)",
+                (nome, corretora, datetime.now().isoformat(timespec='seconds'))
+            )
+            # O arquivo leva o id, e não o nome, para aceitar qualquer nome de conta
+            caminho = os.path.join(self.diretorio, f'conta_{cursor.lastrowid}.db')
+            self.conn.execute('UPDATE contas SET caminho = ? WHERE id = ?', (caminho, cursor.lastrowid))
+        logger.info(f"Conta {nome} cadastrada em {caminho}")
+        return self.obter(nome)
+
+    def close(self) -> None:
+        self.conn.close()
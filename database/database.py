@@ -1,38 +1,194 @@
 import sqlite3
 import os
+import queue
+import threading
+from contextlib import contextmanager
+import pandas as pd
+from config.config import (
+    DATABASE_PATH, SQLITE_CACHE_SIZE, SQLITE_CACHED_STATEMENTS, SQLITE_JOURNAL_MODE, SQLITE_MAX_LEITORES,
+    SQLITE_MMAP_SIZE, SQLITE_SYNCHRONOUS
+)
+from database.contas import CatalogoContas
+from database.migracoes import aplicar_migracoes
+from utils.metricas import cronometrado, metricas
+
+# Comandos executados nas conexões de leitura; todo o resto passa pela conexão de escrita
+COMANDOS_LEITURA = ('SELECT', 'WITH', 'EXPLAIN')
 
 class Database:
-    def __init__(self, db_path='investimentos.db'):
+    """Acesso ao SQLite compartilhado entre threads (sessões do Streamlit, ingestão).
+
+    Há uma única conexão de escrita, protegida por um lock, e um pool de conexões somente
+    leitura emprestadas a cada consulta. Com o journal em WAL, as leituras seguem em
+    paralelo enquanto uma escrita está em andamento. Cada conexão guarda em cache os
+    comandos já preparados (`cached_statements`).
+
+    `versao_dados` muda a cada escrita, inclusive as feitas por outras instâncias ou
+    processos sobre o mesmo arquivo, e serve de chave para caches de consultas.
+
+    Cada conta de investimento tem o seu arquivo; `Database.da_conta` abre o da conta
+    escolhida pelo catálogo (`CatalogoContas`).
+    """
+
+    # Contador de escritas por arquivo, compartilhado entre as instâncias do processo
+    _contadores_escrita = {}
+    _lock_contadores = threading.Lock()
+
+    def __init__(self, db_path=DATABASE_PATH, journal_mode=SQLITE_JOURNAL_MODE, synchronous=SQLITE_SYNCHRONOUS,
+                 cache_size=SQLITE_CACHE_SIZE, mmap_size=SQLITE_MMAP_SIZE,
+                 cached_statements=SQLITE_CACHED_STATEMENTS, max_leitores=SQLITE_MAX_LEITORES):
         self.db_path = db_path
+        self.cached_statements = cached_statements
+        self.pragmas = {
+            'journal_mode': journal_mode,
+            'synchronous': synchronous,
+            'cache_size': cache_size,
+            'mmap_size': mmap_size,
+        }
+        self._lock_escrita = threading.RLock()
+        self._leitores = queue.LifoQueue()
+        self._vagas_leitores = threading.BoundedSemaphore(max_leitores)
+        self._todos_leitores = []
+        if db_path == ':memory:':
+            self._chave_contador = f':memory:{id(self)}'
+        else:
+            self._chave_contador = os.path.abspath(db_path)
         self.conn = self._connect()
+        if self.conn:
+            aplicar_migracoes(self.conn)
 
-    def _connect(self):
+    @classmethod
+    def da_conta(cls, conta: str, catalogo: CatalogoContas = None, **kwargs) -> 'Database':
+        """Abre o banco da conta cadastrada no catálogo (padrão: CATALOGO_CONTAS_PATH)."""
+        if catalogo is not None:
+            return cls(catalogo.caminho_conta(conta), **kwargs)
+        catalogo = CatalogoContas()
         try:
-            conn = sqlite3.connect(self.db_path)
+            return cls(catalogo.caminho_conta(conta), **kwargs)
+        finally:
+            catalogo.close()
+
+    def _connect(self, somente_leitura=False):
+        try:
+            conn = sqlite3.connect(
+                self.db_path,
+                check_same_thread=False,
+                cached_statements=self.cached_statements
+            )
+            conn.row_factory = sqlite3.Row
+            self._aplicar_pragmas(conn, somente_leitura)
             return conn
         except sqlite3.Error as e:
             print(f"Erro ao conectar ao banco de dados: {e}")
             return None
 
+    def _aplicar_pragmas(self, conn, somente_leitura=False):
+        for pragma, valor in self.pragmas.items():
+            # WAL não se aplica a bancos em memória e é persistente: basta a conexão de escrita
+            if pragma == 'journal_mode' and (self.db_path == ':memory:' or somente_leitura):
+                continue
+            if valor is not None:
+                conn.execute(f'PRAGMA {pragma} = {valor}')
+        if somente_leitura:
+            conn.execute('PRAGMA query_only = ON')
+
+    @contextmanager
+    def leitura(self):
+        """Empresta uma conexão somente leitura do pool pelo tempo do bloco."""
+        # Um banco em memória só existe na conexão de escrita
+        if self.db_path == ':memory:':
+            with self._lock_escrita:
+                yield self.conn
+            return
+
+        with self._vagas_leitores:
+            try:
+                conn = self._leitores.get_nowait()
+            except queue.Empty:
+                conn = self._connect(somente_leitura=True)
+                if conn is None:
+                    raise sqlite3.OperationalError("Não foi possível abrir uma conexão de leitura")
+                with self._lock_escrita:
+                    self._todos_leitores.append(conn)
+            try:
+                yield conn
+            finally:
+                self._leitores.put(conn)
+
+    @property
+    def versao_dados(self):
+        """Identifica o estado atual dos dados: muda sempre que algo é gravado."""
+        contador = self._contadores_escrita.get(self._chave_contador, 0)
+        if self.db_path == ':memory:':
+            return (self._chave_contador, contador)
+        # Escritas de outros processos aparecem como alteração do arquivo (ou do WAL)
+        modificacao = 0
+        for caminho in (self.db_path, f'{self.db_path}-wal'):
+            try:
+                modificacao = max(modificacao, os.stat(caminho).st_mtime_ns)
+            except OSError:
+                pass
+        return (self._chave_contador, contador, modificacao)
+
+    def _registrar_escrita(self):
+        with self._lock_contadores:
+            self._contadores_escrita[self._chave_contador] = self._contadores_escrita.get(self._chave_contador, 0) + 1
+
+    @cronometrado('sqlite.execute_query')
     def execute_query(self, query, params=None):
         try:
-            with self.conn:
-                cursor = self.conn.cursor()
-                if params:
-                    cursor.execute(query, params)
-                else:
-                    cursor.execute(query)
-                return cursor.fetchall()
+            if query.lstrip().split(None, 1)[0].upper() in COMANDOS_LEITURA:
+                with self.leitura() as conn:
+                    return conn.execute(query, params or ()).fetchall()
+
+            with self._lock_escrita:
+                try:
+                    with self.conn:
+                        return self.conn.execute(query, params or ()).fetchall()
+                finally:
+                    self._registrar_escrita()
         except sqlite3.Error as e:
             print(f"Erro ao executar query: {e}")
             return []
 
-    def close(self):
-        if self.conn:
+    def query_dataframe(self, query, params=None, **kwargs) -> pd.DataFrame:
+        """Executa uma consulta de leitura e retorna o resultado como DataFrame.
+
+        Argumentos extras (dtype, parse_dates...) são repassados ao `pd.read_sql_query`.
+        Para ler em blocos, use `leitura()` diretamente: a conexão volta ao pool ao final
+        desta chamada.
+        """
+        with self.leitura() as conn:
+            return pd.read_sql_query(query, conn, params=params, **kwargs)
+
+    @contextmanager
+    def transaction(self):
+        """Executa o bloco em uma única transação, desfazendo tudo em caso de erro.
+
+        O lock de escrita fica retido durante todo o bloco, serializando os escritores.
+        """
+        with self._lock_escrita:
+            self.conn.execute('BEGIN IMMEDIATE')
             try:
-                self.conn.close()
-            except sqlite3.Error as e:
-                print(f"Erro ao fechar a conexão com o banco de dados: {e}")
+                yield self.conn
+            except Exception:
+                self.conn.rollback()
+                raise
+            else:
+                with metricas.medir('sqlite.commit'):
+                    self.conn.commit()
+            finally:
+                self._registrar_escrita()
+
+    def close(self):
+        conexoes = [self.conn] + getattr(self, '_todos_leitores', [])
+        for conn in conexoes:
+            if conn:
+                try:
+                    conn.close()
+                except sqlite3.Error as e:
+                    print(f"Erro ao fechar a conexão com o banco de dados: {e}")
+        self._todos_leitores = []
 
     def __del__(self):
-        self.close()
\ No newline at end of file
+        self.close()
@@ -0,0 +1,460 @@
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Versão do esquema guardada em PRAGMA user_version. Cada migração é aplicada uma única
+# vez, em ordem, dentro de uma transação; para alterar o esquema, acrescente uma nova
+# entrada ao final de MIGRACOES em vez de editar as existentes.
+
+
+def _colunas(conn, tabela):
+    return {linha[1]: linha for linha in conn.execute(f'PRAGMA table_info({tabela})')}
+
+
+def _reconstruir_tabela(conn, tabela, criacao, colunas_novas):
+    """Recria `tabela` com o DDL `criacao`, copiando as colunas em comum."""
+    comuns = [coluna for coluna in colunas_novas if coluna in _colunas(conn, tabela)]
+    lista = ', '.join(comuns)
+    conn.execute(criacao.replace(f'CREATE TABLE {tabela} ', f'CREATE TABLE {tabela}_nova ', 1))
+    conn.execute(f'INSERT INTO {tabela}_nova ({lista}) SELECT {lista} FROM {tabela}')
+    conn.execute(f'DROP TABLE {tabela}')
+    conn.execute(f'ALTER TABLE {tabela}_nova RENAME TO {tabela}')
+
+
+TABELA_ATIVOS = '''
+    CREATE TABLE ativos (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        codigo TEXT NOT NULL UNIQUE,
+        tipo TEXT
+    )
+'''
+
+TABELA_OPERACOES = '''
+    CREATE TABLE operacoes (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        ativo_id INTEGER,
+        tipo TEXT,
+        quantidade INTEGER,
+        preco REAL,
+        data TEXT,
+        corretagem REAL,
+        valor REAL,
+        preco_venda REAL,
+        preco_compra REAL,
+        corretora TEXT,
+        numero_nota TEXT,
+        FOREIGN KEY (ativo_id) REFERENCES ativos(id)
+    )
+'''
+
+TABELA_NOTAS_CORRETAGEM = '''
+    CREATE TABLE notas_corretagem (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        numero TEXT,
+        corretora TEXT NOT NULL,
+        data_pregao DATE NOT NULL,
+        valor_total REAL,
+        total_taxas REAL
+    )
+'''
+
+TABELA_POSICOES = '''
+    CREATE TABLE posicoes (
+        ativo_id INTEGER PRIMARY KEY,
+        quantidade INTEGER NOT NULL DEFAULT 0,
+        custo_total REAL NOT NULL DEFAULT 0,
+        preco_medio REAL NOT NULL DEFAULT 0,
+        lucro_realizado REAL NOT NULL DEFAULT 0,
+        data_ultima_operacao TEXT,
+        FOREIGN KEY (ativo_id) REFERENCES ativos(id)
+    )
+'''
+
+TABELA_APURACAO_MENSAL = '''
+    CREATE TABLE apuracao_mensal (
+        mes TEXT NOT NULL,
+        categoria TEXT NOT NULL,
+        vendas REAL NOT NULL DEFAULT 0,
+        resultado REAL NOT NULL DEFAULT 0,
+        isento INTEGER NOT NULL DEFAULT 0,
+        prejuizo_acumulado REAL NOT NULL DEFAULT 0,
+        base_calculo REAL NOT NULL DEFAULT 0,
+        imposto REAL NOT NULL DEFAULT 0,
+        PRIMARY KEY (mes, categoria)
+    )
+'''
+
+TABELA_POSICOES_MENSAIS = '''
+    CREATE TABLE posicoes_mensais (
+        ativo_id INTEGER NOT NULL,
+        mes TEXT NOT NULL,
+        quantidade INTEGER NOT NULL,
+        custo_total REAL NOT NULL,
+        PRIMARY KEY (ativo_id, mes),
+        FOREIGN KEY (ativo_id) REFERENCES ativos(id)
+    )
+'''
+
+TABELA_RESUMO_DIARIO = '''
+    CREATE TABLE resumo_diario (
+        ativo_id INTEGER NOT NULL,
+        data TEXT NOT NULL,
+        qtd_compra INTEGER NOT NULL DEFAULT 0,
+        valor_compra REAL NOT NULL DEFAULT 0,
+        qtd_venda INTEGER NOT NULL DEFAULT 0,
+        valor_venda REAL NOT NULL DEFAULT 0,
+        corretagem REAL NOT NULL DEFAULT 0,
+        num_operacoes INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (ativo_id, data),
+        FOREIGN KEY (ativo_id) REFERENCES ativos(id)
+    )
+'''
+
+TABELA_RESUMO_MENSAL = '''
+    CREATE TABLE resumo_mensal (
+        ativo_id INTEGER NOT NULL,
+        mes TEXT NOT NULL,
+        qtd_compra INTEGER NOT NULL DEFAULT 0,
+        valor_compra REAL NOT NULL DEFAULT 0,
+        qtd_venda INTEGER NOT NULL DEFAULT 0,
+        valor_venda REAL NOT NULL DEFAULT 0,
+        corretagem REAL NOT NULL DEFAULT 0,
+        num_operacoes INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (ativo_id, mes),
+        FOREIGN KEY (ativo_id) REFERENCES ativos(id)
+    )
+'''
+
+TABELA_PRECOS = '''
+    CREATE TABLE precos (
+        ativo_id INTEGER NOT NULL,
+        data TEXT NOT NULL,
+        fechamento REAL NOT NULL,
+        PRIMARY KEY (ativo_id, data),
+        FOREIGN KEY (ativo_id) REFERENCES ativos(id)
+    ) WITHOUT ROWID
+'''
+
+TABELA_EVENTOS = '''
+    CREATE TABLE eventos (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        ativo_id INTEGER,
+        tipo TEXT NOT NULL,
+        data DATE,
+        valor REAL,
+        FOREIGN KEY (ativo_id) REFERENCES ativos(id)
+    )
+'''
+
+
+# Esquema 8: valores monetários em centavos (INTEGER). O preço médio continua REAL, em
+# centavos fracionários, por ser uma razão entre custo e quantidade.
+TABELA_OPERACOES_CENTAVOS = '''
+    CREATE TABLE operacoes (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        ativo_id INTEGER,
+        tipo TEXT,
+        quantidade INTEGER,
+        preco INTEGER,
+        data TEXT,
+        corretagem INTEGER,
+        valor INTEGER,
+        preco_venda INTEGER,
+        preco_compra INTEGER,
+        corretora TEXT,
+        numero_nota TEXT,
+        FOREIGN KEY (ativo_id) REFERENCES ativos(id)
+    )
+'''
+
+TABELA_NOTAS_CORRETAGEM_CENTAVOS = '''
+    CREATE TABLE notas_corretagem (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        numero TEXT,
+        corretora TEXT NOT NULL,
+        data_pregao DATE NOT NULL,
+        valor_total INTEGER,
+        total_taxas INTEGER
+    )
+'''
+
+TABELA_POSICOES_CENTAVOS = '''
+    CREATE TABLE posicoes (
+        ativo_id INTEGER PRIMARY KEY,
+        quantidade INTEGER NOT NULL DEFAULT 0,
+        custo_total INTEGER NOT NULL DEFAULT 0,
+        preco_medio REAL NOT NULL DEFAULT 0,
+        lucro_realizado INTEGER NOT NULL DEFAULT 0,
+        data_ultima_operacao TEXT,
+        FOREIGN KEY (ativo_id) REFERENCES ativos(id)
+    )
+'''
+
+TABELA_APURACAO_MENSAL_CENTAVOS = '''
+    CREATE TABLE apuracao_mensal (
+        mes TEXT NOT NULL,
+        categoria TEXT NOT NULL,
+        vendas INTEGER NOT NULL DEFAULT 0,
+        resultado INTEGER NOT NULL DEFAULT 0,
+        isento INTEGER NOT NULL DEFAULT 0,
+        prejuizo_acumulado INTEGER NOT NULL DEFAULT 0,
+        base_calculo INTEGER NOT NULL DEFAULT 0,
+        imposto INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (mes, categoria)
+    )
+'''
+
+TABELA_POSICOES_MENSAIS_CENTAVOS = '''
+    CREATE TABLE posicoes_mensais (
+        ativo_id INTEGER NOT NULL,
+        mes TEXT NOT NULL,
+        quantidade INTEGER NOT NULL,
+        custo_total INTEGER NOT NULL,
+        preco_medio REAL NOT NULL DEFAULT 0,
+        PRIMARY KEY (ativo_id, mes),
+        FOREIGN KEY (ativo_id) REFERENCES ativos(id)
+    )
+'''
+
+TABELA_RESUMO_CENTAVOS = '''
+    CREATE TABLE {tabela} (
+        ativo_id INTEGER NOT NULL,
+        {periodo} TEXT NOT NULL,
+        qtd_compra INTEGER NOT NULL DEFAULT 0,
+        valor_compra INTEGER NOT NULL DEFAULT 0,
+        qtd_venda INTEGER NOT NULL DEFAULT 0,
+        valor_venda INTEGER NOT NULL DEFAULT 0,
+        corretagem INTEGER NOT NULL DEFAULT 0,
+        num_operacoes INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (ativo_id, {periodo}),
+        FOREIGN KEY (ativo_id) REFERENCES ativos(id)
+    )
+'''
+
+# Esquema 10: fechamentos e último preço em centavos.
+TABELA_ATIVOS_CENTAVOS = '''
+    CREATE TABLE ativos (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        codigo TEXT NOT NULL UNIQUE,
+        tipo TEXT,
+        ultimo_preco INTEGER,
+        data_ultimo_preco TEXT
+    )
+'''
+
+TABELA_PRECOS_CENTAVOS = '''
+    CREATE TABLE precos (
+        ativo_id INTEGER NOT NULL,
+        data TEXT NOT NULL,
+        fechamento INTEGER NOT NULL,
+        PRIMARY KEY (ativo_id, data),
+        FOREIGN KEY (ativo_id) REFERENCES ativos(id)
+    ) WITHOUT ROWID
+'''
+
+
+def _criar_esquema_base(conn):
+    """Cria as tabelas que ainda não existem."""
+    for tabela, criacao in (
+        ('ativos', TABELA_ATIVOS),
+        ('operacoes', TABELA_OPERACOES),
+        ('notas_corretagem', TABELA_NOTAS_CORRETAGEM),
+        ('eventos', TABELA_EVENTOS),
+    ):
+        conn.execute(criacao.replace(f'CREATE TABLE {tabela} ', f'CREATE TABLE IF NOT EXISTS {tabela} ', 1))
+
+
+def _reconciliar_esquemas(conn):
+    """Ajusta bancos criados por versões anteriores ao esquema atual.
+
+    Versões antigas criavam `ativos` com colunas NOT NULL que o código não preenche,
+    `notas_corretagem` com o número como chave primária (colidindo entre corretoras) e
+    `operacoes` sem as colunas usadas pelo registro de notas.
+    """
+    colunas_ativos = _colunas(conn, 'ativos')
+    indices_ativos = [linha[1] for linha in conn.execute("PRAGMA index_list(ativos)") if linha[2]]
+    if (any(linha[3] and nome not in ('id', 'codigo') for nome, linha in colunas_ativos.items())
+            or not indices_ativos):
+        _reconstruir_tabela(conn, 'ativos', TABELA_ATIVOS, ('id', 'codigo', 'tipo'))
+    elif 'tipo' not in colunas_ativos:
+        conn.execute('ALTER TABLE ativos ADD COLUMN tipo TEXT')
+
+    if _colunas(conn, 'notas_corretagem').get('numero', (None,) * 6)[5]:
+        _reconstruir_tabela(conn, 'notas_corretagem', TABELA_NOTAS_CORRETAGEM,
+                            ('numero', 'corretora', 'data_pregao', 'valor_total', 'total_taxas'))
+
+    colunas_operacoes = _colunas(conn, 'operacoes')
+    for coluna, tipo in (
+        ('valor', 'REAL'),
+        ('preco_venda', 'REAL'),
+        ('preco_compra', 'REAL'),
+        ('corretora', 'TEXT'),
+        ('numero_nota', 'TEXT'),
+    ):
+        if coluna not in colunas_operacoes:
+            conn.execute(f'ALTER TABLE operacoes ADD COLUMN {coluna} {tipo}')
+
+
+def _criar_indices(conn):
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_operacoes_data ON operacoes (data)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_operacoes_ativo_data ON operacoes (ativo_id, data)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_operacoes_nota ON operacoes (corretora, numero_nota)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_eventos_ativo_data ON eventos (ativo_id, data)')
+    conn.execute('''
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_notas_corretagem_unica
+        ON notas_corretagem (corretora, numero, data_pregao)
+    ''')
+    conn.execute('ANALYZE')
+
+
+def _criar_posicoes(conn):
+    """Cria a tabela de posições; ela é preenchida por `models.posicoes.Posicoes`."""
+    conn.execute(TABELA_POSICOES)
+
+
+def _criar_apuracao_mensal(conn):
+    """Cria as tabelas da apuração mensal; elas são preenchidas por `models.impostos.ApuracaoMensal`."""
+    conn.execute(TABELA_APURACAO_MENSAL)
+    conn.execute(TABELA_POSICOES_MENSAIS)
+    conn.execute('CREATE INDEX idx_posicoes_mensais_mes ON posicoes_mensais (mes)')
+
+
+
+def _criar_resumos(conn):
+    """Cria os resumos diário e mensal por ativo, preenchidos a partir das operações existentes."""
+    conn.execute(TABELA_RESUMO_DIARIO)
+    conn.execute(TABELA_RESUMO_MENSAL)
+    conn.execute('CREATE INDEX idx_resumo_diario_data ON resumo_diario (data)')
+    conn.execute('CREATE INDEX idx_resumo_mensal_mes ON resumo_mensal (mes)')
+    for tabela, coluna_periodo, periodo in (
+        ('resumo_diario', 'data', 'date(data)'),
+        ('resumo_mensal', 'mes', 'substr(date(data), 1, 7)'),
+    ):
+        conn.execute(f'''
+            INSERT INTO {tabela}
+            (ativo_id, {coluna_periodo}, qtd_compra, valor_compra, qtd_venda, valor_venda, corretagem, num_operacoes)
+            SELECT ativo_id, {periodo},
+                   SUM(CASE WHEN tipo = 'Compra' THEN quantidade ELSE 0 END),
+                   SUM(CASE WHEN tipo = 'Compra' THEN valor ELSE 0 END),
+                   SUM(CASE WHEN tipo = 'Compra' THEN 0 ELSE quantidade END),
+                   SUM(CASE WHEN tipo = 'Compra' THEN 0 ELSE valor END),
+                   SUM(COALESCE(corretagem, 0)),
+                   COUNT(*)
+            FROM operacoes
+            WHERE ativo_id IS NOT NULL AND data IS NOT NULL
+            GROUP BY ativo_id, {periodo}
+        ''')
+
+
+def _criar_precos(conn):
+    """Cria o histórico de fechamentos e o último preço de cada ativo; preenchidos por `models.precos.Precos`."""
+    conn.execute(TABELA_PRECOS)
+    conn.execute('ALTER TABLE ativos ADD COLUMN ultimo_preco REAL')
+    conn.execute('ALTER TABLE ativos ADD COLUMN data_ultimo_preco TEXT')
+
+
+def _converter_tabela_centavos(conn, tabela, criacao, monetarias):
+    """Recria `tabela` com o DDL `criacao`, convertendo as colunas `monetarias` de reais para centavos."""
+    colunas = list(_colunas(conn, tabela))
+    selecao = ', '.join(
+        f'CAST(ROUND({coluna} * 100) AS INTEGER)' if coluna in monetarias else coluna
+        for coluna in colunas
+    )
+    conn.execute(criacao.replace(f'CREATE TABLE {tabela} ', f'CREATE TABLE {tabela}_nova ', 1))
+    conn.execute(f"INSERT INTO {tabela}_nova ({', '.join(colunas)}) SELECT {selecao} FROM {tabela}")
+    conn.execute(f'DROP TABLE {tabela}')
+    conn.execute(f'ALTER TABLE {tabela}_nova RENAME TO {tabela}')
+
+
+def _converter_centavos(conn):
+    """Grava os valores monetários em centavos inteiros.
+
+    `operacoes` e `notas_corretagem` são convertidas; as tabelas derivadas (posições,
+    apuração e resumos) são recriadas vazias e preenchidas de novo pelas classes de
+    `models`, que as reconstroem quando as encontram vazias.
+    """
+    _converter_tabela_centavos(conn, 'operacoes', TABELA_OPERACOES_CENTAVOS,
+                               {'preco', 'corretagem', 'valor', 'preco_venda', 'preco_compra'})
+    _converter_tabela_centavos(conn, 'notas_corretagem', TABELA_NOTAS_CORRETAGEM_CENTAVOS,
+                               {'valor_total', 'total_taxas'})
+    # DROP TABLE remove os índices junto; os de `operacoes` e `notas_corretagem` são recriados
+    _criar_indices(conn)
+
+    for tabela in ('posicoes', 'apuracao_mensal', 'posicoes_mensais', 'resumo_diario', 'resumo_mensal'):
+        conn.execute(f'DROP TABLE {tabela}')
+    conn.execute(TABELA_POSICOES_CENTAVOS)
+    conn.execute(TABELA_APURACAO_MENSAL_CENTAVOS)
+    conn.execute(TABELA_POSICOES_MENSAIS_CENTAVOS)
+    conn.execute('CREATE INDEX idx_posicoes_mensais_mes ON posicoes_mensais (mes)')
+    conn.execute(TABELA_RESUMO_CENTAVOS.format(tabela='resumo_diario', periodo='data'))
+    conn.execute(TABELA_RESUMO_CENTAVOS.format(tabela='resumo_mensal', periodo='mes'))
+    conn.execute('CREATE INDEX idx_resumo_diario_data ON resumo_diario (data)')
+    conn.execute('CREATE INDEX idx_resumo_mensal_mes ON resumo_mensal (mes)')
+
+
+def _refazer_posicoes_com_ajustes(conn):
+    """Esvazia posições e apuração quando há desdobramentos ou grupamentos.
+
+    As posições de fim de mês passam a ficar na base de ações de cada mês e as frações
+    de um ajuste saem da posição; as classes de `models` reconstroem as tabelas vazias.
+    """
+    if conn.execute("SELECT 1 FROM eventos WHERE tipo IN ('DESDOBRAMENTO', 'GRUPAMENTO') LIMIT 1").fetchone():
+        for tabela in ('posicoes', 'apuracao_mensal', 'posicoes_mensais'):
+            conn.execute(f'DELETE FROM {tabela}')
+
+
+def _converter_precos_e_proventos_centavos(conn):
+    """Grava fechamentos, último preço e proventos por ação em centavos.
+
+    `eventos.valor` continua REAL: nos desdobramentos e grupamentos é a proporção, e o
+    provento por ação costuma ter mais de duas casas decimais, então fica em centavos
+    fracionários (como o preço médio); os totais recebidos são arredondados ao centavo.
+    """
+    _converter_tabela_centavos(conn, 'ativos', TABELA_ATIVOS_CENTAVOS, {'ultimo_preco'})
+    _converter_tabela_centavos(conn, 'precos', TABELA_PRECOS_CENTAVOS, {'fechamento'})
+    conn.execute("UPDATE eventos SET valor = valor * 100 WHERE tipo IN ('DIVIDENDO', 'JCP')")
+
+
+MIGRACOES = [
+    (1, 'Esquema base', _criar_esquema_base),
+    (2, 'Reconciliação de esquemas antigos', _reconciliar_esquemas),
+    (3, 'Índices de operações, eventos e notas', _criar_indices),
+    (4, 'Posições por ativo', _criar_posicoes),
+    (5, 'Apuração mensal de impostos', _criar_apuracao_mensal),
+    (6, 'Resumos diário e mensal por ativo', _criar_resumos),
+    (7, 'Preços de fechamento por ativo', _criar_precos),
+    (8, 'Valores monetários em centavos', _converter_centavos),
+    (9, 'Frações e base de ações das posições mensais', _refazer_posicoes_com_ajustes),
+    (10, 'Fechamentos e proventos em centavos', _converter_precos_e_proventos_centavos),
+]
+
+
+def versao_atual(conn) -> int:
+    return conn.execute('PRAGMA user_version').fetchone()[0]
+
+
+def aplicar_migracoes(conn) -> int:
+    """Aplica as migrações pendentes e retorna a versão final do esquema.
+
+    A versão é relida depois de obter o lock de escrita: outro processo abrindo o mesmo
+    banco (CLI e aplicativo) pode ter aplicado a migração enquanto este esperava.
+    """
+    versao = versao_atual(conn)
+    for numero, descricao, migracao in MIGRACOES:
+        if numero <= versao:
+            continue
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            versao = versao_atual(conn)
+            if numero <= versao:
+                conn.rollback()
+                continue
+            logger.info(f"Aplicando migração {numero}: {descricao}")
+            migracao(conn)
+            conn.execute(f'PRAGMA user_version = {numero}')
+        except Exception:
+            conn.rollback()
+            raise
+        conn.commit()
+        versao = numero
+    return versao
@@ -1,16 +1,159 @@
+import os
+import time
 import streamlit as st
-import pandas as pd
-import matplotlib.pyplot as plt
-from models.relatorios import RelatorioPDF
-from models.impostos import Impostos
+from config.config import CORRETORAS, TIPOS_EVENTOS
+from interface.tarefas import TAREFA_INGESTAO, TAREFA_PRECOS, TAREFA_RELATORIO, salvar_uploads
+from models.exportacao import COLUNAS_EXPORTACAO, FORMATOS_EXPORTACAO
+from models.tarefas import CONCLUIDA, EXECUTANDO, ERRO, PENDENTE, STATUS_FINAIS
+from utils.metricas import metricas
+
+TITULOS_TAREFAS = {
+    TAREFA_INGESTAO: "Importação de notas",
+    TAREFA_RELATORIO: "Relatório PDF",
+    TAREFA_PRECOS: "Atualização de cotações",
+}
+INTERVALO_ATUALIZACAO_TAREFAS = 1.0  # segundos entre consultas ao progresso das tarefas ativas
 
 class App:
-    def __init__(self, processador_notas, operacoes):
-        self.processador_notas = processador_notas
-        self.operacoes = operacoes
+    def __init__(self, registro):
+        # O registro vem de `st.cache_resource`; o App em si é recriado a cada rerun
+        self.registro = registro
+        self.tarefas = registro.tarefas
+
+    def _selecionar_conta(self):
+        """Escolhe a conta na barra lateral; o painel usa só o banco dela."""
+        with st.sidebar.expander("Nova conta"):
+            nome = st.text_input("Nome da conta")
+            corretora = st.selectbox("Corretora da conta", CORRETORAS)
+            if st.button("Cadastrar Conta"):
+                try:
+                    self.registro.catalogo.registrar(nome, corretora)
+                except ValueError as e:
+                    st.error(str(e))
+                else:
+                    st.session_state['conta'] = nome.strip()
+
+        contas = self.registro.contas()
+        if st.session_state.get('conta') not in contas:
+            st.session_state['conta'] = contas[0]
+        self.conta = st.sidebar.selectbox("Conta", contas, key='conta')
+
+        servicos = self.registro.servicos(self.conta)
+        self.processador_notas = servicos.processador_notas
+        self.operacoes = servicos.operacoes
+        self.exportador = servicos.exportador
+        self.gerador_relatorios = servicos.gerador_relatorios
+        self.grafico = servicos.grafico
+
+    @staticmethod
+    def _remover_exportacao_anterior():
+        arquivo = st.session_state.pop('arquivo_exportacao', None)
+        if arquivo and os.path.exists(arquivo):
+            os.remove(arquivo)
+
+    def _mostrar_tarefas(self) -> dict:
+        """Mostra as tarefas recentes e retorna {id: espaço da barra de progresso} das ainda ativas."""
+        tarefas = self.tarefas.listar(limite=10)
+        if not tarefas:
+            st.write("Nenhuma tarefa.")
+            return {}
+        barras = {}
+
+        for tarefa in tarefas:
+            titulo = TITULOS_TAREFAS.get(tarefa['tipo'], tarefa['tipo'])
+            if tarefa['parametros'].get('conta'):
+                titulo += f" - {tarefa['parametros']['conta']}"
+            st.write(f"**#{tarefa['id']} {titulo}** ({tarefa['status']}, criada em {tarefa['criada_em']})")
+
+            if tarefa['status'] in (PENDENTE, EXECUTANDO):
+                barras[tarefa['id']] = st.empty()
+                barras[tarefa['id']].progress(tarefa['progresso'], text=tarefa['mensagem'] or "Na fila")
+                if tarefa['cancelar']:
+                    st.caption("Cancelamento solicitado")
+                elif st.button("Cancelar", key=f"cancelar_tarefa_{tarefa['id']}"):
+                    self.tarefas.cancelar(tarefa['id'])
+            elif tarefa['status'] == ERRO:
+                st.error(tarefa['erro'])
+            elif tarefa['status'] == CONCLUIDA:
+                self._mostrar_resultado(tarefa)
+
+        return barras
+
+    def _acompanhar_tarefas(self, barras: dict):
+        """Atualiza só as barras de progresso até alguma tarefa terminar, sem rodar a página de novo.
+
+        Chamado no fim do script, com a página já desenhada; uma interação do usuário
+        interrompe o laço. Quando uma tarefa termina, um único rerun mostra o resultado.
+        """
+        while barras:
+            time.sleep(INTERVALO_ATUALIZACAO_TAREFAS)
+            for id_tarefa, barra in barras.items():
+                tarefa = self.tarefas.obter(id_tarefa)
+                if tarefa is None or tarefa['status'] in STATUS_FINAIS:
+                    st.experimental_rerun()
+                barra.progress(tarefa['progresso'], text=tarefa['mensagem'] or "Na fila")
+
+    def _mostrar_resultado(self, tarefa):
+        resultado = tarefa['resultado'] or {}
+        if tarefa['tipo'] == TAREFA_INGESTAO:
+            st.success(f"{resultado['notas']} notas e {resultado['operacoes']} operações registradas "
+                       f"de {resultado['arquivos']} arquivos; {resultado['duplicadas']} notas já importadas.")
+            for erro in resultado['erros']:
+                st.error(erro)
+        elif tarefa['tipo'] == TAREFA_PRECOS:
+            st.success(f"{resultado['fechamentos']} fechamentos gravados.")
+        elif os.path.exists(resultado.get('caminho', '')):
+            with open(resultado['caminho'], 'rb') as arquivo:
+                baixado = st.download_button(
+                    label="Baixar Relatório PDF",
+                    data=arquivo,
+                    file_name="relatorio.pdf",
+                    mime="application/pdf",
+                    key=f"baixar_relatorio_{tarefa['id']}"
+                )
+            if baixado:
+                # O conteúdo já foi entregue ao navegador; a tarefa sai da lista com o arquivo
+                self.tarefas.remover(tarefa['id'])
+        else:
+            st.caption("Arquivo do relatório não está mais disponível.")
+
+    @staticmethod
+    def _mostrar_diagnostico():
+        """Painel com os tempos por etapa coletados pelas métricas (valem para todo o processo)."""
+        with st.expander("Diagnóstico de desempenho"):
+            metricas.ativo = st.checkbox("Coletar métricas", value=metricas.ativo)
+            resumo = metricas.resumo()
+            if resumo['tempos']:
+                st.dataframe([{'etapa': nome, **valores} for nome, valores in resumo['tempos'].items()])
+            if resumo['contadores']:
+                st.write(resumo['contadores'])
+            if not resumo['tempos'] and not resumo['contadores']:
+                st.write("Nenhuma métrica coletada.")
+            st.download_button(
+                label="Exportar Métricas (JSON)",
+                data=metricas.exportar_json(),
+                file_name="metricas.json",
+                mime="application/json"
+            )
+            if st.button("Limpar Métricas"):
+                metricas.limpar()
+
+    def _mostrar_consolidado(self):
+        """Totais e posições somados sobre todas as contas; só consulta os outros bancos quando pedido."""
+        st.header("Consolidado das Contas")
+        if not st.button("Consolidar Contas"):
+            return
+        consolidacao = self.registro.consolidacao()
+        totais = consolidacao.totais_por_conta()
+        st.write(f"Saldo Total: R$ {totais['saldo_total'].sum():.2f}")
+        st.write(f"Lucro/Prejuízo: R$ {totais['lucro_realizado'].sum():.2f}")
+        st.dataframe(totais)
+        st.subheader("Posições Consolidadas")
+        st.dataframe(consolidacao.posicoes())
 
     def executar(self):
         st.title("EVS Controle de Investimentos em Ações")
+        self._selecionar_conta()
 
         # Seção de upload de notas
         st.header("Upload de Notas de Corretagem")
@@ -26,32 +169,12 @@ class App:
         )
 
         if st.button("Processar Notas") and arquivos:
-            with st.spinner("Processando notas..."):
-                for arquivo in arquivos:
-                    try:
-                        dados_nota = self.processador_notas.processar_nota(arquivo, corretora)
-                        for operacao in dados_nota['operacoes']:
-                            operacao['codigo'] = operacao['ativo']  # Adiciona o código do ativo à operação
-                            if self.operacoes.registrar_operacao(operacao):
-                                st.success(f"Operação {operacao['tipo']} de {operacao['quantidade']} {operacao['ativo']} registrada com sucesso!")
-                            else:
-                                st.error(f"Erro ao registrar operação {operacao['tipo']} de {operacao['quantidade']} {operacao['ativo']}")
-
-                        # Mostrar resumo da nota
-                        st.subheader(f"Resumo da Nota {dados_nota['numero_nota']}")
-
-                        # Tabela de operações
-                        df_operacoes = pd.DataFrame(dados_nota['operacoes'])
-                        st.write("Operações:")
-                        st.dataframe(df_operacoes)
-
-                        # Taxas
-                        st.write("Taxas:")
-                        for taxa, valor in dados_nota['taxas'].items():
-                            st.write(f"{taxa}: R$ {valor:.2f}")
-
-                    except Exception as e:
-                        st.error(f"Erro ao processar arquivo: {str(e)}")
+            id_tarefa = self.tarefas.enviar(TAREFA_INGESTAO, {
+                'arquivos': salvar_uploads(arquivos),
+                'corretora': corretora,
+                'conta': self.conta,
+            })
+            st.info(f"Importação enviada como tarefa #{id_tarefa}; acompanhe em Tarefas.")
 
         # Seção de visualização de operações
         st.header("Visualização de Operações")
@@ -65,28 +188,43 @@ class App:
 
             # Resumo por ativo
             st.subheader("Resumo por Ativo")
-            resumo_ativos = df_operacoes.groupby('ativo').agg({
-                'quantidade': 'sum',
-                'preco': 'mean',
-                'valor': 'sum'
-            }).reset_index()
+            resumo_ativos = self.operacoes.obter_resumo_por_ativo(filtro_data_inicio, filtro_data_fim)
             st.dataframe(resumo_ativos)
 
             # Gráfico de desempenho
             st.subheader("Gráfico de Desempenho")
-            fig, ax = plt.subplots()
-            for ativo in resumo_ativos['ativo']:
-                df_ativo = df_operacoes[df_operacoes['ativo'] == ativo]
-                ax.plot(df_ativo['data'], df_ativo['valor'], label=ativo)
-            ax.legend()
-            st.pyplot(fig)
+            st.plotly_chart(self.grafico.figura(filtro_data_inicio, filtro_data_fim), use_container_width=True)
 
         # Seção de exportação de dados
         st.header("Exportação de Dados")
-        if st.button("Exportar para CSV"):
-            df_operacoes = self.operacoes.obter_todas_operacoes()
-            df_operacoes.to_csv("operacoes.csv", index=False)
-            st.success("Dados exportados com sucesso!")
+        formato = st.selectbox("Formato", FORMATOS_EXPORTACAO, format_func=str.upper)
+        colunas = st.multiselect("Colunas", list(COLUNAS_EXPORTACAO), default=list(COLUNAS_EXPORTACAO))
+        filtrar_periodo = st.checkbox("Exportar apenas um período")
+        if filtrar_periodo:
+            exportar_inicio = st.date_input("Exportar a partir de")
+            exportar_fim = st.date_input("Exportar até")
+        else:
+            exportar_inicio = exportar_fim = None
+
+        if st.button("Exportar Operações"):
+            self._remover_exportacao_anterior()
+            try:
+                st.session_state['arquivo_exportacao'] = self.exportador.gerar_arquivo(
+                    formato, colunas, exportar_inicio, exportar_fim
+                )
+            except Exception as e:
+                st.error(f"Erro ao exportar operações: {e}")
+
+        arquivo_exportacao = st.session_state.get('arquivo_exportacao')
+        if arquivo_exportacao and os.path.exists(arquivo_exportacao):
+            extensao = os.path.splitext(arquivo_exportacao)[1]
+            with open(arquivo_exportacao, 'rb') as arquivo:
+                st.download_button(
+                    label="Baixar Operações",
+                    data=arquivo,
+                    file_name=f"operacoes{extensao}",
+                    mime="text/csv" if extensao == '.csv' else "application/octet-stream"
+                )
 
         # Seção de saldo total e lucro/prejuízo
         st.header("Saldo Total e Lucro/Prejuízo")
@@ -95,23 +233,80 @@ class App:
         st.write(f"Saldo Total: R$ {saldo_total:.2f}")
         st.write(f"Lucro/Prejuízo: R$ {lucro_prejuizo:.2f}")
 
+        posicoes = self.operacoes.obter_posicoes()
+        if not posicoes.empty:
+            st.subheader("Posições")
+            st.dataframe(posicoes)
+
+            # Avaliação pelos fechamentos já gravados; a busca no provedor é uma tarefa
+            avaliacao = self.operacoes.obter_avaliacao_carteira()
+            st.subheader("Valor de Mercado")
+            st.write(f"Valor de Mercado: R$ {avaliacao['valor_mercado'].sum():.2f}")
+            st.write(f"Resultado Não Realizado: R$ {avaliacao['resultado_nao_realizado'].sum():.2f}")
+            if sem_preco := avaliacao.loc[avaliacao['ultimo_preco'].isna(), 'codigo'].tolist():
+                st.caption(f"Sem cotação: {', '.join(sem_preco)}")
+            st.dataframe(avaliacao)
+            if st.button("Atualizar Cotações"):
+                id_tarefa = self.tarefas.enviar(TAREFA_PRECOS, {'conta': self.conta})
+                st.info(f"Atualização de cotações enviada como tarefa #{id_tarefa}; acompanhe em Tarefas.")
+
+        apuracao = self.operacoes.obter_apuracao_mensal()
+        if not apuracao.empty:
+            st.subheader("Apuração Mensal de Impostos")
+            st.dataframe(apuracao)
+
+        # Seção de eventos corporativos e proventos
+        st.header("Eventos Corporativos e Proventos")
+        with st.form("evento"):
+            evento_ativo = st.text_input("Ativo")
+            evento_tipo = st.selectbox("Tipo", TIPOS_EVENTOS)
+            evento_data = st.date_input("Data do evento")
+            evento_valor = st.number_input(
+                "Valor (proporção para desdobramento/grupamento, R$ por ação para proventos)",
+                min_value=0.0, format="%.6f"
+            )
+            if st.form_submit_button("Registrar Evento"):
+                try:
+                    registrado = self.operacoes.registrar_evento(
+                        evento_ativo.strip().upper(), evento_tipo, evento_data, evento_valor
+                    )
+                except ValueError as e:
+                    st.error(str(e))
+                else:
+                    if registrado:
+                        st.success(f"{evento_tipo} de {evento_ativo.strip().upper()} registrado.")
+                    else:
+                        st.error("Erro ao registrar o evento.")
+
+        resumo_eventos = self.operacoes.obter_resumo_mensal_eventos()
+        if not resumo_eventos.empty:
+            st.subheader("Negociações e Proventos por Mês")
+            st.dataframe(resumo_eventos)
+
         # Seção de geração de relatórios
         st.header("Geração de Relatórios")
+        relatorio_inicio = st.date_input("Relatório a partir de")
+        relatorio_fim = st.date_input("Relatório até")
+        incluir_operacoes = st.checkbox("Incluir lista de operações", value=True)
+
         if st.button("Gerar Relatório PDF"):
-            dados = {
-                'resumo': {
-                    'saldo_total': saldo_total,
-                    'lucro_prejuizo': lucro_prejuizo
-                },
-                'operacoes': df_operacoes.to_dict(orient='records'),
-                'impostos': Impostos(df_operacoes.to_dict(orient='records')).calcular_imposto()
-            }
-            relatorio_pdf = RelatorioPDF()
-            pdf_bytes = relatorio_pdf.gerar_relatorio(dados)
-            st.download_button(
-                label="Baixar Relatório PDF",
-                data=pdf_bytes,
-                file_name="relatorio.pdf",
-                mime="application/pdf"
-            )
+            id_tarefa = self.tarefas.enviar(TAREFA_RELATORIO, {
+                'inicio': str(relatorio_inicio),
+                'fim': str(relatorio_fim),
+                'incluir_operacoes': incluir_operacoes,
+                'conta': self.conta,
+            }, substituir=True)
+            st.info(f"Relatório enviado como tarefa #{id_tarefa}; acompanhe em Tarefas.")
+
+        if len(self.registro.contas()) > 1:
+            self._mostrar_consolidado()
+
+        self._mostrar_diagnostico()
 
+        # Seção de tarefas em segundo plano; o estado fica no banco de tarefas e sobrevive aos reruns
+        st.header("Tarefas")
+        barras = self._mostrar_tarefas()
+        atualizar = st.checkbox("Atualizar automaticamente", value=True)
+        st.button("Atualizar")
+        if atualizar:
+            self._acompanhar_tarefas(barras)
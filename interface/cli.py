@@ -0,0 +1,231 @@
+"""Ingestão de notas pela linha de comando, sem o Streamlit.
+
+Uso:
+    python -m interface.cli ingest <diretorio> --corretora XP [--conta NOME] [--workers N] [--watch]
+
+Cada conta tem o seu banco; importações de contas diferentes podem rodar ao mesmo tempo.
+"""
+import argparse
+import contextlib
+import json
+import logging
+import os
+import sys
+import time
+from typing import Dict, List, Optional
+from config.config import CONTA_PADRAO, CORRETORAS, WORKERS_PROCESSAMENTO
+
+logger = logging.getLogger(__name__)
+
+NOME_CHECKPOINT = '.checkpoint_ingestao.json'
+
+
+class Estatisticas:
+    """Contadores da ingestão e taxas por segundo desde o início."""
+
+    def __init__(self):
+        self.inicio = time.perf_counter()
+        self.arquivos = 0
+        self.notas = 0
+        self.duplicadas = 0
+        self.operacoes = 0
+        self.erros = 0
+
+    def resumo(self) -> str:
+        decorrido = max(time.perf_counter() - self.inicio, 1e-9)
+        return (f"{self.arquivos} arquivos ({self.arquivos / decorrido:.1f}/s), "
+                f"{self.notas} notas ({self.notas / decorrido:.1f}/s), "
+                f"{self.operacoes} operações ({self.operacoes / decorrido:.1f}/s), "
+                f"{self.duplicadas} duplicadas, {self.erros} erros em {decorrido:.1f}s")
+
+
+class IngestaoNotas:
+    """Processa os PDFs de um diretório e registra as notas no banco.
+
+    O checkpoint (JSON) guarda tamanho e data de modificação de cada arquivo já tratado,
+    então uma execução interrompida continua de onde parou e arquivos alterados são
+    reprocessados. A extração roda no pool de processos do `ProcessadorNotas`; o
+    registro no banco fica neste processo, que é o único escritor.
+    """
+
+    def __init__(self, processador_notas, operacoes, corretora: str, workers: int = WORKERS_PROCESSAMENTO,
+                 caminho_checkpoint: Optional[str] = None, tamanho_lote: Optional[int] = None):
+        self.processador_notas = processador_notas
+        self.operacoes = operacoes
+        self.corretora = corretora
+        self.workers = workers
+        self.caminho_checkpoint = caminho_checkpoint
+        self.tamanho_lote = tamanho_lote or max(workers * 4, 1)
+        self.checkpoint = self._carregar_checkpoint()
+        self.estatisticas = Estatisticas()
+
+    def _carregar_checkpoint(self) -> Dict[str, Dict]:
+        if not self.caminho_checkpoint or not os.path.exists(self.caminho_checkpoint):
+            return {}
+        try:
+            with open(self.caminho_checkpoint, encoding='utf-8') as arquivo:
+                return json.load(arquivo).get('arquivos', {})
+        except (OSError, ValueError) as e:
+            logger.warning(f"Checkpoint inválido em {self.caminho_checkpoint}, ignorando: {e}")
+            return {}
+
+    def _salvar_checkpoint(self) -> None:
+        if not self.caminho_checkpoint:
+            return
+        temporario = f"{self.caminho_checkpoint}.tmp"
+        with open(temporario, 'w', encoding='utf-8') as arquivo:
+            json.dump({'arquivos': self.checkpoint}, arquivo, ensure_ascii=False, indent=1)
+        os.replace(temporario, self.caminho_checkpoint)
+
+    @staticmethod
+    def _assinatura(estado: os.stat_result) -> Dict:
+        return {'tamanho': estado.st_size, 'modificacao': estado.st_mtime_ns}
+
+    def varrer(self, diretorio: str, recursivo: bool = False, espera: float = 0) -> List[str]:
+        """Lista os PDFs ainda não processados (ou alterados desde então), em ordem de nome.
+
+        Arquivos modificados há menos de `espera` segundos são ignorados, pois ainda podem
+        estar sendo copiados.
+        """
+        agora = time.time()
+        pendentes = []
+        for raiz, subdiretorios, arquivos in os.walk(diretorio):
+            if not recursivo:
+                subdiretorios.clear()
+            for nome in arquivos:
+                if not nome.lower().endswith('.pdf'):
+                    continue
+                caminho = os.path.abspath(os.path.join(raiz, nome))
+                try:
+                    estado = os.stat(caminho)
+                except OSError:
+                    continue
+                if agora - estado.st_mtime < espera:
+                    continue
+                registro = self.checkpoint.get(caminho)
+                if registro is None or {k: registro.get(k) for k in ('tamanho', 'modificacao')} != self._assinatura(estado):
+                    pendentes.append(caminho)
+        return sorted(pendentes)
+
+    def processar(self, caminhos: List[str]) -> None:
+        """Processa os arquivos em um único pool, gravando o checkpoint a cada `tamanho_lote` arquivos."""
+        assinaturas = {}
+        for caminho in caminhos:
+            try:
+                assinaturas[caminho] = self._assinatura(os.stat(caminho))
+            except OSError:
+                assinaturas[caminho] = {}
+
+        resultados = self.processador_notas.processar_em_fluxo(caminhos, self.corretora, self.workers)
+        with contextlib.closing(resultados):
+            for concluidos, (caminho, resultado) in enumerate(zip(caminhos, resultados), 1):
+                registro = {**assinaturas[caminho], 'notas': 0, 'operacoes': 0, 'erro': resultado['erro']}
+                if not resultado['erro']:
+                    self._registrar_notas(resultado['notas'], registro)
+                if registro['erro']:
+                    self.estatisticas.erros += 1
+                    print(f"Erro em {caminho}: {registro['erro']}", file=sys.stderr)
+                self.checkpoint[caminho] = registro
+                self.estatisticas.arquivos += 1
+
+                if concluidos % self.tamanho_lote == 0 or concluidos == len(caminhos):
+                    self._salvar_checkpoint()
+                    print(self.estatisticas.resumo(), flush=True)
+
+    def _registrar_notas(self, notas: List[Dict], registro: Dict) -> None:
+        for dados_nota in notas:
+            try:
+                if not self.operacoes.registrar_nota(dados_nota):
+                    self.estatisticas.duplicadas += 1
+                    continue
+            except Exception as e:
+                registro['erro'] = f"nota {dados_nota.get('numero_nota')}: {e}"
+                continue
+            registro['notas'] += 1
+            registro['operacoes'] += len(dados_nota['operacoes'])
+            self.estatisticas.notas += 1
+            self.estatisticas.operacoes += len(dados_nota['operacoes'])
+
+    def executar(self, diretorio: str, recursivo: bool = False, observar: bool = False,
+                 intervalo: float = 5.0, espera: float = 2.0) -> Estatisticas:
+        """Processa o diretório; em modo `observar`, continua verificando novos arquivos até Ctrl+C."""
+        try:
+            self.processar(self.varrer(diretorio, recursivo))
+            while observar:
+                time.sleep(intervalo)
+                if pendentes := self.varrer(diretorio, recursivo, espera):
+                    self.processar(pendentes)
+        except KeyboardInterrupt:
+            self._salvar_checkpoint()
+            print("Interrompido; o checkpoint foi salvo.", file=sys.stderr)
+        return self.estatisticas
+
+
+def criar_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog='python -m interface.cli', description=__doc__.splitlines()[0])
+    comandos = parser.add_subparsers(dest='comando', required=True)
+
+    ingest = comandos.add_parser('ingest', help="Importa as notas em PDF de um diretório")
+    ingest.add_argument('diretorio')
+    ingest.add_argument('--corretora', required=True, choices=CORRETORAS)
+    ingest.add_argument('--workers', type=int, default=WORKERS_PROCESSAMENTO)
+    destino = ingest.add_mutually_exclusive_group()
+    destino.add_argument('--conta', help="Conta do catálogo que recebe as notas (padrão: a conta padrão)")
+    destino.add_argument('--db', help="Arquivo do banco SQLite, em vez de uma conta do catálogo")
+    ingest.add_argument('--checkpoint', help=f"Arquivo de checkpoint (padrão: <diretorio>/{NOME_CHECKPOINT})")
+    ingest.add_argument('--recursivo', action='store_true', help="Inclui subdiretórios")
+    ingest.add_argument('--watch', action='store_true', help="Continua observando o diretório")
+    ingest.add_argument('--intervalo', type=float, default=5.0, help="Segundos entre verificações no modo --watch")
+    ingest.add_argument('--metricas', metavar='ARQUIVO', help="Coleta tempos por etapa e grava o resumo em JSON")
+    ingest.add_argument('--perfil', metavar='ARQUIVO',
+                        help="Grava um perfil cProfile da execução (use --workers 1 para incluir a extração)")
+    ingest.add_argument('--verbose', action='store_true')
+    return parser
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = criar_parser().parse_args(argv)
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.WARNING,
+                        format='%(asctime)s %(levelname)s %(name)s: %(message)s')
+    if not os.path.isdir(args.diretorio):
+        print(f"Diretório não encontrado: {args.diretorio}", file=sys.stderr)
+        return 2
+
+    # Importados aqui para que `--help` não precise abrir o banco
+    from database.database import Database
+    from models.operacoes import Operacoes
+    from models.processador_notas import ProcessadorNotas
+    from utils.cache_notas import CacheNotas
+    from utils.metricas import metricas, perfilar
+
+    if args.metricas:
+        metricas.ativo = True
+    try:
+        database = Database(args.db) if args.db else Database.da_conta(args.conta or CONTA_PADRAO)
+    except ValueError as e:
+        print(str(e), file=sys.stderr)
+        return 2
+    try:
+        ingestao = IngestaoNotas(
+            ProcessadorNotas(database, CacheNotas()),
+            Operacoes(database),
+            args.corretora,
+            args.workers,
+            args.checkpoint or os.path.join(args.diretorio, NOME_CHECKPOINT),
+        )
+        with perfilar(args.perfil) if args.perfil else contextlib.nullcontext():
+            estatisticas = ingestao.executar(args.diretorio, args.recursivo, args.watch, args.intervalo)
+    finally:
+        database.close()
+
+    print(f"Concluído: {estatisticas.resumo()}")
+    if args.metricas:
+        metricas.exportar_json(args.metricas)
+        print(f"Métricas gravadas em {args.metricas}")
+    if args.perfil:
+        print(f"Perfil gravado em {args.perfil} (veja com: python -m pstats {args.perfil})")
+    return 1 if estatisticas.erros else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,60 @@
+import logging
+from typing import TYPE_CHECKING
+import pandas as pd
+from config.config import MAX_PONTOS_GRAFICO
+from utils.cache_consultas import CacheConsultas
+
+if TYPE_CHECKING:
+    import plotly.graph_objects as go
+
+logger = logging.getLogger(__name__)
+
+
+def agregar_em_periodos(matriz: pd.DataFrame, max_pontos: int = MAX_PONTOS_GRAFICO) -> pd.DataFrame:
+    """Reduz uma matriz data x ativo a no máximo `max_pontos` linhas somando períodos de dias iguais.
+
+    Todas as séries são agregadas de uma vez; períodos sem negociação ficam NaN.
+    """
+    if len(matriz) <= max_pontos:
+        return matriz
+    dias = -(-((matriz.index[-1] - matriz.index[0]).days + 1) // max_pontos)
+    return matriz.resample(f'{dias}D').sum(min_count=1)
+
+
+class GraficoDesempenho:
+    """Gráfico do valor negociado por ativo ao longo do tempo, em Plotly.
+
+    Os dados vêm do resumo diário, são pivotados uma única vez e agregados em períodos
+    até caberem em `max_pontos`. A figura fica em cache por (período, versão dos dados).
+    """
+
+    def __init__(self, operacoes, cache: CacheConsultas = None, max_pontos: int = MAX_PONTOS_GRAFICO):
+        self.operacoes = operacoes
+        self.cache = cache
+        self.max_pontos = max_pontos
+
+    def figura(self, data_inicio, data_fim) -> 'go.Figure':
+        chave = ('GraficoDesempenho.figura', str(data_inicio), str(data_fim), self.max_pontos,
+                 self.operacoes.db.versao_dados)
+        if self.cache is not None:
+            encontrado, figura = self.cache.obter(chave)
+            if encontrado:
+                return figura
+
+        # Importado só quando o gráfico é desenhado; o plotly pesa na inicialização
+        import plotly.graph_objects as go
+
+        serie = self.operacoes.obter_serie_diaria(data_inicio, data_fim)
+        matriz = agregar_em_periodos(serie.pivot(index='data', columns='codigo', values='valor'), self.max_pontos)
+
+        figura = go.Figure([
+            go.Scattergl(x=matriz.index, y=matriz[codigo].to_numpy(), name=codigo, mode='lines+markers',
+                         connectgaps=True)
+            for codigo in matriz.columns
+        ])
+        figura.update_layout(xaxis_title='Data', yaxis_title='Valor negociado (R$)', hovermode='x unified')
+
+        if self.cache is not None:
+            # Cada ponto ocupa x e y (8 bytes cada) nos dados da figura
+            self.cache.salvar(chave, figura, tamanho=16 * matriz.size + 1024 * len(matriz.columns))
+        return figura
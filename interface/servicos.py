@@ -0,0 +1,79 @@
+"""Serviços do aplicativo, criados uma vez por processo."""
+import logging
+import threading
+from typing import Dict, Iterable, Optional
+from config.config import CONTA_PADRAO
+from utils.metricas import medir_etapa
+
+logger = logging.getLogger(__name__)
+
+
+class Servicos:
+    """Banco, processador de notas, operações e demais serviços de uma conta.
+
+    Criados uma única vez por conta em `RegistroServicos`, de modo que conexões, migrações
+    e a verificação das tabelas derivadas não se repetem a cada rerun do Streamlit.
+    `tempos` guarda a duração da criação de cada serviço.
+    """
+
+    def __init__(self, conta: str = CONTA_PADRAO, catalogo=None):
+        # Importados aqui: o custo das importações entra na medição da inicialização
+        from database.database import Database
+        from interface.graficos import GraficoDesempenho
+        from models.exportacao import ExportadorOperacoes
+        from models.operacoes import Operacoes
+        from models.processador_notas import ProcessadorNotas
+        from models.relatorios import GeradorRelatorios
+        from utils.cache_consultas import cache_compartilhado
+        from utils.cache_notas import CacheNotas
+
+        self.conta = conta
+        self.tempos: Dict[str, float] = {}
+        with medir_etapa(self.tempos, 'banco'):
+            self.database = Database.da_conta(conta, catalogo)
+        with medir_etapa(self.tempos, 'operacoes'):
+            # O cache de consultas é compartilhado entre as sessões e as contas
+            self.operacoes = Operacoes(self.database, cache_compartilhado)
+        self.processador_notas = ProcessadorNotas(self.database, CacheNotas())
+        self.exportador = ExportadorOperacoes(self.database)
+        self.gerador_relatorios = GeradorRelatorios(self.database)
+        self.grafico = GraficoDesempenho(self.operacoes, self.operacoes.cache)
+        logger.info(f"Serviços da conta {conta} criados para {self.database.db_path}")
+
+
+class RegistroServicos:
+    """Catálogo de contas, serviços de cada conta e fila de tarefas do processo.
+
+    Guardado em `st.cache_resource`. Os serviços de uma conta só são criados quando ela é
+    usada, então o painel de uma conta abre apenas o banco dela. As tarefas recebem a
+    conta nos parâmetros e buscam os serviços aqui; contas diferentes têm escritores
+    diferentes e são importadas em paralelo.
+    """
+
+    def __init__(self, catalogo=None):
+        from database.contas import CatalogoContas
+        from interface.tarefas import obter_fila
+
+        self.tempos: Dict[str, float] = {}
+        self.catalogo = catalogo or CatalogoContas()
+        self._servicos: Dict[str, Servicos] = {}
+        self._lock = threading.Lock()
+        with medir_etapa(self.tempos, 'fila_tarefas'):
+            self.tarefas = obter_fila(self.servicos)
+
+    def contas(self) -> list:
+        return [conta['nome'] for conta in self.catalogo.listar()]
+
+    def servicos(self, conta: Optional[str] = None) -> Servicos:
+        """Serviços da conta (padrão: CONTA_PADRAO), criados no primeiro uso."""
+        conta = conta or CONTA_PADRAO
+        with self._lock:
+            if conta not in self._servicos:
+                self._servicos[conta] = Servicos(conta, self.catalogo)
+            return self._servicos[conta]
+
+    def consolidacao(self, contas: Optional[Iterable[str]] = None):
+        """Consultas consolidadas das contas informadas (padrão: todas as do catálogo)."""
+        from models.consolidacao import Consolidacao
+
+        return Consolidacao({conta: self.servicos(conta).operacoes for conta in (contas or self.contas())})
@@ -0,0 +1,122 @@
+"""Tarefas em segundo plano do aplicativo: importação de notas, relatórios e cotações."""
+import logging
+import os
+import threading
+import uuid
+from typing import Callable, Dict, List
+from config.config import TAREFAS_DIR, WORKERS_PROCESSAMENTO
+from models.tarefas import ContextoTarefa, FilaTarefas
+
+logger = logging.getLogger(__name__)
+
+TAREFA_INGESTAO = 'ingestao'
+TAREFA_RELATORIO = 'relatorio'
+TAREFA_PRECOS = 'precos'
+
+_fila = None
+_lock_fila = threading.Lock()
+
+
+def salvar_uploads(arquivos, diretorio: str = TAREFAS_DIR) -> List[Dict]:
+    """Grava os arquivos enviados no diretório de espera e retorna [{'caminho', 'nome'}].
+
+    Os uploads do Streamlit só existem durante o rerun; a tarefa de importação lê as cópias.
+    """
+    os.makedirs(diretorio, exist_ok=True)
+    salvos = []
+    for arquivo in arquivos:
+        caminho = os.path.abspath(os.path.join(diretorio, f"{uuid.uuid4().hex}.pdf"))
+        with open(caminho, 'wb') as destino:
+            destino.write(arquivo.getbuffer())
+        salvos.append({'caminho': caminho, 'nome': arquivo.name})
+    return salvos
+
+
+def criar_tarefa_ingestao(servicos_da_conta: Callable, workers: int = WORKERS_PROCESSAMENTO):
+    """Processa os PDFs em um único pool, registrando as notas e verificando o cancelamento a cada arquivo.
+
+    Parâmetros: 'arquivos' (de `salvar_uploads`), 'corretora' e 'conta'. Ao final, mesmo
+    em caso de erro ou cancelamento, o pool é encerrado e as cópias são removidas.
+    """
+    def ingerir(parametros: Dict, contexto: ContextoTarefa) -> Dict:
+        servicos = servicos_da_conta(parametros.get('conta'))
+        processador_notas, operacoes = servicos.processador_notas, servicos.operacoes
+        arquivos = parametros['arquivos']
+        resumo = {'arquivos': len(arquivos), 'notas': 0, 'duplicadas': 0, 'operacoes': 0, 'erros': []}
+        resultados = processador_notas.processar_em_fluxo(
+            [arquivo['caminho'] for arquivo in arquivos], parametros['corretora'], workers
+        )
+        try:
+            contexto.progresso(0.0, f"Processando notas... 0/{len(arquivos)}")
+            for concluidos, (arquivo, resultado) in enumerate(zip(arquivos, resultados), 1):
+                if resultado['erro']:
+                    resumo['erros'].append(f"{arquivo['nome']}: {resultado['erro']}")
+                for dados_nota in resultado['notas'] or []:
+                    try:
+                        if not operacoes.registrar_nota(dados_nota):
+                            resumo['duplicadas'] += 1
+                            continue
+                    except Exception as e:
+                        resumo['erros'].append(f"{arquivo['nome']}, nota {dados_nota.get('numero_nota')}: {e}")
+                        continue
+                    resumo['notas'] += 1
+                    resumo['operacoes'] += len(dados_nota['operacoes'])
+                contexto.progresso(concluidos / len(arquivos), f"Processando notas... {concluidos}/{len(arquivos)}")
+        finally:
+            # Fechar o gerador encerra o pool e cancela os arquivos que ainda não começaram
+            resultados.close()
+            for arquivo in arquivos:
+                if os.path.exists(arquivo['caminho']):
+                    os.remove(arquivo['caminho'])
+        return resumo
+
+    return ingerir
+
+
+def criar_tarefa_relatorio(servicos_da_conta: Callable):
+    """Gera o PDF do período em `TAREFAS_DIR`; parâmetros 'inicio', 'fim', 'incluir_operacoes' e 'conta'.
+
+    O arquivo é apagado por `remover_relatorio` quando a tarefa sai da fila.
+    """
+    def gerar(parametros: Dict, contexto: ContextoTarefa) -> Dict:
+        caminho = servicos_da_conta(parametros.get('conta')).gerador_relatorios.gerar(
+            parametros['inicio'], parametros['fim'], parametros.get('incluir_operacoes', True),
+            progresso=contexto.progresso
+        )
+        return {'caminho': caminho}
+
+    return gerar
+
+
+def remover_relatorio(resultado: Dict) -> None:
+    """Limpeza das tarefas de relatório: apaga o PDF gerado."""
+    caminho = resultado.get('caminho')
+    if caminho and os.path.exists(caminho):
+        os.remove(caminho)
+
+
+def criar_tarefa_precos(servicos_da_conta: Callable):
+    """Busca no provedor os fechamentos que faltam dos ativos em carteira da 'conta'."""
+    def atualizar(parametros: Dict, contexto: ContextoTarefa) -> Dict:
+        contexto.progresso(0.0, "Consultando o provedor de cotações")
+        precos = servicos_da_conta(parametros.get('conta')).operacoes.precos
+        return {'fechamentos': precos.atualizar(parametros.get('codigos'), progresso=contexto.progresso)}
+
+    return atualizar
+
+
+def obter_fila(servicos_da_conta: Callable) -> FilaTarefas:
+    """Retorna a fila do processo, criando-a no primeiro uso.
+
+    O script do Streamlit roda de novo a cada interação; a fila e suas threads são
+    criadas uma única vez. `servicos_da_conta(conta)` fornece os serviços da conta
+    indicada nos parâmetros de cada tarefa (None: conta padrão).
+    """
+    global _fila
+    with _lock_fila:
+        if _fila is None:
+            _fila = FilaTarefas()
+            _fila.registrar_tipo(TAREFA_INGESTAO, criar_tarefa_ingestao(servicos_da_conta))
+            _fila.registrar_tipo(TAREFA_RELATORIO, criar_tarefa_relatorio(servicos_da_conta), limpeza=remover_relatorio)
+            _fila.registrar_tipo(TAREFA_PRECOS, criar_tarefa_precos(servicos_da_conta))
+        return _fila
@@ -1,24 +1,68 @@
-from interface.app import App
-from database.database import Database
-from models.processador_notas import ProcessadorNotas
-from models.operacoes import Operacoes
+"""Aplicativo Streamlit (`streamlit run main.py`).
 
-def main():
-    try:
-        # Inicializa o banco de dados
-        database = Database()
+Com MEDIR_INICIALIZACAO ativo, o tempo de cada etapa (importações, serviços e página) é
+logado a cada execução do script. `python main.py --medir-inicializacao` mede a
+inicialização a frio sem abrir a interface.
+"""
+import time
+
+INICIO = time.perf_counter()
+
+import logging
+import sys
+from config.config import MEDIR_INICIALIZACAO
+from utils.metricas import medir_etapa
+
+logger = logging.getLogger(__name__)
+
+# Tempos desta execução do script; o Streamlit roda o arquivo de novo a cada interação
+tempos = {}
+
+with medir_etapa(tempos, 'importacoes'):
+    import streamlit as st
+    from interface.app import App
+    from interface.servicos import RegistroServicos
 
-        # Inicializa o processador de notas
-        processador_notas = ProcessadorNotas(database)
 
-        # Inicializa a classe de operações
-        operacoes = Operacoes(database)
+@st.cache_resource
+def obter_registro() -> RegistroServicos:
+    """Catálogo de contas e serviços do processo: criados na primeira execução e reaproveitados nas seguintes."""
+    registro = RegistroServicos()
+    if MEDIR_INICIALIZACAO:
+        logger.info(f"Registro de serviços criado: {_formatar_tempos(registro.tempos)}")
+    return registro
 
-        # Inicializa o aplicativo
-        app = App(processador_notas, operacoes)
-        app.executar()
+
+def _formatar_tempos(tempos) -> str:
+    return ', '.join(f"{etapa} {segundos * 1000:.1f} ms" for etapa, segundos in tempos.items())
+
+
+def medir_inicializacao() -> None:
+    """Cria os serviços da conta padrão sem a interface e imprime a duração de cada etapa."""
+    with medir_etapa(tempos, 'servicos'):
+        registro = RegistroServicos()
+        servicos = registro.servicos()
+    tempos['total'] = time.perf_counter() - INICIO
+    for etapa, segundos in {**registro.tempos, **servicos.tempos, **tempos}.items():
+        print(f"{etapa:<14}{segundos * 1000:>10.1f} ms")
+    registro.tarefas.encerrar()
+    servicos.database.close()
+
+
+def main():
+    try:
+        with medir_etapa(tempos, 'servicos'):
+            registro = obter_registro()
+        with medir_etapa(tempos, 'pagina'):
+            App(registro).executar()
     except Exception as e:
         print(f"Erro ao iniciar o aplicativo: {e}")
+    finally:
+        if MEDIR_INICIALIZACAO:
+            logger.info(f"Execução do script: {_formatar_tempos(tempos)}")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    if '--medir-inicializacao' in sys.argv[1:]:
+        medir_inicializacao()
+    else:
+        main()
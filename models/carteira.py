@@ -1,31 +1,93 @@
+from typing import Iterator
+import numpy as np
 import pandas as pd
+from config.config import TIPOS_OPERACOES
+from utils.dinheiro import CENTAVOS_POR_REAL
+
+COLUNAS = ['codigo', 'tipo', 'quantidade', 'preco', 'data', 'corretagem', 'valor_total']
+# Os códigos 0 e 1 da consulta seguem a ordem de TIPOS_OPERACOES (Compra, Venda)
+TIPO_OPERACAO = pd.CategoricalDtype(TIPOS_OPERACOES)
+TAMANHO_BLOCO = 100_000
 
 class Operacoes:
+    """Carrega as operações em DataFrames colunares com tipos compactos.
+
+    Código e tipo são categóricos, a data é datetime64 e a quantidade int32; os valores,
+    gravados em centavos, são entregues em reais (float64). As categorias de código vêm da
+    tabela `ativos` e são atribuídas pelo ativo_id, sem trazer o código em cada linha;
+    assim blocos diferentes podem ser concatenados sem conversão.
+    """
+
+    QUERY = '''
+    SELECT COALESCE(o.ativo_id, -1),
+           CASE o.tipo WHEN 'Compra' THEN 0 WHEN 'Venda' THEN 1 ELSE -1 END,
+           COALESCE(o.quantidade, 0), o.preco, o.data, COALESCE(o.corretagem, 0)
+    FROM operacoes o
+    ORDER BY o.data DESC
+    '''
+
     def __init__(self, db):
         self.db = db
 
-    def obter_operacoes(self):
-        query = '''
-        SELECT o.codigo, o.tipo, o.quantidade, o.preco, o.data, o.corretagem
-        FROM operacoes o
-        ORDER BY o.data DESC
-        '''
+    def obter_operacoes(self) -> pd.DataFrame:
         try:
-            resultado = self.db.execute_query(query)
+            with self.db.leitura() as conn:
+                ativos = self._ativos(conn)
+                cursor = conn.cursor()
+                cursor.row_factory = None
+                return self._montar_dataframe(cursor.execute(self.QUERY).fetchall(), *ativos)
         except Exception as e:
             print(f"Erro ao executar query: {e}")
             return pd.DataFrame()
 
-        operacoes = []
-        for codigo, tipo, quantidade, preco, data, corretagem in resultado:
-            operacoes.append({
-                'codigo': codigo,
-                'tipo': tipo,
-                'quantidade': quantidade,
-                'preco': preco,
-                'data': data,
-                'corretagem': corretagem,
-                'valor_total': quantidade * preco
+    def iterar_operacoes(self, tamanho_bloco: int = TAMANHO_BLOCO) -> Iterator[pd.DataFrame]:
+        """Gera as operações em blocos de até `tamanho_bloco` linhas, na mesma ordem de `obter_operacoes`.
+
+        A conexão de leitura fica emprestada até o gerador ser esgotado ou fechado.
+        """
+        with self.db.leitura() as conn:
+            ativos = self._ativos(conn)
+            cursor = conn.cursor()
+            cursor.row_factory = None
+            cursor.execute(self.QUERY)
+            while linhas := cursor.fetchmany(tamanho_bloco):
+                yield self._montar_dataframe(linhas, *ativos)
+
+    @staticmethod
+    def _ativos(conn):
+        """Retorna o tipo categórico dos códigos e a tabela ativo_id -> código da categoria."""
+        linhas = conn.execute('SELECT id, codigo FROM ativos ORDER BY codigo').fetchall()
+        ids = np.array([linha[0] for linha in linhas], dtype=np.int64)
+        codigos_categoria = np.full(ids.max() + 1 if len(ids) else 1, -1, dtype=np.int32)
+        codigos_categoria[ids] = np.arange(len(ids), dtype=np.int32)
+        return pd.CategoricalDtype([linha[1] for linha in linhas]), codigos_categoria
+
+    @staticmethod
+    def _montar_dataframe(linhas, tipo_codigo: pd.CategoricalDtype, codigos_categoria: np.ndarray) -> pd.DataFrame:
+        if not linhas:
+            return pd.DataFrame({
+                'codigo': pd.Categorical([], dtype=tipo_codigo),
+                'tipo': pd.Categorical([], dtype=TIPO_OPERACAO),
+                'quantidade': np.array([], dtype=np.int32),
+                'preco': np.array([], dtype=np.float64),
+                'data': pd.to_datetime([]),
+                'corretagem': np.array([], dtype=np.float64),
+                'valor_total': np.array([], dtype=np.float64),
             })
 
-        return pd.DataFrame(operacoes)
\ No newline at end of file
+        ativo_id, venda, quantidade, preco, data, corretagem = zip(*linhas)
+        quantidade = np.array(quantidade, dtype=np.int32)
+        preco = np.array(preco, dtype=np.float64) / CENTAVOS_POR_REAL
+        ativo_id = np.array(ativo_id, dtype=np.int64)
+        # Operações de ativos inexistentes ficam sem código (NaN), como num LEFT JOIN
+        valido = (ativo_id >= 0) & (ativo_id < len(codigos_categoria))
+        codigo = np.where(valido, codigos_categoria[np.where(valido, ativo_id, 0)], -1)
+        return pd.DataFrame({
+            'codigo': pd.Categorical.from_codes(codigo, dtype=tipo_codigo),
+            'tipo': pd.Categorical.from_codes(np.array(venda, dtype=np.int8), dtype=TIPO_OPERACAO),
+            'quantidade': quantidade,
+            'preco': preco,
+            'data': pd.to_datetime(pd.Series(data), format='ISO8601'),
+            'corretagem': np.array(corretagem, dtype=np.float64) / CENTAVOS_POR_REAL,
+            'valor_total': quantidade * preco,
+        }, columns=COLUNAS)
@@ -0,0 +1,100 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Sequence
+import pandas as pd
+from config.config import WORKERS_CONSOLIDACAO
+from models.resumos import COLUNAS_MONETARIAS_RESUMO, COLUNAS_RESUMO
+from utils.dinheiro import CENTAVOS_POR_REAL
+from utils.metricas import cronometrado
+
+logger = logging.getLogger(__name__)
+
+COLUNAS_POSICOES_CONSOLIDADAS = ['codigo', 'quantidade', 'preco_medio', 'custo_total', 'lucro_realizado']
+COLUNAS_TOTAIS_CONTAS = ['conta', 'num_operacoes', 'saldo_total', 'lucro_realizado']
+
+
+def _em_reais(df: pd.DataFrame, colunas: Sequence[str]) -> pd.DataFrame:
+    for coluna in colunas:
+        df[coluna] = df[coluna] / CENTAVOS_POR_REAL
+    return df
+
+
+class Consolidacao:
+    """Consultas que reúnem várias contas, cada uma no seu próprio arquivo SQLite.
+
+    Cada conta agrega a sua parte no próprio banco, com as consultas das contas rodando
+    em paralelo (até `workers` threads; o SQLite libera o GIL durante a consulta). Os
+    resultados parciais vêm em centavos e são somados aqui antes da conversão para reais.
+    Preferimos isso a ATTACH, que é limitado a 10 bancos por conexão e serializaria as
+    contas em uma única consulta.
+
+    A apuração de impostos não é consolidada: o prejuízo a compensar depende da ordem
+    das operações de todas as contas do mesmo investidor, não da soma das apurações.
+    """
+
+    def __init__(self, operacoes: Dict[str, object], workers: int = WORKERS_CONSOLIDACAO):
+        self.operacoes = operacoes
+        self.workers = workers
+
+    def _por_conta(self, consulta: Callable) -> Dict[str, object]:
+        """Executa `consulta(operacoes)` em cada conta, em paralelo, e retorna {conta: resultado}."""
+        if not self.operacoes:
+            return {}
+        with ThreadPoolExecutor(max_workers=max(1, min(self.workers, len(self.operacoes)))) as executor:
+            futuros = {conta: executor.submit(consulta, operacoes) for conta, operacoes in self.operacoes.items()}
+            return {conta: futuro.result() for conta, futuro in futuros.items()}
+
+    def _somar(self, consulta: Callable, chave: str, colunas: Sequence[str]) -> pd.DataFrame:
+        """Concatena os DataFrames parciais das contas e soma `colunas` por `chave`."""
+        partes = [df for df in self._por_conta(consulta).values() if not df.empty]
+        if not partes:
+            return pd.DataFrame(columns=[chave, *colunas])
+        return pd.concat(partes, ignore_index=True).groupby(chave, as_index=False)[list(colunas)].sum()
+
+    @cronometrado('consolidacao.posicoes')
+    def posicoes(self, apenas_abertas: bool = True) -> pd.DataFrame:
+        """Posições somadas por ativo em todas as contas, com o preço médio ponderado pelo custo."""
+        def consultar(operacoes):
+            query = '''
+                SELECT a.codigo, p.quantidade, p.custo_total, p.lucro_realizado
+                FROM posicoes p
+                JOIN ativos a ON a.id = p.ativo_id
+            '''
+            if apenas_abertas:
+                query += ' WHERE p.quantidade <> 0'
+            return operacoes.db.query_dataframe(query)
+
+        posicoes = self._somar(consultar, 'codigo', ['quantidade', 'custo_total', 'lucro_realizado'])
+        if apenas_abertas:
+            posicoes = posicoes[posicoes['quantidade'] != 0]
+        # Em posições vendidas, quantidade e custo são negativos e o preço médio é o de venda
+        quantidade = posicoes['quantidade'].where(posicoes['quantidade'] != 0)
+        posicoes = posicoes.assign(preco_medio=(posicoes['custo_total'] / quantidade).fillna(0.0))
+        _em_reais(posicoes, ['preco_medio', 'custo_total', 'lucro_realizado'])
+        return posicoes.sort_values('codigo', ignore_index=True)[COLUNAS_POSICOES_CONSOLIDADAS]
+
+    @cronometrado('consolidacao.resumo_por_ativo')
+    def resumo_por_ativo(self, data_inicio, data_fim) -> pd.DataFrame:
+        """Totais de compras e vendas por ativo no período, somados sobre as contas."""
+        resumo = self._somar(
+            lambda operacoes: operacoes.resumos.resumo_por_ativo(data_inicio, data_fim, em_centavos=True),
+            'codigo', COLUNAS_RESUMO
+        )
+        return _em_reais(resumo, COLUNAS_MONETARIAS_RESUMO).sort_values('codigo', ignore_index=True)
+
+    @cronometrado('consolidacao.totais_por_conta')
+    def totais_por_conta(self) -> pd.DataFrame:
+        """Número de operações, saldo total e lucro realizado de cada conta, em reais."""
+        def consultar(operacoes):
+            with operacoes.db.leitura() as conn:
+                linha = conn.execute('''
+                    SELECT (SELECT COUNT(*) FROM operacoes), (SELECT SUM(valor) FROM operacoes),
+                           (SELECT SUM(lucro_realizado) FROM posicoes)
+                ''').fetchone()
+            return [linha[0], linha[1] or 0, linha[2] or 0]
+
+        totais = pd.DataFrame(
+            [[conta, *valores] for conta, valores in self._por_conta(consultar).items()],
+            columns=COLUNAS_TOTAIS_CONTAS
+        )
+        return _em_reais(totais, ['saldo_total', 'lucro_realizado'])
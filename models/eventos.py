@@ -0,0 +1,310 @@
+import logging
+import threading
+from typing import Dict, Iterable, Optional
+import numpy as np
+import pandas as pd
+from config.config import ALIQUOTA_JCP
+from utils.dinheiro import arredondar_centavos, para_reais
+
+logger = logging.getLogger(__name__)
+
+# Eventos que mudam a quantidade de ações; `valor` é a proporção (2 = cada ação vira 2 no
+# desdobramento; 10 = cada 10 ações viram 1 no grupamento). A data é a data "ex".
+TIPOS_AJUSTE = ('DESDOBRAMENTO', 'GRUPAMENTO')
+# Proventos; `valor` é o valor bruto por ação, em centavos (fracionários: proventos por ação
+# costumam ter mais de duas casas decimais), e a data é a data "com".
+TIPOS_RENDIMENTO = ('DIVIDENDO', 'JCP')
+# Tipo das linhas sintéticas com a fração de ação que sobra de um ajuste: a B3 leiloa a
+# fração, que sai da posição pelo custo médio (sem lucro; o valor do leilão não é conhecido)
+TIPO_FRACAO = 'Fracao'
+COLUNAS_FRACOES = ['ativo_id', 'tipo', 'quantidade', 'valor', 'corretagem', 'data']
+# Distância até um inteiro abaixo da qual uma quantidade ajustada é tratada como inteira
+TOLERANCIA_QUANTIDADE = 1e-6
+
+COLUNAS_RENDIMENTOS = ['codigo', 'tipo', 'data', 'valor', 'quantidade', 'bruto', 'liquido']
+
+
+def fator_quantidade(tipo: str, valor: float) -> float:
+    """Multiplicador aplicado às quantidades anteriores ao evento."""
+    return valor if tipo == 'DESDOBRAMENTO' else 1.0 / valor
+
+
+def fatores_acumulados(eventos: pd.DataFrame) -> pd.DataFrame:
+    """Para cada evento (ativo_id, data, fator), o produto dos fatores dele e dos posteriores do mesmo ativo.
+
+    Uma operação anterior a um evento é ajustada pelo fator acumulado do primeiro evento
+    depois dela. Retorna as colunas ativo_id, data (datetime), fator_acumulado e
+    fator_seguinte (o produto só dos posteriores: converte a base logo após o evento
+    para a atual).
+    """
+    # Eventos do mesmo ativo na mesma data viram um só fator
+    eventos = eventos.assign(data=pd.to_datetime(eventos['data'])).groupby(
+        ['ativo_id', 'data'], as_index=False
+    )['fator'].prod().sort_values(['ativo_id', 'data'], ascending=[True, False], ignore_index=True)
+    eventos['fator_acumulado'] = eventos.groupby('ativo_id')['fator'].cumprod()
+    eventos['fator_seguinte'] = eventos['fator_acumulado'] / eventos['fator']
+    return eventos[['ativo_id', 'data', 'fator_acumulado', 'fator_seguinte']].sort_values('data', ignore_index=True)
+
+
+def _fator_posterior(df: pd.DataFrame, fatores: pd.DataFrame, estrito: bool = True) -> np.ndarray:
+    """Fator acumulado dos eventos posteriores à data de cada linha de `df` (1 se não houver).
+
+    `df` deve ter ativo_id e data (datetime); a ordem das linhas é preservada.
+    """
+    if fatores.empty or df.empty:
+        return np.ones(len(df))
+    ordenado = df[['ativo_id', 'data']].assign(_posicao=np.arange(len(df))).sort_values('data', kind='stable')
+    combinado = pd.merge_asof(
+        ordenado, fatores, on='data', by='ativo_id', direction='forward', allow_exact_matches=not estrito
+    )
+    fator = np.ones(len(df))
+    fator[combinado['_posicao'].to_numpy()] = combinado['fator_acumulado'].fillna(1.0).to_numpy()
+    return fator
+
+
+def inteiro_proximo(quantidade):
+    """Troca por inteiros as quantidades que só diferem deles pelo erro de ponto flutuante dos ajustes."""
+    inteiro = np.round(quantidade)
+    return np.where(np.abs(quantidade - inteiro) < TOLERANCIA_QUANTIDADE, inteiro, quantidade)
+
+
+def fator_apos_mes(ativo_ids, meses, fatores: pd.DataFrame) -> np.ndarray:
+    """Fator dos eventos posteriores ao fim de cada mês (AAAA-MM): converte a base de ações do mês para a atual."""
+    fim_mes = pd.to_datetime(pd.Series(meses, dtype=str) + '-01') + pd.offsets.MonthEnd(0)
+    return _fator_posterior(pd.DataFrame({'ativo_id': np.asarray(ativo_ids), 'data': fim_mes.to_numpy()}), fatores)
+
+
+def calcular_fracoes(operacoes: pd.DataFrame, fatores: pd.DataFrame) -> pd.DataFrame:
+    """Frações de ação que sobram em cada desdobramento ou grupamento.
+
+    `operacoes` (ativo_id, tipo, quantidade, data) já ajustadas para a base atual e com
+    todo o histórico dos ativos até os eventos. Em cada evento, a posição formada pelas
+    operações anteriores é levada à base logo após o evento; o que passar do inteiro é a
+    fração. Retorna linhas de operação (COLUNAS_FRACOES) do tipo TIPO_FRACAO na data do
+    evento, com a quantidade na base atual; somadas às operações ajustadas, a posição em
+    cada base fica sempre inteira.
+    """
+    if fatores.empty or operacoes.empty:
+        return pd.DataFrame(columns=COLUNAS_FRACOES)
+    quantidade = operacoes['quantidade'].to_numpy(dtype=np.float64)
+    saldos = pd.DataFrame({
+        'ativo_id': operacoes['ativo_id'].to_numpy(),
+        'data': pd.to_datetime(operacoes['data'].astype(str).str[:10]).to_numpy(),
+        'saldo': np.where(operacoes['tipo'] == 'Compra', quantidade, -quantidade),
+    }).sort_values(['ativo_id', 'data'], kind='stable')
+    por_ativo = {ativo_id: grupo for ativo_id, grupo in saldos.groupby('ativo_id', sort=False)}
+
+    fracoes = []
+    for ativo_id, eventos in fatores.sort_values('data').groupby('ativo_id', sort=False):
+        if ativo_id not in por_ativo:
+            continue
+        datas = por_ativo[ativo_id]['data'].to_numpy()
+        acumulado = np.cumsum(por_ativo[ativo_id]['saldo'].to_numpy())
+        retirado = 0.0
+        for data, fator_seguinte in zip(eventos['data'], eventos['fator_seguinte']):
+            # Operações na data do evento já estão na nova base: só as anteriores contam
+            anteriores = np.searchsorted(datas, np.datetime64(data), side='left')
+            posicao = (acumulado[anteriores - 1] if anteriores else 0.0) - retirado
+            if posicao <= 0:
+                continue
+            na_base = inteiro_proximo(posicao / fator_seguinte)
+            if na_base > np.floor(na_base):
+                fracao = posicao - np.floor(na_base) * fator_seguinte
+                fracoes.append((ativo_id, TIPO_FRACAO, fracao, 0, 0, data.strftime('%Y-%m-%d')))
+                retirado += fracao
+    return pd.DataFrame(fracoes, columns=COLUNAS_FRACOES)
+
+
+def ajustar_operacoes(df: pd.DataFrame, fatores: pd.DataFrame) -> pd.DataFrame:
+    """Expressa quantidades (e preços, se houver a coluna) na base de ações atual.
+
+    Operações com data anterior a um desdobramento ou grupamento têm a quantidade
+    multiplicada e o preço dividido pelo fator acumulado; valores financeiros não mudam.
+    """
+    if fatores.empty or df.empty:
+        return df
+    datas = pd.to_datetime(df['data'].astype(str).str[:10])
+    fator = _fator_posterior(pd.DataFrame({'ativo_id': df['ativo_id'].to_numpy(), 'data': datas.to_numpy()}), fatores)
+    if (fator == 1.0).all():
+        return df
+    df = df.copy()
+    df['quantidade'] = df['quantidade'].to_numpy(dtype=np.float64) * fator
+    if 'preco' in df:
+        df['preco'] = df['preco'].to_numpy(dtype=np.float64) / fator
+    return df
+
+
+class Eventos:
+    """Eventos corporativos (tabela `eventos`): ajustes de quantidade e proventos.
+
+    Os fatores acumulados de cada ativo ficam em memória; registrar ou remover um evento
+    invalida apenas o ativo afetado. Se a tabela for alterada por outro processo, o
+    cache inteiro é descartado na próxima leitura.
+    """
+
+    def __init__(self, database):
+        self.db = database
+        self._fatores: Dict[int, pd.DataFrame] = {}
+        self._assinatura = None
+        self._lock = threading.Lock()
+
+    def invalidar(self, ativo_ids: Optional[Iterable[int]] = None) -> None:
+        """Descarta os fatores dos ativos informados (ou de todos)."""
+        with self._lock:
+            if ativo_ids is None:
+                self._fatores.clear()
+            else:
+                for ativo_id in ativo_ids:
+                    self._fatores.pop(ativo_id, None)
+            self._assinatura = None
+
+    def fatores(self, conn, ativo_ids: Optional[Iterable[int]] = None) -> pd.DataFrame:
+        """Fatores acumulados dos ativos informados (ou de todos), lidos do cache quando possível."""
+        ativo_ids = None if ativo_ids is None else set(ativo_ids)
+        marcadores = ', '.join('?' * len(TIPOS_AJUSTE))
+        assinatura = tuple(conn.execute(
+            f'SELECT COUNT(*), MAX(id) FROM eventos WHERE tipo IN ({marcadores})', TIPOS_AJUSTE
+        ).fetchone())
+        with self._lock:
+            if self._assinatura is not None and assinatura != self._assinatura:
+                self._fatores.clear()
+            self._assinatura = assinatura
+            todos = ativo_ids is None
+            faltantes = None if todos else [ativo_id for ativo_id in ativo_ids if ativo_id not in self._fatores]
+
+        if todos or faltantes:
+            query = f'SELECT ativo_id, tipo, data, valor FROM eventos WHERE tipo IN ({marcadores})'
+            params = list(TIPOS_AJUSTE)
+            if not todos:
+                query += f" AND ativo_id IN ({', '.join('?' * len(faltantes))})"
+                params += faltantes
+            eventos = pd.read_sql_query(query, conn, params=params)
+            eventos['fator'] = [fator_quantidade(tipo, valor) for tipo, valor in zip(eventos['tipo'], eventos['valor'])]
+            carregados = dict(tuple(fatores_acumulados(eventos).groupby('ativo_id')))
+            with self._lock:
+                for ativo_id in (carregados.keys() if todos else faltantes):
+                    self._fatores[ativo_id] = carregados.get(ativo_id, pd.DataFrame())
+
+        with self._lock:
+            partes = [fatores for ativo_id, fatores in self._fatores.items()
+                      if (todos or ativo_id in ativo_ids) and not fatores.empty]
+        if not partes:
+            return pd.DataFrame(columns=['ativo_id', 'data', 'fator_acumulado', 'fator_seguinte'])
+        return pd.concat(partes, ignore_index=True).sort_values('data', ignore_index=True)
+
+    def ajustar(self, conn, df: pd.DataFrame, ativo_ids: Optional[Iterable[int]] = None,
+                a_partir_de: str = '') -> pd.DataFrame:
+        """Aplica `ajustar_operacoes` e acrescenta as frações leiloadas, com as quantidades inteiras em cada base.
+
+        As frações são as dos ativos informados (ou de todos) com data a partir de
+        `a_partir_de`, mesmo que o ativo não tenha operações em `df`. O resultado fica
+        ordenado por ativo e data, com a fração antes das operações do dia do evento.
+        """
+        if not df.empty:
+            df = ajustar_operacoes(df, self.fatores(conn, df['ativo_id'].unique().tolist()))
+        fracoes = self.fracoes(conn, ativo_ids, a_partir_de)
+        if fracoes.empty:
+            return df
+        return pd.concat([fracoes, df], ignore_index=True).sort_values(['ativo_id', 'data'], kind='stable',
+                                                                       ignore_index=True)
+
+    def fracoes(self, conn, ativo_ids: Optional[Iterable[int]] = None, a_partir_de: str = '') -> pd.DataFrame:
+        """Frações (`calcular_fracoes`) dos ativos informados (ou de todos) com data a partir de `a_partir_de`."""
+        fatores = self.fatores(conn, ativo_ids)
+        if not fatores.empty and a_partir_de:
+            com_evento = fatores.loc[fatores['data'].dt.strftime('%Y-%m-%d') >= a_partir_de, 'ativo_id'].unique()
+            fatores = fatores[fatores['ativo_id'].isin(com_evento)]
+        if fatores.empty:
+            return pd.DataFrame(columns=COLUNAS_FRACOES)
+        ids = fatores['ativo_id'].unique().tolist()
+        # Só as operações anteriores ao último evento formam as posições que viram frações
+        operacoes = pd.read_sql_query(f'''
+            SELECT ativo_id, tipo, quantidade, data FROM operacoes
+            WHERE ativo_id IN ({', '.join('?' * len(ids))}) AND data < ?
+        ''', conn, params=[*ids, fatores['data'].max().strftime('%Y-%m-%d')])
+        fracoes = calcular_fracoes(ajustar_operacoes(operacoes, fatores), fatores)
+        return fracoes[fracoes['data'] >= a_partir_de].reset_index(drop=True)
+
+    def ultimos_ajustes(self, conn, ativo_ids: Iterable[int]) -> Dict[int, str]:
+        """Data (ISO) do último desdobramento ou grupamento de cada ativo que tiver algum."""
+        fatores = self.fatores(conn, ativo_ids)
+        if fatores.empty:
+            return {}
+        return fatores.groupby('ativo_id')['data'].max().dt.strftime('%Y-%m-%d').to_dict()
+
+    def rendimentos(self, data_inicio=None, data_fim=None) -> pd.DataFrame:
+        """Dividendos e JCP do período, com a quantidade em carteira na data "com" de cada evento.
+
+        A quantidade vem das operações ajustadas, já sem as frações leiloadas, e é
+        convertida para a base de ações da data do evento. JCP tem também o valor líquido
+        da retenção de ALIQUOTA_JCP. Valores em reais.
+        """
+        rendimentos = self._rendimentos(data_inicio, data_fim)
+        monetarias = ['valor', 'bruto', 'liquido']
+        rendimentos[monetarias] = para_reais(rendimentos[monetarias].astype(np.float64))
+        return rendimentos
+
+    def _rendimentos(self, data_inicio=None, data_fim=None) -> pd.DataFrame:
+        """Como `rendimentos`, com o valor por ação em centavos e os totais em centavos inteiros."""
+        with self.db.leitura() as conn:
+            eventos = pd.read_sql_query(f'''
+                SELECT e.ativo_id, a.codigo, e.tipo, e.data, e.valor
+                FROM eventos e
+                JOIN ativos a ON a.id = e.ativo_id
+                WHERE e.tipo IN ({', '.join('?' * len(TIPOS_RENDIMENTO))}) AND e.data BETWEEN ? AND ?
+            ''', conn, params=[*TIPOS_RENDIMENTO, str(data_inicio or ''), str(data_fim or '9999-12-31')])
+            if eventos.empty:
+                return pd.DataFrame(columns=COLUNAS_RENDIMENTOS)
+            ids = eventos['ativo_id'].unique().tolist()
+            operacoes = pd.read_sql_query(f'''
+                SELECT ativo_id, tipo, quantidade, data FROM operacoes
+                WHERE ativo_id IN ({', '.join('?' * len(ids))}) AND data < date(?, '+1 day')
+            ''', conn, params=[*ids, eventos['data'].max()])
+            fatores = self.fatores(conn, ids)
+            fracoes = self.fracoes(conn, ids)
+
+        eventos['data'] = pd.to_datetime(eventos['data'])
+        eventos = eventos.sort_values('data', ignore_index=True)
+        operacoes = ajustar_operacoes(operacoes, fatores)
+        if not fracoes.empty:
+            operacoes = pd.concat([fracoes[operacoes.columns], operacoes], ignore_index=True)
+        operacoes['data'] = pd.to_datetime(operacoes['data'].astype(str).str[:10])
+        operacoes = operacoes.sort_values(['ativo_id', 'data'], kind='stable', ignore_index=True)
+        operacoes['saldo'] = np.where(operacoes['tipo'] == 'Compra', operacoes['quantidade'], -operacoes['quantidade'])
+        operacoes['saldo'] = operacoes.groupby('ativo_id')['saldo'].cumsum()
+        saldos = operacoes.groupby(['ativo_id', 'data'], as_index=False)['saldo'].last().sort_values('data')
+
+        eventos = pd.merge_asof(eventos, saldos, on='data', by='ativo_id', direction='backward')
+        # Saldo na base atual -> base da data do evento (desdobramentos depois dela ainda não ocorreram)
+        quantidade = eventos['saldo'].fillna(0).to_numpy() / _fator_posterior(eventos, fatores)
+        eventos['quantidade'] = np.maximum(np.round(quantidade, 6), 0)
+        eventos['bruto'] = arredondar_centavos(eventos['quantidade'] * eventos['valor'])
+        eventos['liquido'] = np.where(
+            eventos['tipo'] == 'JCP', arredondar_centavos(eventos['bruto'] * (1 - ALIQUOTA_JCP)), eventos['bruto']
+        )
+        eventos['data'] = eventos['data'].dt.strftime('%Y-%m-%d')
+        return eventos[COLUNAS_RENDIMENTOS]
+
+    def resumo_mensal(self, mes_inicio: Optional[str] = None, mes_fim: Optional[str] = None) -> pd.DataFrame:
+        """Compras, vendas, dividendos e JCP por mês, somados em centavos e exibidos em reais."""
+        inicio = f'{mes_inicio}-01' if mes_inicio else None
+        fim = f'{mes_fim}-31' if mes_fim else None
+        negociacoes = self.db.query_dataframe('''
+            SELECT mes, SUM(valor_compra) AS compras, SUM(valor_venda) AS vendas
+            FROM resumo_mensal
+            WHERE mes BETWEEN ? AND ?
+            GROUP BY mes
+        ''', params=(mes_inicio or '', mes_fim or '9999')).set_index('mes')
+
+        rendimentos = self._rendimentos(inicio, fim)
+        rendimentos['mes'] = rendimentos['data'].str[:7]
+        proventos = pd.DataFrame({
+            'dividendos': rendimentos[rendimentos['tipo'] == 'DIVIDENDO'].groupby('mes')['bruto'].sum(),
+            'jcp': rendimentos[rendimentos['tipo'] == 'JCP'].groupby('mes')['bruto'].sum(),
+            'jcp_liquido': rendimentos[rendimentos['tipo'] == 'JCP'].groupby('mes')['liquido'].sum(),
+        })
+
+        resumo = para_reais(negociacoes.join(proventos, how='outer').fillna(0).astype(np.int64))
+        return resumo.sort_index().rename_axis('mes').reset_index()[
+            ['mes', 'compras', 'vendas', 'dividendos', 'jcp', 'jcp_liquido']
+        ]
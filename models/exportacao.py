@@ -0,0 +1,137 @@
+import csv
+import io
+import logging
+import os
+import tempfile
+from typing import Iterator, List, Optional, Sequence
+from utils.dinheiro import CENTAVOS_POR_REAL
+
+logger = logging.getLogger(__name__)
+
+FORMATOS_EXPORTACAO = ('csv', 'parquet')
+TAMANHO_BLOCO_EXPORTACAO = 50_000
+
+# Colunas que podem ser exportadas, com a expressão SQL e o tipo Arrow (nome do construtor em pyarrow).
+# Valores são gravados em centavos e exportados em reais.
+COLUNAS_EXPORTACAO = {
+    'data': ('date(o.data)', 'date32'),
+    'codigo': ('a.codigo', 'string'),
+    'tipo': ('o.tipo', 'string'),
+    'quantidade': ('o.quantidade', 'int64'),
+    'preco': (f'o.preco / {CENTAVOS_POR_REAL}.0', 'float64'),
+    'valor': (f'o.valor / {CENTAVOS_POR_REAL}.0', 'float64'),
+    'corretagem': (f'o.corretagem / {CENTAVOS_POR_REAL}.0', 'float64'),
+    'corretora': ('o.corretora', 'string'),
+    'numero_nota': ('o.numero_nota', 'string'),
+}
+
+
+class ExportadorOperacoes:
+    """Exporta `operacoes` para CSV ou Parquet lendo a tabela em blocos de tamanho fixo.
+
+    Cada bloco é escrito assim que lido (no Parquet, um row group por bloco), então a
+    memória usada não depende do tamanho do histórico.
+    """
+
+    def __init__(self, database, tamanho_bloco: int = TAMANHO_BLOCO_EXPORTACAO):
+        self.db = database
+        self.tamanho_bloco = tamanho_bloco
+
+    @staticmethod
+    def validar_colunas(colunas: Optional[Sequence[str]] = None) -> List[str]:
+        if not colunas:
+            return list(COLUNAS_EXPORTACAO)
+        invalidas = [coluna for coluna in colunas if coluna not in COLUNAS_EXPORTACAO]
+        if invalidas:
+            raise ValueError(f"Colunas não exportáveis: {', '.join(invalidas)}")
+        return list(colunas)
+
+    def iterar_blocos(self, colunas: Optional[Sequence[str]] = None, data_inicio=None,
+                      data_fim=None) -> Iterator[List[tuple]]:
+        """Gera listas de até `tamanho_bloco` linhas (tuplas na ordem de `colunas`), por data."""
+        colunas = self.validar_colunas(colunas)
+        condicoes, params = [], []
+        if data_inicio is not None:
+            condicoes.append('o.data >= ?')
+            params.append(str(data_inicio))
+        if data_fim is not None:
+            # Inclui o dia final inteiro mesmo se a data tiver horário
+            condicoes.append("o.data < date(?, '+1 day')")
+            params.append(str(data_fim))
+        query = f'''
+            SELECT {', '.join(COLUNAS_EXPORTACAO[coluna][0] for coluna in colunas)}
+            FROM operacoes o
+            LEFT JOIN ativos a ON a.id = o.ativo_id
+            {'WHERE ' + ' AND '.join(condicoes) if condicoes else ''}
+            ORDER BY o.data, o.id
+        '''
+        with self.db.leitura() as conn:
+            cursor = conn.cursor()
+            cursor.row_factory = None
+            cursor.execute(query, params)
+            while linhas := cursor.fetchmany(self.tamanho_bloco):
+                yield linhas
+
+    def exportar(self, destino, formato: str = 'csv', colunas: Optional[Sequence[str]] = None,
+                 data_inicio=None, data_fim=None) -> int:
+        """Escreve as operações em `destino` (caminho ou arquivo binário) e retorna o número de linhas."""
+        if formato not in FORMATOS_EXPORTACAO:
+            raise ValueError(f"Formato {formato} não suportado. Opções: {', '.join(FORMATOS_EXPORTACAO)}")
+        colunas = self.validar_colunas(colunas)
+        blocos = self.iterar_blocos(colunas, data_inicio, data_fim)
+        if formato == 'parquet':
+            return self._exportar_parquet(destino, colunas, blocos)
+        return self._exportar_csv(destino, colunas, blocos)
+
+    @staticmethod
+    def _exportar_csv(destino, colunas, blocos) -> int:
+        arquivo = open(destino, 'wb') if isinstance(destino, (str, os.PathLike)) else destino
+        texto = io.TextIOWrapper(arquivo, encoding='utf-8', newline='')
+        try:
+            escritor = csv.writer(texto)
+            escritor.writerow(colunas)
+            total = 0
+            for linhas in blocos:
+                escritor.writerows(linhas)
+                total += len(linhas)
+            texto.flush()
+        finally:
+            # Devolve o arquivo do chamador aberto; o wrapper não deve fechá-lo
+            texto.detach()
+            if arquivo is not destino:
+                arquivo.close()
+        return total
+
+    @staticmethod
+    def _exportar_parquet(destino, colunas, blocos) -> int:
+        # Importado sob demanda: só é necessário para exportar em Parquet
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError as e:
+            raise ImportError("A exportação em Parquet requer o pacote pyarrow") from e
+
+        esquema = pa.schema([(coluna, getattr(pa, COLUNAS_EXPORTACAO[coluna][1])()) for coluna in colunas])
+        total = 0
+        with pq.ParquetWriter(destino, esquema) as escritor:
+            for linhas in blocos:
+                arrays = [
+                    pa.array(valores, type=pa.string()).cast(tipo) if tipo == pa.date32() else pa.array(valores, type=tipo)
+                    for valores, tipo in zip(zip(*linhas), esquema.types)
+                ]
+                escritor.write_table(pa.Table.from_arrays(arrays, schema=esquema))
+                total += len(linhas)
+        return total
+
+    def gerar_arquivo(self, formato: str = 'csv', colunas: Optional[Sequence[str]] = None,
+                      data_inicio=None, data_fim=None) -> str:
+        """Exporta para um arquivo temporário e retorna o caminho; o chamador deve removê-lo."""
+        descritor, caminho = tempfile.mkstemp(prefix='operacoes_', suffix=f'.{formato}')
+        os.close(descritor)
+        try:
+            total = self.exportar(caminho, formato, colunas, data_inicio, data_fim)
+        except Exception:
+            os.remove(caminho)
+            raise
+        logger.info(f"{total} operações exportadas para {caminho}")
+        return caminho
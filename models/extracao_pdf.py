@@ -0,0 +1,91 @@
+import hashlib
+import logging
+import mmap
+import os
+from contextlib import contextmanager
+from io import BytesIO
+from typing import Iterator, Optional
+from utils.metricas import metricas
+
+logger = logging.getLogger(__name__)
+
+BACKENDS_PDF = ('pypdf2', 'pdfplumber')
+
+
+@contextmanager
+def abrir_fonte_pdf(origem):
+    """Abre `origem` como stream binário posicionado no início, sem copiar o conteúdo.
+
+    Caminhos são mapeados em memória; bytes são envolvidos em um BytesIO; objetos de
+    arquivo (como os uploads do Streamlit) são usados diretamente.
+    """
+    if isinstance(origem, (str, os.PathLike)):
+        with open(origem, 'rb') as arquivo, mmap.mmap(arquivo.fileno(), 0, access=mmap.ACCESS_READ) as mapa:
+            yield mapa
+    elif isinstance(origem, (bytes, bytearray, memoryview)):
+        yield BytesIO(origem)
+    else:
+        origem.seek(0)
+        yield origem
+
+
+def calcular_hash(origem) -> str:
+    """Calcula o SHA-256 do conteúdo do PDF."""
+    with abrir_fonte_pdf(origem) as fonte:
+        if isinstance(fonte, mmap.mmap):
+            return hashlib.sha256(fonte).hexdigest()
+        if hasattr(fonte, 'getbuffer'):
+            with fonte.getbuffer() as buffer:
+                return hashlib.sha256(buffer).hexdigest()
+
+        digest = hashlib.sha256()
+        for bloco in iter(lambda: fonte.read(1024 * 1024), b''):
+            digest.update(bloco)
+        fonte.seek(0)
+        return digest.hexdigest()
+
+
+def contar_paginas(origem, backend: str = 'pypdf2') -> int:
+    """Retorna o número de páginas do PDF."""
+    with abrir_fonte_pdf(origem) as fonte:
+        if backend == 'pdfplumber':
+            import pdfplumber
+
+            with pdfplumber.open(fonte) as pdf:
+                return len(pdf.pages)
+        import PyPDF2
+
+        return len(PyPDF2.PdfReader(fonte).pages)
+
+
+def iterar_paginas(origem, backend: str = 'pypdf2', inicio: int = 0, fim: Optional[int] = None) -> Iterator[str]:
+    """Gera o texto de cada página do PDF (ou das páginas [inicio, fim)), uma de cada vez.
+
+    Interromper a iteração fecha o arquivo sem extrair as páginas restantes.
+    """
+    if backend not in BACKENDS_PDF:
+        raise ValueError(f"Backend de PDF {backend} não suportado. Opções: {', '.join(BACKENDS_PDF)}")
+
+    with abrir_fonte_pdf(origem) as fonte:
+        if backend == 'pypdf2':
+            # Importado no primeiro uso, fora da inicialização do aplicativo
+            import PyPDF2
+
+            paginas = PyPDF2.PdfReader(fonte).pages
+            for indice in range(inicio, len(paginas) if fim is None else min(fim, len(paginas))):
+                with metricas.medir('pdf.extrair_pagina') as medicao:
+                    texto = paginas[indice].extract_text() or ''
+                    medicao.bytes = len(texto)
+                yield texto
+        else:
+            # Importado sob demanda: só é necessário quando escolhido como backend
+            import pdfplumber
+
+            with pdfplumber.open(fonte) as pdf:
+                for pagina in pdf.pages[inicio:fim]:
+                    with metricas.medir('pdf.extrair_pagina') as medicao:
+                        texto = pagina.extract_text() or ''
+                        medicao.bytes = len(texto)
+                    yield texto
+                    # Libera os objetos já interpretados da página
+                    pagina.flush_cache()
@@ -1,27 +1,243 @@
-from typing import List, Dict
-from datetime import datetime
+import logging
+from typing import List, Dict, Optional, Tuple
+import numpy as np
+import pandas as pd
+from config.config import ALIQUOTA_DAY_TRADE, ALIQUOTA_SWING_TRADE, ISENCAO_SWING_TRADE
+from models.eventos import fator_apos_mes
+from models.posicoes import calcular_custo_medio, separar_day_trade
+from utils.dinheiro import CENTAVOS_POR_REAL, arredondar_centavos, para_reais, sql_reais
+
+logger = logging.getLogger(__name__)
+
+ALIQUOTAS = {'swing_trade': ALIQUOTA_SWING_TRADE, 'day_trade': ALIQUOTA_DAY_TRADE}
+
+COLUNAS_APURACAO = ['mes', 'categoria', 'vendas', 'resultado', 'isento', 'prejuizo_acumulado', 'base_calculo', 'imposto']
+# Colunas em centavos na apuração; convertidas para reais só na leitura
+COLUNAS_MONETARIAS_APURACAO = ['vendas', 'resultado', 'prejuizo_acumulado', 'base_calculo', 'imposto']
+
+
+def _compensar_prejuizos(resultado: np.ndarray, prejuizo_inicial: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Compensa prejuízos mês a mês e retorna (base de cálculo, prejuízo acumulado), em centavos.
+
+    Com S = soma acumulada dos resultados (partindo de -prejuizo_inicial), o prejuízo a
+    compensar ao fim de cada mês é max(S) - S, com o máximo acumulado incluindo zero; a
+    base tributável é o quanto esse saldo diminuiu além do resultado do mês.
+    """
+    soma = np.cumsum(np.concatenate(([-prejuizo_inicial], resultado)).astype(np.int64))
+    saldo = soma - np.maximum(np.maximum.accumulate(soma), 0)
+    base = saldo[:-1] + resultado - saldo[1:]
+    return np.maximum(base, 0), np.abs(saldo[1:])
+
+
+def apurar_mensal(df: pd.DataFrame, posicoes_iniciais: Optional[pd.DataFrame] = None,
+                  prejuizos_iniciais: Optional[Dict[str, int]] = None) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """Apura o imposto de renda mês a mês, separando day trade e operações comuns.
+
+    `df` tem as colunas ativo_id, tipo, quantidade, valor, corretagem e data, com valores
+    em centavos; toda a apuração é feita em int64 e o imposto é arredondado ao centavo. Operações
+    comuns são avaliadas pelo custo médio e ficam isentas nos meses com vendas de até
+    ISENCAO_SWING_TRADE; prejuízos são compensados dentro de cada categoria.
+
+    Para continuar uma apuração anterior, informe as posições (ativo_id, quantidade,
+    custo_total e, se houver, preco_medio) e os prejuízos a compensar por categoria ao fim do mês anterior ao
+    primeiro de `df`. Retorna (apuração por mês e categoria, posições ao fim de cada mês
+    em que o ativo foi negociado).
+    """
+    day_trade, swing = separar_day_trade(df)
+
+    if posicoes_iniciais is not None and not posicoes_iniciais.empty:
+        comprado = posicoes_iniciais['quantidade'].to_numpy() >= 0
+        # O custo exato (preço médio * quantidade) retoma a apuração sem o arredondamento
+        # do custo gravado, dando o mesmo resultado de uma apuração completa
+        custo = (posicoes_iniciais['preco_medio'] * posicoes_iniciais['quantidade']
+                 if 'preco_medio' in posicoes_iniciais else posicoes_iniciais['custo_total'])
+        iniciais = pd.DataFrame({
+            'ativo_id': posicoes_iniciais['ativo_id'].to_numpy(),
+            'mes': '',
+            'tipo': np.where(comprado, 'Compra', 'Venda'),
+            'quantidade': np.abs(posicoes_iniciais['quantidade'].to_numpy()),
+            # Posição vendida: custo negativo, retomado como o valor recebido na venda
+            'valor': np.abs(custo.to_numpy(dtype=np.float64)),
+            'vendas': 0,
+            'corretagem': 0,
+        })
+        swing = pd.concat([iniciais, swing], ignore_index=True)
+    # A ordenação estável mantém as posições iniciais antes das operações de cada ativo
+    swing = calcular_custo_medio(swing.sort_values(['ativo_id', 'mes'], kind='stable', ignore_index=True))
+    swing = swing[swing['mes'] != '']
+
+    posicoes = swing.groupby(['ativo_id', 'mes'], sort=False).agg(
+        quantidade=('quantidade_acumulada', 'last'),
+        custo_total=('custo_acumulado', 'last'),
+        preco_medio=('preco_medio', 'last'),
+    ).reset_index()
+
+    meses = {
+        'swing_trade': swing.groupby('mes')[['vendas', 'lucro']].sum().rename(columns={'lucro': 'resultado'}),
+        'day_trade': day_trade.groupby('mes')[['vendas', 'resultado']].sum(),
+    }
+    prejuizos_iniciais = prejuizos_iniciais or {}
+    partes = []
+    for categoria, apuracao in meses.items():
+        if apuracao.empty:
+            continue
+        resultado = apuracao['resultado'].to_numpy()
+        isento = np.zeros(len(apuracao), dtype=bool)
+        if categoria == 'swing_trade':
+            isento = (apuracao['vendas'].to_numpy() <= ISENCAO_SWING_TRADE * CENTAVOS_POR_REAL) & (resultado > 0)
+        base, prejuizo = _compensar_prejuizos(np.where(isento, 0, resultado),
+                                              prejuizos_iniciais.get(categoria, 0))
+        partes.append(apuracao.reset_index().assign(
+            categoria=categoria,
+            isento=isento,
+            prejuizo_acumulado=prejuizo,
+            base_calculo=base,
+            imposto=arredondar_centavos(base * ALIQUOTAS[categoria]),
+        ))
+
+    if not partes:
+        return pd.DataFrame(columns=COLUNAS_APURACAO), posicoes
+    apuracao = pd.concat(partes, ignore_index=True)[COLUNAS_APURACAO]
+    return apuracao.sort_values(['mes', 'categoria'], ignore_index=True), posicoes
+
+
+def apuracao_em_reais(apuracao: pd.DataFrame) -> pd.DataFrame:
+    """Converte as colunas monetárias da apuração de centavos para reais."""
+    return apuracao.assign(**{coluna: apuracao[coluna] / CENTAVOS_POR_REAL for coluna in COLUNAS_MONETARIAS_APURACAO})
 
-ISENCAO_SWING_TRADE = 20000  # Define the exemption limit for swing trade
-ALIQUOTA_SWING_TRADE = 0.15  # Define the tax rate for swing trade
 
 class Impostos:
+    """Apuração de uma lista de operações em memória (valores em centavos, como lidos das notas).
+
+    Os resultados são devolvidos em reais.
+    """
+
     def __init__(self, operacoes: List[Dict]):
         self.operacoes = operacoes
 
+    def _dataframe(self) -> pd.DataFrame:
+        df = pd.DataFrame(self.operacoes)
+        if 'ativo_id' not in df:
+            df['ativo_id'] = df['codigo'] if 'codigo' in df else df['ativo']
+        if 'corretagem' not in df:
+            df['corretagem'] = 0
+        return df
+
+    def apuracao_mensal(self) -> pd.DataFrame:
+        """Retorna a apuração por mês e categoria (swing_trade e day_trade)."""
+        if not self.operacoes:
+            return pd.DataFrame(columns=COLUNAS_APURACAO)
+        return apuracao_em_reais(apurar_mensal(self._dataframe())[0])
+
     def calcular_imposto(self) -> Dict:
         """Calcula o imposto devido sobre as operações."""
-        total_vendas = sum(op['valor'] for op in self.operacoes if op['tipo'] == 'Venda')
-        total_compras = sum(op['valor'] for op in self.operacoes if op['tipo'] == 'Compra')
-        lucro_prejuizo = total_vendas - total_compras
+        if not self.operacoes:
+            return {'total_vendas': 0, 'total_compras': 0, 'lucro_prejuizo': 0, 'imposto_devido': 0}
 
-        if total_vendas <= ISENCAO_SWING_TRADE:
-            imposto_devido = 0
-        else:
-            imposto_devido = lucro_prejuizo * ALIQUOTA_SWING_TRADE
+        df = self._dataframe()
+        venda = (df['tipo'] == 'Venda').to_numpy()
+        apuracao = apurar_mensal(df)[0]
+        por_categoria = apuracao.groupby('categoria')['imposto'].sum()
 
         return {
-            'total_vendas': total_vendas,
-            'total_compras': total_compras,
-            'lucro_prejuizo': lucro_prejuizo,
-            'imposto_devido': imposto_devido
-        }
\ No newline at end of file
+            'total_vendas': para_reais(int(df['valor'][venda].sum())),
+            'total_compras': para_reais(int(df['valor'][~venda].sum())),
+            'lucro_prejuizo': para_reais(int(apuracao['resultado'].sum())),
+            'imposto_swing_trade': para_reais(int(por_categoria.get('swing_trade', 0))),
+            'imposto_day_trade': para_reais(int(por_categoria.get('day_trade', 0))),
+            'imposto_devido': para_reais(int(apuracao['imposto'].sum()))
+        }
+
+
+class ApuracaoMensal:
+    """Apuração mensal gravada em `apuracao_mensal`, com as posições de cada fim de mês.
+
+    Ao registrar operações, a apuração é refeita apenas a partir do mês da operação mais
+    antiga, retomando as posições e os prejuízos gravados no mês anterior.
+
+    Cada posição de fim de mês fica na base de ações daquele mês, sempre inteira: um
+    desdobramento ou grupamento posterior não altera as linhas gravadas, e a posição é
+    levada à base atual (`fator_apos_mes`) quando a apuração é retomada.
+    """
+
+    def __init__(self, database, eventos=None):
+        self.db = database
+        self.eventos = eventos
+        resultado = self.db.execute_query('''
+            SELECT EXISTS (SELECT 1 FROM operacoes) AND NOT EXISTS (SELECT 1 FROM apuracao_mensal)
+        ''')
+        if resultado and resultado[0][0]:
+            logger.info("Apuração mensal vazia: recalculando a partir das operações")
+            self.recalcular()
+
+    def recalcular(self, a_partir_de: Optional[str] = None) -> None:
+        """Refaz a apuração desde o mês de `a_partir_de` (data ISO) ou desde o início."""
+        with self.db.transaction() as conn:
+            self.atualizar(conn, a_partir_de)
+
+    def atualizar(self, conn, a_partir_de: Optional[str] = None) -> None:
+        """Refaz a apuração desde o mês de `a_partir_de`, na transação aberta em `conn`."""
+        mes = a_partir_de[:7] if a_partir_de else ''
+        operacoes = pd.read_sql_query('''
+            SELECT ativo_id, tipo, quantidade, valor, corretagem, data
+            FROM operacoes WHERE data >= ?
+        ''', conn, params=(mes,))
+        if self.eventos:
+            operacoes = self.eventos.ajustar(conn, operacoes, a_partir_de=mes)
+
+        posicoes_iniciais = pd.read_sql_query('''
+            SELECT p.ativo_id, p.mes, p.quantidade, p.custo_total, p.preco_medio
+            FROM posicoes_mensais p
+            WHERE p.mes = (
+                SELECT MAX(mes) FROM posicoes_mensais WHERE ativo_id = p.ativo_id AND mes < ?
+            )
+        ''', conn, params=(mes,))
+        if self.eventos and not posicoes_iniciais.empty:
+            fator = self._fator_apos_mes(conn, posicoes_iniciais)
+            posicoes_iniciais['quantidade'] = posicoes_iniciais['quantidade'] * fator
+            posicoes_iniciais['preco_medio'] = posicoes_iniciais['preco_medio'] / fator
+        prejuizos_iniciais = dict(conn.execute('''
+            SELECT a.categoria, a.prejuizo_acumulado
+            FROM apuracao_mensal a
+            WHERE a.mes = (SELECT MAX(mes) FROM apuracao_mensal WHERE categoria = a.categoria AND mes < ?)
+        ''', (mes,)).fetchall())
+
+        conn.execute('DELETE FROM apuracao_mensal WHERE mes >= ?', (mes,))
+        conn.execute('DELETE FROM posicoes_mensais WHERE mes >= ?', (mes,))
+        if operacoes.empty:
+            return
+
+        apuracao, posicoes = apurar_mensal(operacoes, posicoes_iniciais, prejuizos_iniciais)
+        if self.eventos and not posicoes.empty:
+            fator = self._fator_apos_mes(conn, posicoes)
+            posicoes['quantidade'] = np.round(posicoes['quantidade'] / fator).astype(np.int64)
+            posicoes['preco_medio'] = posicoes['preco_medio'] * fator
+        conn.executemany(f'''
+            INSERT INTO apuracao_mensal ({', '.join(COLUNAS_APURACAO)})
+            VALUES ({', '.join('?' * len(COLUNAS_APURACAO))})
+        ''', apuracao.astype(object).itertuples(index=False, name=None))
+        conn.executemany('''
+            INSERT INTO posicoes_mensais (ativo_id, mes, quantidade, custo_total, preco_medio)
+            VALUES (?, ?, ?, ?, ?)
+        ''', posicoes[['ativo_id', 'mes', 'quantidade', 'custo_total', 'preco_medio']].astype(object).itertuples(
+            index=False, name=None))
+
+    def _fator_apos_mes(self, conn, posicoes: pd.DataFrame) -> np.ndarray:
+        """Fator que leva cada posição (ativo_id, mes) da base de ações do mês para a atual."""
+        fatores = self.eventos.fatores(conn, posicoes['ativo_id'].unique().tolist())
+        if fatores.empty:
+            return np.ones(len(posicoes))
+        return fator_apos_mes(posicoes['ativo_id'], posicoes['mes'], fatores)
+
+    def obter(self, mes_inicio: Optional[str] = None, mes_fim: Optional[str] = None) -> pd.DataFrame:
+        """Retorna a apuração gravada, em reais, opcionalmente limitada a um intervalo de meses (AAAA-MM)."""
+        colunas = [
+            sql_reais(coluna, coluna) if coluna in COLUNAS_MONETARIAS_APURACAO else coluna
+            for coluna in COLUNAS_APURACAO
+        ]
+        return self.db.query_dataframe(f'''
+            SELECT {', '.join(colunas)}
+            FROM apuracao_mensal
+            WHERE mes BETWEEN ? AND ?
+            ORDER BY mes, categoria
+        ''', params=(mes_inicio or '', mes_fim or '9999-99'))
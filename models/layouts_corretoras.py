@@ -0,0 +1,241 @@
+import re
+import logging
+from datetime import datetime
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+from utils.dinheiro import converter_centavos, converter_centavos_lote
+from utils.metricas import metricas
+
+logger = logging.getLogger(__name__)
+
+
+def converter_data(texto: str) -> datetime:
+    return datetime.strptime(texto, '%d/%m/%Y')
+
+
+def converter_tipo(texto: str) -> str:
+    return 'Compra' if texto == 'C' else 'Venda'
+
+
+# Conversores com versão para a coluna inteira, usada nas operações
+CONVERSORES_EM_LOTE = {converter_centavos: converter_centavos_lote}
+
+PADRAO_DATA_PREGAO = r'Data pregão:\s*(\d{2}/\d{2}/\d{4})'
+PADRAO_NUMERO_NOTA = r'Nr\. nota:\s*(\d+)'
+# Última linha do resumo financeiro: marca o fim da nota
+PADRAO_DATA_LIQUIDACAO = r'Líquido para\s+(\d{2}/\d{2}/\d{4})'
+
+PADROES_TAXAS = {
+    'Taxa de liquidação': r'Taxa de liquidação\s+([\d.,]+)',
+    'Taxa de registro': r'Taxa de Registro\s+([\d.,]+)',
+    'Emolumentos': r'Emolumentos\s+([\d.,]+)',
+    'Taxa operacional': r'Taxa Operacional\s+([\d.,]+)',
+    'Execução': r'Execução\s+([\d.,]+)',
+    'Taxa de custódia': r'Taxa de Custódia\s+([\d.,]+)',
+    'Impostos': r'Impostos\s+([\d.,]+)',
+    'IRRF': r'I.R.R.F. s/ operações\s+([\d.,]+)',
+    'Outros': r'Outros\s+([\d.,]+)'
+}
+
+# Layout simplificado: "PETR4 C 100 30,50"
+PADRAO_OPERACAO_SIMPLES = r'([A-Z0-9]+)\s+([CV])\s+(\d+)\s+([\d.,]+)'
+CAMPOS_OPERACAO_SIMPLES = (
+    ('ativo', str),
+    ('tipo', converter_tipo),
+    ('quantidade', int),
+    ('preco', converter_centavos),
+)
+
+# Layout padrão B3: "1-BOVESPA C VISTA PETR4 100 30,50 3.050,00". O primeiro grupo é escrito
+# como \d\d* (equivalente a \d+) para que o `re` salte direto para os dígitos na busca.
+PADRAO_OPERACAO_BOVESPA = r'(\d\d*)\s+(\d+)\s+([CV])\s+(VISTA|FRACIONARIO)\s+(\w+)\s+(\d+)\s+([\d.,]+)\s+([\d.,]+)'
+CAMPOS_OPERACAO_BOVESPA = (
+    (None, None),
+    (None, None),
+    ('tipo', converter_tipo),
+    ('mercado', str),
+    ('ativo', str),
+    ('quantidade', int),
+    ('preco', converter_centavos),
+    ('valor', converter_centavos),
+)
+
+
+class LayoutCorretora:
+    """Layout da nota de corretagem de uma corretora.
+
+    Os padrões são compilados uma única vez. Cabeçalho e taxas formam uma só expressão
+    (cada alternativa começa por um literal, o que permite ao `re` saltar direto para os
+    candidatos) que é aplicada apenas ao texto fora do bloco de operações; assim cada
+    trecho da nota é percorrido uma só vez. Cada grupo de `padrao_operacao` é associado
+    a um item de `campos_operacao`, no formato (nome, conversor); grupos com nome None
+    são descartados. Preços, valores e taxas são lidos em centavos (int).
+    """
+
+    def __init__(self, corretora: str, padrao_operacao: str,
+                 campos_operacao: Sequence[Tuple[Optional[str], Optional[Callable]]],
+                 padrao_data: str = PADRAO_DATA_PREGAO, padrao_nota: str = PADRAO_NUMERO_NOTA,
+                 padrao_liquidacao: str = PADRAO_DATA_LIQUIDACAO,
+                 padroes_taxas: Dict[str, str] = PADROES_TAXAS):
+        self.corretora = corretora
+        self._metrica_parser = f'parser.{corretora}'
+
+        self.padrao_data = re.compile(padrao_data)
+        self.padrao_nota = re.compile(padrao_nota)
+        self.padrao_operacao = re.compile(padrao_operacao)
+        if self.padrao_operacao.groups != len(campos_operacao):
+            raise ValueError(f"Layout {corretora}: o número de campos não corresponde aos grupos do padrão")
+        # Conversores str são dispensados: o grupo já é o valor final; os que têm versão em
+        # lote (CONVERSORES_EM_LOTE) recebem a coluna inteira
+        self._nomes_operacao = tuple(campo for campo, _ in campos_operacao if campo is not None)
+        self._colunas_operacao = tuple(
+            (indice, None if conversor is str else CONVERSORES_EM_LOTE.get(conversor, conversor),
+             conversor in CONVERSORES_EM_LOTE)
+            for indice, (campo, conversor) in enumerate(campos_operacao)
+            if campo is not None
+        )
+
+        # Cada alternativa tem um único grupo, identificado por match.lastindex
+        alternativas = [
+            ('data_pregao', converter_data, padrao_data),
+            ('numero_nota', str, padrao_nota),
+            ('data_liquidacao', converter_data, padrao_liquidacao),
+        ]
+        alternativas += [(nome, converter_centavos, padrao) for nome, padrao in padroes_taxas.items()]
+        for nome, _, padrao in alternativas:
+            if re.compile(padrao).groups != 1:
+                raise ValueError(f"Layout {corretora}: o padrão de '{nome}' deve ter exatamente um grupo")
+        self.padrao_cabecalho_taxas = re.compile('|'.join(padrao for _, _, padrao in alternativas))
+        self._campos_cabecalho_taxas = {
+            indice: (nome, conversor, nome in padroes_taxas)
+            for indice, (nome, conversor, _) in enumerate(alternativas, start=1)
+        }
+
+    def nota_vazia(self) -> Dict:
+        return {
+            'corretora': self.corretora,
+            'operacoes': [],
+            'taxas': {},
+            'data_pregao': None,
+            'numero_nota': None,
+            'data_liquidacao': None
+        }
+
+    def nota_completa(self, dados_nota: Dict) -> bool:
+        """Indica se as operações e o resumo financeiro da nota já foram lidos."""
+        return bool(dados_nota['operacoes']) and bool(dados_nota['taxas']) and dados_nota['data_liquidacao'] is not None
+
+    def chave_pagina(self, pagina: str) -> Tuple[Optional[str], Optional[str]]:
+        """Retorna (número da nota, data do pregão) do cabeçalho da página, se houver."""
+        numero = self.padrao_nota.search(pagina)
+        data = self.padrao_data.search(pagina)
+        return (numero[1] if numero else None, data[1] if data else None)
+
+    @staticmethod
+    def _mesma_nota(chave: Tuple, outra: Tuple) -> bool:
+        # Componentes ausentes (página sem cabeçalho) não separam notas
+        return all(a is None or b is None or a == b for a, b in zip(chave, outra))
+
+    @staticmethod
+    def _combinar_chaves(chave: Tuple, outra: Tuple) -> Tuple:
+        return tuple(a if a is not None else b for a, b in zip(chave, outra))
+
+    def segmentar(self, paginas: Iterable[str]) -> Iterator[List[str]]:
+        """Agrupa as páginas de um PDF com várias notas, gerando as páginas de cada nota.
+
+        Uma nova nota começa quando o cabeçalho da página (número ou data do pregão) difere
+        do da nota atual; páginas sem cabeçalho continuam a nota corrente.
+        """
+        segmento = []
+        chave_atual = (None, None)
+        for pagina in paginas:
+            chave = self.chave_pagina(pagina)
+            if segmento and not self._mesma_nota(chave_atual, chave):
+                yield segmento
+                segmento = []
+                chave_atual = (None, None)
+            chave_atual = self._combinar_chaves(chave_atual, chave)
+            segmento.append(pagina)
+        if segmento:
+            yield segmento
+
+    def extrair_paginas(self, paginas: Iterable[str]) -> Dict:
+        """Extrai a primeira nota página a página, parando assim que ela estiver completa.
+
+        A leitura também para ao encontrar o cabeçalho de outra nota. As páginas seguintes
+        não são consumidas, de modo que o restante do PDF nem chega a ser extraído quando
+        `paginas` é um gerador.
+        """
+        dados_nota = self.nota_vazia()
+        chave_atual = (None, None)
+        for pagina in paginas:
+            chave = self.chave_pagina(pagina)
+            if not self._mesma_nota(chave_atual, chave):
+                break
+            chave_atual = self._combinar_chaves(chave_atual, chave)
+            self.extrair(pagina, dados_nota)
+            if self.nota_completa(dados_nota):
+                break
+        return dados_nota
+
+    def extrair(self, texto: str, dados_nota: Optional[Dict] = None) -> Dict:
+        """Extrai cabeçalho, operações e taxas de `texto`.
+
+        Se `dados_nota` for informado, os dados são acumulados nele; campos de cabeçalho e
+        taxas já preenchidos são mantidos, como na primeira ocorrência de uma busca.
+        """
+        if dados_nota is None:
+            dados_nota = self.nota_vazia()
+
+        with metricas.medir(self._metrica_parser, len(texto)):
+            matches = list(self.padrao_operacao.finditer(texto))
+            if matches:
+                inicio_operacoes, fim_operacoes = matches[0].start(), matches[-1].end()
+                dados_nota['operacoes'].extend(self._converter_operacoes([match.groups() for match in matches]))
+            else:
+                inicio_operacoes = fim_operacoes = len(texto)
+
+            # Cabeçalho antes das operações e taxas depois delas. A leitura do cabeçalho para
+            # assim que ele estiver completo; o restante só é lido se nenhuma taxa aparecer.
+            fim_cabecalho = self._extrair_cabecalho_taxas(texto, 0, inicio_operacoes, dados_nota, ate_cabecalho=True)
+            self._extrair_cabecalho_taxas(texto, fim_operacoes, len(texto), dados_nota)
+            if not dados_nota['taxas'] or dados_nota['data_pregao'] is None or dados_nota['numero_nota'] is None:
+                self._extrair_cabecalho_taxas(texto, fim_cabecalho, fim_operacoes, dados_nota)
+
+        return dados_nota
+
+    def _converter_operacoes(self, linhas):
+        """Converte as operações coluna a coluna e monta um dicionário por operação."""
+        colunas = list(zip(*linhas))
+        convertidas = [
+            colunas[indice] if conversor is None
+            else conversor(colunas[indice]) if em_lote
+            else list(map(conversor, colunas[indice]))
+            for indice, conversor, em_lote in self._colunas_operacao
+        ]
+        nomes = self._nomes_operacao
+        return [dict(zip(nomes, valores)) for valores in zip(*convertidas)]
+
+    def _extrair_cabecalho_taxas(self, texto: str, inicio: int, fim: int, dados_nota: Dict,
+                                 ate_cabecalho: bool = False) -> int:
+        """Lê cabeçalho e taxas em texto[inicio:fim] e retorna a posição onde a leitura parou."""
+        taxas = dados_nota['taxas']
+        for match in self.padrao_cabecalho_taxas.finditer(texto, inicio, fim):
+            indice = match.lastindex
+            nome, conversor, taxa = self._campos_cabecalho_taxas[indice]
+            if taxa:
+                if nome not in taxas:
+                    taxas[nome] = conversor(match[indice])
+            elif dados_nota[nome] is None:
+                dados_nota[nome] = conversor(match[indice])
+                if ate_cabecalho and dados_nota['data_pregao'] is not None and dados_nota['numero_nota'] is not None:
+                    return match.end()
+        return max(inicio, fim)
+
+
+LAYOUTS = {
+    'XP': LayoutCorretora('XP', PADRAO_OPERACAO_SIMPLES, CAMPOS_OPERACAO_SIMPLES),
+    'RICO': LayoutCorretora('RICO', PADRAO_OPERACAO_BOVESPA, CAMPOS_OPERACAO_BOVESPA),
+    'AGORA': LayoutCorretora('AGORA', PADRAO_OPERACAO_BOVESPA, CAMPOS_OPERACAO_BOVESPA),
+    'CLEAR': LayoutCorretora('CLEAR', PADRAO_OPERACAO_BOVESPA, CAMPOS_OPERACAO_BOVESPA),
+    'NUINVEST': LayoutCorretora('NUINVEST', PADRAO_OPERACAO_BOVESPA, CAMPOS_OPERACAO_BOVESPA),
+}
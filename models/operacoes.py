@@ -1,71 +1,228 @@
-from typing import Dict
+from typing import Dict, List, Optional, Tuple
+from config.config import TIPOS_EVENTOS
 from database.database import Database
+from models.eventos import TIPOS_AJUSTE, Eventos
+from models.impostos import ApuracaoMensal
+from models.posicoes import Posicoes
+from models.precos import Precos
+from models.resumos import Resumos
+from utils.cache_consultas import CacheConsultas, em_cache
+from utils.dinheiro import CENTAVOS_POR_REAL, sql_reais
+from utils.metricas import cronometrado, metricas
 from datetime import datetime
-import pandas as pd
 import logging
 
 logger = logging.getLogger(__name__)
 
 class Operacoes:
-    def __init__(self, database: Database):
+    # Limite de parâmetros por consulta IN, abaixo do máximo do SQLite
+    TAMANHO_LOTE_CONSULTA = 900
+    # Colunas de `operacoes` como exibidas: valores gravados em centavos, lidos em reais
+    SELECAO_OPERACOES = ', '.join([
+        'id', 'ativo_id', 'tipo', 'quantidade', sql_reais('preco', 'preco'), 'data',
+        sql_reais('corretagem', 'corretagem'), sql_reais('valor', 'valor'),
+        sql_reais('preco_venda', 'preco_venda'), sql_reais('preco_compra', 'preco_compra'),
+        'corretora', 'numero_nota',
+    ])
+
+    def __init__(self, database: Database, cache: Optional[CacheConsultas] = None):
         self.db = database
+        self.cache = cache
+        self._ids_ativos: Dict[str, int] = {}
+        self._ids_ativos_carregados = False
+        self.eventos = Eventos(database)
+        self.posicoes = Posicoes(database, self.eventos)
+        self.apuracao = ApuracaoMensal(database, self.eventos)
+        self.resumos = Resumos(database)
+        self.precos = Precos(database)
+
+    @cronometrado('operacoes.registrar_nota')
+    def registrar_nota(self, dados_nota: Dict) -> bool:
+        """Registra uma nota e suas operações em uma única transação.
+
+        Preços, valores e taxas vêm em centavos (int), como lidos pelos layouts. Retorna
+        False, sem inserir nada, se a nota já tiver sido importada. Se alguma operação
+        falhar, a nota inteira é desfeita e a exceção é propagada.
 
-        # Create tables if they do not exist
-        self.db.execute_query('''
-            CREATE TABLE IF NOT EXISTS operacoes (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                ativo_id INTEGER,
-                tipo TEXT,
-                quantidade INTEGER,
-                preco REAL,
-                data TEXT,
-                corretagem REAL,
-                valor REAL,
-                preco_venda REAL,
-                preco_compra REAL,
-                FOREIGN KEY (ativo_id) REFERENCES ativos(id)
-            );
-        ''')
-        self.db.execute_query('''
-            CREATE TABLE IF NOT EXISTS ativos (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                codigo TEXT UNIQUE
-            );
-        ''')
+        Notas sem número, corretora ou data do pregão são recusadas com ValueError: sem
+        eles a nota não pode ser deduplicada (NULL não conflita no índice único) e reenviá-la
+        duplicaria as operações. Só um conflito no índice único conta como nota já importada;
+        qualquer outra restrição violada é erro.
+        """
+        faltantes = [campo for campo in ('numero_nota', 'corretora', 'data_pregao') if not dados_nota.get(campo)]
+        if faltantes:
+            raise ValueError(f"Nota {dados_nota.get('corretora')} {dados_nota.get('numero_nota')} de "
+                             f"{dados_nota.get('data_pregao')} sem {', '.join(faltantes)}: "
+                             "não é possível verificar se já foi importada")
+
+        query = '''
+            INSERT INTO notas_corretagem
+            (numero, corretora, data_pregao, valor_total, total_taxas)
+            VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT (corretora, numero, data_pregao) DO NOTHING
+        '''
+        operacoes = [self._preparar_operacao(op, dados_nota) for op in dados_nota['operacoes']]
+
+        try:
+            with self.db.transaction() as conn:
+                cursor = conn.execute(query, (
+                    dados_nota.get('numero_nota'),
+                    dados_nota['corretora'],
+                    self._formatar_data(dados_nota['data_pregao']),
+                    sum(op[6] for op in operacoes),
+                    sum(dados_nota['taxas'].values())
+                ))
+                if cursor.rowcount == 0:
+                    logger.info(f"Nota já importada: {dados_nota['corretora']} {dados_nota.get('numero_nota')}")
+                    return False
+                novos_ativos = self._inserir_operacoes(conn, operacoes)
+        except Exception as e:
+            logger.error(f"Erro ao registrar nota {dados_nota.get('numero_nota')}: {e}")
+            raise
+
+        self._ids_ativos.update(novos_ativos)
+        logger.info(f"Nota registrada: {dados_nota['corretora']} {dados_nota.get('numero_nota')} "
+                    f"({len(operacoes)} operações)")
+        return True
 
     def registrar_operacao(self, dados_operacao: Dict) -> bool:
         """Registra uma nova operação"""
+        return self.registrar_operacoes([dados_operacao])
+
+    @cronometrado('operacoes.registrar_operacoes')
+    def registrar_operacoes(self, lista_operacoes: List[Dict]) -> bool:
+        """Registra várias operações (valores em centavos) em uma única transação; nada é gravado se alguma falhar"""
         try:
-            # Primeiro, verifica se o ativo existe
-            ativo_id = self.obter_ativo_id(dados_operacao['codigo'])
-            if not ativo_id:
-                # Se não existe, cria o ativo
-                self.criar_ativo(dados_operacao['codigo'])
-                ativo_id = self.obter_ativo_id(dados_operacao['codigo'])
-
-            # Registra a operação
-            query = '''
-                INSERT INTO operacoes 
-                (ativo_id, tipo, quantidade, preco, data, corretagem, valor, preco_venda, preco_compra)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-            '''
-            self.db.execute_query(query, (
-                ativo_id,
-                dados_operacao['tipo'],
-                dados_operacao['quantidade'],
-                dados_operacao['preco'],
-                dados_operacao['data'],
-                dados_operacao.get('corretagem', 0),
-                dados_operacao.get('valor', 0),
-                dados_operacao.get('preco_venda', 0),
-                dados_operacao.get('preco_compra', 0)
-            ))
-            logger.info(f"Operação registrada com sucesso: {dados_operacao}")
-            return True
+            operacoes = [self._preparar_operacao(op) for op in lista_operacoes]
+            with self.db.transaction() as conn:
+                novos_ativos = self._inserir_operacoes(conn, operacoes)
         except Exception as e:
-            logger.error(f"Erro ao registrar operação: {e}")
+            logger.error(f"Erro ao registrar operações: {e}")
             return False
 
+        self._ids_ativos.update(novos_ativos)
+        logger.info(f"{len(operacoes)} operações registradas com sucesso")
+        return True
+
+    @cronometrado('operacoes.inserir_operacoes')
+    def _inserir_operacoes(self, conn, operacoes: List[tuple]) -> Dict[str, int]:
+        """Insere as operações preparadas na transação aberta em `conn`.
+
+        Posições, resumos e apuração mensal são atualizados na mesma transação; a apuração
+        é refeita a partir do mês da operação mais antiga.
+
+        Retorna os ativos criados nesta transação; eles só devem entrar no cache de IDs
+        depois do commit, já que um rollback descarta os IDs gerados.
+        """
+        ids_ativos, novos_ativos = self._resolver_ids_ativos(conn, {op[0] for op in operacoes})
+        conn.executemany('''
+            INSERT INTO operacoes
+            (ativo_id, tipo, quantidade, preco, data, corretagem, valor, preco_venda, preco_compra,
+             corretora, numero_nota)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', [(ids_ativos[op[0]],) + op[1:] for op in operacoes])
+        metricas.contar('operacoes.inseridas', len(operacoes))
+        aplicadas = [(ids_ativos[op[0]], op[1], op[2], op[4], op[6], op[5]) for op in operacoes]
+        with metricas.medir('operacoes.atualizar_posicoes'):
+            self.posicoes.aplicar(conn, aplicadas)
+        with metricas.medir('operacoes.atualizar_resumos'):
+            self.resumos.aplicar(conn, aplicadas)
+        if operacoes:
+            with metricas.medir('operacoes.atualizar_apuracao'):
+                self.apuracao.atualizar(conn, min(op[4] for op in operacoes))
+        return novos_ativos
+
+    @cronometrado('operacoes.resolver_ativos')
+    def _resolver_ids_ativos(self, conn, codigos) -> Tuple[Dict[str, int], Dict[str, int]]:
+        """Resolve os IDs dos ativos pelo cache, criando os que ainda não existem"""
+        if not self._ids_ativos_carregados:
+            self._ids_ativos.update(conn.execute('SELECT codigo, id FROM ativos'))
+            self._ids_ativos_carregados = True
+
+        faltantes = sorted(set(codigos) - self._ids_ativos.keys())
+        novos_ativos = {}
+        if faltantes:
+            conn.executemany('INSERT OR IGNORE INTO ativos (codigo) VALUES (?)', [(c,) for c in faltantes])
+            for inicio in range(0, len(faltantes), self.TAMANHO_LOTE_CONSULTA):
+                lote = faltantes[inicio:inicio + self.TAMANHO_LOTE_CONSULTA]
+                marcadores = ', '.join('?' * len(lote))
+                novos_ativos.update(conn.execute(
+                    f'SELECT codigo, id FROM ativos WHERE codigo IN ({marcadores})', lote
+                ))
+            if nao_criados := set(faltantes) - novos_ativos.keys():
+                raise ValueError(f"Não foi possível criar os ativos: {', '.join(sorted(nao_criados))}")
+
+        return {**self._ids_ativos, **novos_ativos}, novos_ativos
+
+    def _preparar_operacao(self, operacao: Dict, dados_nota: Optional[Dict] = None) -> tuple:
+        """Converte uma operação (da nota ou avulsa) na tupla de colunas de `operacoes`"""
+        data = operacao.get('data') or dados_nota['data_pregao']
+        return (
+            operacao.get('codigo') or operacao['ativo'],
+            operacao['tipo'],
+            operacao['quantidade'],
+            operacao['preco'],
+            self._formatar_data(data),
+            operacao.get('corretagem', 0),
+            operacao.get('valor') or operacao['quantidade'] * operacao['preco'],
+            operacao.get('preco_venda', 0),
+            operacao.get('preco_compra', 0),
+            operacao.get('corretora') or (dados_nota or {}).get('corretora'),
+            operacao.get('numero_nota') or (dados_nota or {}).get('numero_nota')
+        )
+
+    @staticmethod
+    def _formatar_data(data):
+        if isinstance(data, datetime):
+            return data.strftime('%Y-%m-%d')
+        return data
+
+    def registrar_evento(self, codigo: str, tipo: str, data, valor: float) -> bool:
+        """Registra um evento corporativo do ativo.
+
+        Desdobramentos e grupamentos (`valor` = proporção) reconstroem a posição do ativo
+        e refazem a apuração a partir do mês do evento, na mesma transação. Para dividendos
+        e JCP, `valor` é o valor bruto por ação em reais, gravado em centavos.
+        """
+        if tipo not in TIPOS_EVENTOS:
+            raise ValueError(f"Tipo de evento {tipo} não suportado. Opções: {', '.join(TIPOS_EVENTOS)}")
+        if not valor or valor <= 0:
+            raise ValueError("O valor do evento deve ser positivo")
+        data = self._formatar_data(data)
+        if not isinstance(data, str):
+            data = data.isoformat()
+        # Sem arredondar: o provento por ação pode ter frações de centavo
+        valor_gravado = valor if tipo in TIPOS_AJUSTE else valor * CENTAVOS_POR_REAL
+
+        try:
+            with self.db.transaction() as conn:
+                ids_ativos, novos_ativos = self._resolver_ids_ativos(conn, {codigo})
+                ativo_id = ids_ativos[codigo]
+                conn.execute('INSERT INTO eventos (ativo_id, tipo, data, valor) VALUES (?, ?, ?, ?)',
+                             (ativo_id, tipo, data, valor_gravado))
+                if tipo in TIPOS_AJUSTE:
+                    self._aplicar_ajuste(conn, ativo_id, data)
+        except Exception as e:
+            logger.error(f"Erro ao registrar evento {tipo} de {codigo}: {e}")
+            # Fatores lidos dentro da transação desfeita não valem mais
+            self.eventos.invalidar()
+            return False
+
+        self._ids_ativos.update(novos_ativos)
+        logger.info(f"Evento registrado: {tipo} de {codigo} em {data} ({valor})")
+        return True
+
+    def _aplicar_ajuste(self, conn, ativo_id: int, data: str) -> None:
+        """Leva posições e apuração do ativo para a nova base de ações após um desdobramento ou grupamento.
+
+        As posições de fim de mês anteriores ao evento continuam na base do seu mês; a
+        partir do mês do evento, a apuração é refeita com as operações ajustadas e a fração
+        leiloada.
+        """
+        self.eventos.invalidar([ativo_id])
+        self.posicoes._reconstruir(conn, [ativo_id])
+        self.apuracao.atualizar(conn, data)
+
     def obter_ativo_id(self, codigo: str) -> int:
         """Obtém o ID do ativo pelo código"""
         query = '''
@@ -94,28 +251,60 @@ class Operacoes:
             logger.error(f"Erro ao criar ativo: {e}")
             return False
 
+    @em_cache
     def obter_operacoes(self, data_inicio, data_fim):
-        query = '''
-        SELECT * FROM operacoes WHERE data BETWEEN ? AND ?
+        query = f'''
+        SELECT {self.SELECAO_OPERACOES} FROM operacoes WHERE data BETWEEN ? AND ?
         '''
-        return pd.read_sql_query(query, self.db.connection, params=(data_inicio, data_fim))
+        return self.db.query_dataframe(query, params=(data_inicio, data_fim))
 
+    @em_cache
     def obter_todas_operacoes(self):
-        query = '''
-        SELECT * FROM operacoes
+        query = f'''
+        SELECT {self.SELECAO_OPERACOES} FROM operacoes
         '''
-        return pd.read_sql_query(query, self.db.connection)
+        return self.db.query_dataframe(query)
 
+    @em_cache
     def calcular_saldo_total(self):
-        query = '''
-        SELECT SUM(valor) as saldo_total FROM operacoes
+        query = f'''
+        SELECT {sql_reais('SUM(valor)', 'saldo_total')} FROM operacoes
         '''
         resultado = self.db.execute_query(query)
         return resultado[0]['saldo_total'] if resultado else 0
 
+    @em_cache
     def calcular_lucro_prejuizo(self):
-        query = '''
-        SELECT SUM((preco_venda - preco_compra) * quantidade) as lucro_prejuizo FROM operacoes
-        '''
-        resultado = self.db.execute_query(query)
-        return resultado[0]['lucro_prejuizo'] if resultado else 0
\ No newline at end of file
+        """Lucro realizado pelo custo médio, somado sobre todos os ativos"""
+        return self.posicoes.calcular_lucro_realizado()
+
+    @em_cache
+    def obter_posicoes(self, apenas_abertas: bool = True):
+        return self.posicoes.obter_posicoes(apenas_abertas)
+
+    @em_cache
+    def obter_avaliacao_carteira(self):
+        """Posições abertas avaliadas pelo último fechamento gravado (sem consultar o provedor)."""
+        return self.precos.avaliar_carteira()
+
+    @em_cache
+    def obter_rendimentos(self, data_inicio=None, data_fim=None):
+        """Dividendos e JCP do período, com a quantidade em carteira em cada data "com"."""
+        return self.eventos.rendimentos(data_inicio, data_fim)
+
+    @em_cache
+    def obter_resumo_mensal_eventos(self, mes_inicio: Optional[str] = None, mes_fim: Optional[str] = None):
+        """Compras, vendas, dividendos e JCP por mês."""
+        return self.eventos.resumo_mensal(mes_inicio, mes_fim)
+
+    @em_cache
+    def obter_resumo_por_ativo(self, data_inicio, data_fim):
+        return self.resumos.resumo_por_ativo(data_inicio, data_fim)
+
+    @em_cache
+    def obter_serie_diaria(self, data_inicio, data_fim):
+        return self.resumos.serie_diaria(data_inicio, data_fim)
+
+    @em_cache
+    def obter_apuracao_mensal(self, mes_inicio: Optional[str] = None, mes_fim: Optional[str] = None):
+        return self.apuracao.obter(mes_inicio, mes_fim)
\ No newline at end of file
@@ -0,0 +1,367 @@
+import logging
+from typing import Dict, Iterable, List, Optional, Tuple
+import numpy as np
+import pandas as pd
+from models.eventos import TIPO_FRACAO, inteiro_proximo
+from utils.dinheiro import arredondar_centavos, sql_reais
+
+logger = logging.getLogger(__name__)
+
+# Abaixo deste valor o produto acumulado dos fatores de venda perde precisão e o ativo é
+# recalculado pelo laço sequencial
+LIMITE_FATOR_ACUMULADO = 1e-150
+
+
+def separar_day_trade(df: pd.DataFrame) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """Agrupa as operações por (ativo, dia) e separa a parcela de day trade.
+
+    A quantidade de day trade do dia é o mínimo entre a quantidade comprada e a vendida,
+    avaliada pelos preços médios de compra e de venda do dia, qualquer que seja a ordem
+    das operações. O saldo restante (só compra ou só venda) segue como uma operação comum.
+    Os valores (em centavos) da parcela de day trade são arredondados e o saldo é o
+    complemento exato. Frações leiloadas (TIPO_FRACAO) não entram no day trade: seguem à
+    parte, antes das operações do dia do evento.
+
+    Retorna (day_trade, swing_trade): day_trade com ativo_id, mes, vendas e resultado;
+    swing_trade com ativo_id, mes, tipo, quantidade, valor, vendas e corretagem, na ordem
+    de execução de cada ativo.
+    """
+    fracoes = df[df['tipo'] == TIPO_FRACAO]
+    df = df[df['tipo'] != TIPO_FRACAO]
+    compra = (df['tipo'] == 'Compra').to_numpy()
+    quantidade = df['quantidade'].to_numpy(dtype=np.float64)
+    valor = df['valor'].to_numpy(dtype=np.int64)
+    corretagem = df['corretagem'].fillna(0).to_numpy(dtype=np.int64)
+
+    diario = pd.DataFrame({
+        'ativo_id': df['ativo_id'].to_numpy(),
+        'dia': pd.to_datetime(df['data'].astype(str).str[:10]).to_numpy(),
+        'qtd_compra': np.where(compra, quantidade, 0.0),
+        'custo_compra': np.where(compra, valor + corretagem, 0),
+        'qtd_venda': np.where(compra, 0.0, quantidade),
+        'liquido_venda': np.where(compra, 0, valor - corretagem),
+        'bruto_venda': np.where(compra, 0, valor),
+    }).groupby(['ativo_id', 'dia'], sort=True).sum().reset_index()
+
+    qtd_compra = diario['qtd_compra'].to_numpy()
+    qtd_venda = diario['qtd_venda'].to_numpy()
+    qtd_day_trade = np.minimum(qtd_compra, qtd_venda)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        fracao_compra = np.where(qtd_compra > 0, qtd_day_trade / qtd_compra, 0.0)
+        fracao_venda = np.where(qtd_venda > 0, qtd_day_trade / qtd_venda, 0.0)
+
+    custo_compra = diario['custo_compra'].to_numpy()
+    liquido_venda = diario['liquido_venda'].to_numpy()
+    bruto_venda = diario['bruto_venda'].to_numpy()
+    custo_day_trade = arredondar_centavos(custo_compra * fracao_compra)
+    liquido_day_trade = arredondar_centavos(liquido_venda * fracao_venda)
+    vendas_day_trade = arredondar_centavos(bruto_venda * fracao_venda)
+
+    mes = diario['dia'].dt.strftime('%Y-%m').to_numpy()
+    day_trade = pd.DataFrame({
+        'ativo_id': diario['ativo_id'].to_numpy(),
+        'mes': mes,
+        'vendas': vendas_day_trade,
+        'resultado': liquido_day_trade - custo_day_trade,
+    })[qtd_day_trade > 0]
+
+    sobra_compra = qtd_compra - qtd_day_trade
+    compra_swing = sobra_compra > 0
+    swing = pd.DataFrame({
+        'ativo_id': diario['ativo_id'].to_numpy(),
+        'dia': diario['dia'].to_numpy(),
+        'mes': mes,
+        'tipo': np.where(compra_swing, 'Compra', 'Venda'),
+        'quantidade': np.where(compra_swing, sobra_compra, qtd_venda - qtd_day_trade),
+        'valor': np.where(compra_swing, custo_compra - custo_day_trade, liquido_venda - liquido_day_trade),
+        'vendas': np.where(compra_swing, 0, bruto_venda - vendas_day_trade),
+        'corretagem': 0,
+    })
+    swing = swing[swing['quantidade'].to_numpy() > 0]
+    if not fracoes.empty:
+        dia = pd.to_datetime(fracoes['data'].astype(str).str[:10])
+        swing = pd.concat([pd.DataFrame({
+            'ativo_id': fracoes['ativo_id'].to_numpy(),
+            'dia': dia.to_numpy(),
+            'mes': dia.dt.strftime('%Y-%m').to_numpy(),
+            'tipo': TIPO_FRACAO,
+            'quantidade': fracoes['quantidade'].to_numpy(dtype=np.float64),
+            'valor': 0,
+            'vendas': 0,
+            'corretagem': 0,
+        }), swing], ignore_index=True).sort_values(['ativo_id', 'dia'], kind='stable')
+    return day_trade, swing.drop(columns='dia').reset_index(drop=True)
+
+
+def _caixa(compra, fracao, valor, corretagem) -> np.ndarray:
+    """Fluxo financeiro de cada operação: compra paga valor + corretagem; venda recebe valor - corretagem."""
+    return np.where(compra, -(valor + corretagem), np.where(fracao, 0.0, valor - corretagem))
+
+
+def calcular_custo_medio(df: pd.DataFrame) -> pd.DataFrame:
+    """Calcula, linha a linha, a posição e o custo médio de cada ativo de forma vetorizada.
+
+    `df` deve ter as colunas ativo_id, tipo, quantidade, valor e corretagem (em centavos),
+    já ordenado por ativo e pela ordem de execução das operações. Operações no sentido da
+    posição (ou com ela zerada) somam ao custo: compras o valor pago, vendas a descoberto o
+    valor recebido, como custo negativo. Operações no sentido contrário reduzem o custo
+    proporcionalmente, sem alterar o preço médio, e realizam a diferença entre o valor
+    recebido ou pago e o custo baixado; se invertem a posição, o excedente abre a nova
+    posição pelo seu próprio preço. Posição zerada tem custo zero. Frações leiloadas após
+    um ajuste (TIPO_FRACAO) baixam o custo como uma venda, sem realizar lucro.
+
+    Operações do mesmo dia devem ser compensadas antes (`separar_day_trade`); aqui a
+    ordem das linhas é a ordem de execução.
+
+    O custo segue a recorrência C[t] = a[t] * C[t-1] + b[t] (a = fração mantida na redução,
+    b = custo acrescentado), resolvida por ciclo de posição com produto e soma acumulados.
+    Como o rateio é fracionário, o custo é arredondado para centavos só na saída, e o
+    lucro de cada operação é o seu fluxo financeiro mais a variação do custo arredondado:
+    lucros e custo final somam exatamente o fluxo financeiro do ativo.
+
+    Retorna uma cópia de `df` com quantidade_acumulada, custo_acumulado e lucro (int64,
+    centavos; o custo é negativo em posições vendidas) e preco_medio (float, centavos por ação).
+    """
+    df = df.copy()
+    compra = (df['tipo'] == 'Compra').to_numpy()
+    fracao = (df['tipo'] == TIPO_FRACAO).to_numpy()
+    quantidade = df['quantidade'].to_numpy(dtype=np.float64)
+    # Valores inteiros (centavos); só o custo de posições iniciais retomadas pode ser fracionário
+    valor = df['valor'].to_numpy(dtype=np.float64)
+    corretagem = df['corretagem'].fillna(0).to_numpy(dtype=np.float64)
+    ativos = df['ativo_id'].to_numpy()
+
+    direcao = np.where(compra, 1.0, -1.0)
+    saldo = direcao * quantidade
+    # Quantidades ajustadas por eventos são fracionárias até a fração sair: o resíduo de
+    # ponto flutuante em torno de um inteiro abriria ou fecharia ciclos por engano
+    quantidade_acumulada = inteiro_proximo(pd.Series(saldo).groupby(ativos).cumsum().to_numpy())
+    quantidade_anterior = inteiro_proximo(quantidade_acumulada - saldo)
+    caixa = _caixa(compra, fracao, valor, corretagem)
+
+    aumenta = (quantidade_anterior == 0) | (np.sign(quantidade_anterior) == direcao)
+    inverte = ~aumenta & (np.sign(quantidade_acumulada) == direcao)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        fator = np.where(aumenta, 1.0, np.where(inverte, 0.0, quantidade_acumulada / quantidade_anterior))
+        acrescimo = np.where(aumenta, -caixa, np.where(inverte, -caixa * np.abs(quantidade_acumulada) / quantidade, 0.0))
+
+    # Um ciclo começa em cada ativo e sempre que a posição zera ou inverte (fator nulo)
+    novo_ativo = np.ones(len(ativos), dtype=bool)
+    novo_ativo[1:] = ativos[1:] != ativos[:-1]
+    inicio = novo_ativo | (fator == 0)
+    ciclo = np.cumsum(inicio)
+    fator_acumulado = pd.Series(np.where(inicio, 1.0, fator)).groupby(ciclo).cumprod().to_numpy()
+    with np.errstate(divide='ignore', over='ignore', invalid='ignore'):
+        custo_acumulado = fator_acumulado * pd.Series(acrescimo / fator_acumulado).groupby(ciclo).cumsum().to_numpy()
+
+    instaveis = np.unique(ativos[fator_acumulado < LIMITE_FATOR_ACUMULADO])
+    if len(instaveis):
+        mascara = np.isin(ativos, instaveis)
+        custo_acumulado[mascara] = _custo_sequencial(compra[mascara], quantidade[mascara], caixa[mascara],
+                                                     ativos[mascara])
+
+    custo_centavos = arredondar_centavos(custo_acumulado)
+    custo_anterior_centavos = pd.Series(custo_centavos).groupby(ativos).shift(1, fill_value=0).to_numpy()
+    with np.errstate(divide='ignore', invalid='ignore'):
+        preco_medio = np.where(quantidade_acumulada != 0, custo_acumulado / quantidade_acumulada, 0.0)
+    lucro = np.where(fracao, 0, arredondar_centavos(caixa) + custo_centavos - custo_anterior_centavos)
+
+    df['quantidade_acumulada'] = quantidade_acumulada
+    df['custo_acumulado'] = custo_centavos
+    df['preco_medio'] = preco_medio
+    df['lucro'] = lucro
+    return df
+
+
+def passo_custo(quantidade: float, custo: float, compra: bool, qtd: float, caixa: float) -> Tuple[float, float]:
+    """Um passo da recorrência de `calcular_custo_medio`: retorna (quantidade, custo exato) após a operação."""
+    direcao = 1 if compra else -1
+    restante = quantidade + direcao * qtd
+    if quantidade == 0 or (quantidade > 0) == compra:
+        return restante, custo - caixa
+    if restante != 0 and (restante > 0) == compra:
+        return restante, -caixa * abs(restante) / qtd
+    return restante, custo * restante / quantidade
+
+
+def _custo_sequencial(compra, quantidade, caixa, ativos) -> np.ndarray:
+    """Mesma recorrência de `calcular_custo_medio`, linha a linha."""
+    custo = np.zeros(len(compra))
+    ativo_atual, quantidade_atual, custo_atual = None, 0.0, 0.0
+    for i in range(len(compra)):
+        if ativos[i] != ativo_atual:
+            ativo_atual, quantidade_atual, custo_atual = ativos[i], 0.0, 0.0
+        quantidade_atual, custo_atual = passo_custo(quantidade_atual, custo_atual, compra[i], quantidade[i], caixa[i])
+        custo[i] = custo_atual
+    return custo
+
+
+class Posicoes:
+    """Posição atual por ativo (quantidade, preço médio e lucro realizado) na tabela `posicoes`.
+
+    A tabela é atualizada a cada operação registrada, dentro da mesma transação; operações
+    com data anterior ou igual à última já aplicada ao ativo disparam a reconstrução só
+    daquele ativo. `reconstruir` recalcula tudo a partir de `operacoes` de forma vetorizada.
+    Compras e vendas do mesmo dia são compensadas como na apuração (`separar_day_trade`),
+    em qualquer ordem; o lucro realizado soma o day trade e as operações comuns.
+
+    Com `eventos`, as quantidades ficam na base de ações atual: operações anteriores a um
+    desdobramento ou grupamento são ajustadas, e registrar uma delas depois do evento reconstrói o ativo.
+    """
+
+    def __init__(self, database, eventos=None):
+        self.db = database
+        self.eventos = eventos
+        resultado = self.db.execute_query('''
+            SELECT EXISTS (SELECT 1 FROM operacoes) AND NOT EXISTS (SELECT 1 FROM posicoes)
+        ''')
+        if resultado and resultado[0][0]:
+            logger.info("Tabela de posições vazia: reconstruindo a partir das operações")
+            self.reconstruir()
+
+    def aplicar(self, conn, operacoes: List[tuple]) -> None:
+        """Aplica operações recém-inseridas às posições, na transação aberta em `conn`.
+
+        Cada operação é uma tupla (ativo_id, tipo, quantidade, data, valor, corretagem).
+        """
+        por_ativo: Dict[int, List[tuple]] = {}
+        for operacao in sorted(operacoes, key=lambda op: (op[0], op[3])):
+            por_ativo.setdefault(operacao[0], []).append(operacao)
+
+        atuais = {}
+        ids = list(por_ativo)
+        for inicio in range(0, len(ids), 900):
+            lote = ids[inicio:inicio + 900]
+            atuais.update((linha[0], tuple(linha)) for linha in conn.execute(f'''
+                SELECT ativo_id, quantidade, custo_total, preco_medio, lucro_realizado, data_ultima_operacao
+                FROM posicoes WHERE ativo_id IN ({', '.join('?' * len(lote))})
+            ''', lote))
+
+        ultimos_ajustes = self.eventos.ultimos_ajustes(conn, ids) if self.eventos else {}
+        fora_de_ordem = []
+        novas_posicoes = []
+        for ativo_id, lista in por_ativo.items():
+            _, quantidade, custo, preco_medio, lucro, data_ultima = atuais.get(ativo_id, (ativo_id, 0, 0, 0.0, 0, None))
+            # Operações de um dia já aplicado também reconstroem: o dia é compensado por inteiro
+            if ((data_ultima is not None and lista[0][3][:10] <= data_ultima[:10])
+                    or lista[0][3][:10] < ultimos_ajustes.get(ativo_id, '')):
+                fora_de_ordem.append(ativo_id)
+                continue
+
+            # Compras e vendas do dia: [qtd_compra, custo_compra, qtd_venda, liquido_venda]
+            dias: Dict[str, list] = {}
+            for _, tipo, qtd, data, valor, corretagem in lista:
+                dia = dias.setdefault(data[:10], [0, 0, 0, 0])
+                if tipo == 'Compra':
+                    dia[0] += qtd
+                    dia[1] += valor + (corretagem or 0)
+                else:
+                    dia[2] += qtd
+                    dia[3] += valor - (corretagem or 0)
+
+            # O preço médio gravado (float) é o estado exato do custo; o custo em centavos é o arredondado
+            custo_exato = preco_medio * quantidade
+            for qtd_compra, custo_compra, qtd_venda, liquido_venda in dias.values():
+                # Mesmos arredondamentos de `separar_day_trade`
+                qtd_day_trade = min(qtd_compra, qtd_venda)
+                custo_day_trade = int(arredondar_centavos(custo_compra * (qtd_day_trade / qtd_compra))) if qtd_compra else 0
+                liquido_day_trade = int(arredondar_centavos(liquido_venda * (qtd_day_trade / qtd_venda))) if qtd_venda else 0
+                lucro += liquido_day_trade - custo_day_trade
+                if qtd_compra > qtd_day_trade:
+                    compra, qtd, caixa = True, qtd_compra - qtd_day_trade, custo_day_trade - custo_compra
+                elif qtd_venda > qtd_day_trade:
+                    compra, qtd, caixa = False, qtd_venda - qtd_day_trade, liquido_venda - liquido_day_trade
+                else:
+                    continue
+                quantidade, custo_exato = passo_custo(quantidade, custo_exato, compra, qtd, caixa)
+                custo_novo = int(arredondar_centavos(custo_exato))
+                lucro += caixa + custo_novo - custo
+                custo = custo_novo
+            preco_medio = custo_exato / quantidade if quantidade else 0.0
+            novas_posicoes.append(self._linha_posicao(ativo_id, quantidade, custo, preco_medio, lucro, lista[-1][3]))
+
+        self._gravar(conn, novas_posicoes)
+        if fora_de_ordem:
+            logger.info(f"Operações fora de ordem: reconstruindo {len(fora_de_ordem)} ativo(s)")
+            self._reconstruir(conn, fora_de_ordem)
+
+    def reconstruir(self, ativo_ids: Optional[Iterable[int]] = None) -> None:
+        """Recalcula as posições (de todos os ativos ou dos informados) a partir das operações."""
+        with self.db.transaction() as conn:
+            self._reconstruir(conn, None if ativo_ids is None else list(ativo_ids))
+
+    def _reconstruir(self, conn, ativo_ids: Optional[List[int]]) -> None:
+        query = '''
+            SELECT ativo_id, tipo, quantidade, valor, corretagem, data
+            FROM operacoes
+        '''
+        params = ()
+        if ativo_ids is not None:
+            query += f" WHERE ativo_id IN ({', '.join('?' * len(ativo_ids))})"
+            params = tuple(ativo_ids)
+        query += ' ORDER BY ativo_id, data, id'
+        df = pd.read_sql_query(query, conn, params=params)
+        if self.eventos:
+            df = self.eventos.ajustar(conn, df, ativo_ids)
+
+        if ativo_ids is None:
+            conn.execute('DELETE FROM posicoes')
+        else:
+            conn.executemany('DELETE FROM posicoes WHERE ativo_id = ?', [(ativo_id,) for ativo_id in ativo_ids])
+        if df.empty:
+            return
+
+        day_trade, swing = separar_day_trade(df)
+        swing = calcular_custo_medio(swing)
+        datas = df[df['tipo'] != TIPO_FRACAO].groupby('ativo_id')['data'].max()
+        # Ativos só com day trade não têm linhas de swing trade: posição zerada
+        resumo = swing.groupby('ativo_id').agg(
+            quantidade=('quantidade_acumulada', 'last'),
+            custo=('custo_acumulado', 'last'),
+            preco_medio=('preco_medio', 'last'),
+            lucro=('lucro', 'sum'),
+        ).reindex(datas.index, fill_value=0)
+        resumo['lucro'] += day_trade.groupby('ativo_id')['resultado'].sum().reindex(datas.index, fill_value=0)
+        resumo['data'] = datas
+        self._gravar(conn, [
+            self._linha_posicao(ativo_id, linha.quantidade, linha.custo, linha.preco_medio, linha.lucro, linha.data)
+            for ativo_id, linha in zip(resumo.index.tolist(), resumo.itertuples(index=False))
+        ])
+
+    @staticmethod
+    def _linha_posicao(ativo_id, quantidade, custo, preco_medio, lucro, data):
+        # Quantidades ajustadas por eventos podem ter resíduos de ponto flutuante; as frações já saíram
+        quantidade = int(np.floor(inteiro_proximo(quantidade)))
+        return (int(ativo_id), quantidade, int(custo), float(preco_medio) if quantidade != 0 else 0.0, int(lucro), data)
+
+    @staticmethod
+    def _gravar(conn, linhas) -> None:
+        conn.executemany('''
+            INSERT INTO posicoes
+            (ativo_id, quantidade, custo_total, preco_medio, lucro_realizado, data_ultima_operacao)
+            VALUES (?, ?, ?, ?, ?, ?)
+            ON CONFLICT (ativo_id) DO UPDATE SET
+                quantidade = excluded.quantidade,
+                custo_total = excluded.custo_total,
+                preco_medio = excluded.preco_medio,
+                lucro_realizado = excluded.lucro_realizado,
+                data_ultima_operacao = excluded.data_ultima_operacao
+        ''', linhas)
+
+    def obter_posicoes(self, apenas_abertas: bool = True) -> pd.DataFrame:
+        """Retorna as posições com o código de cada ativo, com valores em reais."""
+        query = f'''
+            SELECT a.codigo, p.quantidade, {sql_reais('p.preco_medio', 'preco_medio')},
+                   {sql_reais('p.custo_total', 'custo_total')}, {sql_reais('p.lucro_realizado', 'lucro_realizado')},
+                   p.data_ultima_operacao
+            FROM posicoes p
+            JOIN ativos a ON a.id = p.ativo_id
+        '''
+        if apenas_abertas:
+            query += ' WHERE p.quantidade <> 0'
+        return self.db.query_dataframe(query + ' ORDER BY a.codigo')
+
+    def calcular_lucro_realizado(self) -> float:
+        """Lucro realizado de todos os ativos, em reais (somado em centavos no SQLite)."""
+        resultado = self.db.execute_query(f"SELECT {sql_reais('SUM(lucro_realizado)', 'lucro')} FROM posicoes")
+        return (resultado[0]['lucro'] or 0) if resultado else 0
@@ -0,0 +1,231 @@
+import logging
+import os
+from datetime import date, timedelta
+from typing import Dict, Iterable, List, Optional
+import numpy as np
+import pandas as pd
+from config.config import ARQUIVO_PRECOS, PROVEDOR_PRECOS, TAMANHO_LOTE_PRECOS
+from utils.dinheiro import CENTAVOS_POR_REAL, arredondar_centavos, para_reais, sql_reais
+
+logger = logging.getLogger(__name__)
+
+COLUNAS_FECHAMENTOS = ['codigo', 'data', 'fechamento']
+
+
+class ProvedorPrecos:
+    """Fonte de preços de fechamento diários.
+
+    `obter_fechamentos` recebe vários ativos de uma vez e retorna um DataFrame com
+    COLUNAS_FECHAMENTOS (data como texto ISO, fechamento em reais), uma linha por ativo e
+    dia de pregão.
+    """
+
+    def obter_fechamentos(self, codigos: List[str], inicio: date, fim: date) -> pd.DataFrame:
+        raise NotImplementedError
+
+
+class ProvedorArquivo(ProvedorPrecos):
+    """Lê os fechamentos de um arquivo local (CSV ou Parquet) com as colunas codigo, data e fechamento.
+
+    Permite usar o sistema sem acesso à rede; o arquivo é relido apenas quando muda.
+    """
+
+    def __init__(self, caminho: str = ARQUIVO_PRECOS):
+        self.caminho = caminho
+        self._dados = None
+        self._modificacao = None
+
+    def _carregar(self) -> pd.DataFrame:
+        modificacao = os.stat(self.caminho).st_mtime_ns
+        if self._dados is None or modificacao != self._modificacao:
+            if self.caminho.endswith('.parquet'):
+                dados = pd.read_parquet(self.caminho, columns=COLUNAS_FECHAMENTOS)
+            else:
+                dados = pd.read_csv(self.caminho, usecols=COLUNAS_FECHAMENTOS, dtype={'codigo': str})
+            dados['data'] = pd.to_datetime(dados['data']).dt.strftime('%Y-%m-%d')
+            self._dados, self._modificacao = dados, modificacao
+        return self._dados
+
+    def obter_fechamentos(self, codigos: List[str], inicio: date, fim: date) -> pd.DataFrame:
+        if not os.path.exists(self.caminho):
+            logger.warning(f"Arquivo de preços {self.caminho} não encontrado")
+            return pd.DataFrame(columns=COLUNAS_FECHAMENTOS)
+        dados = self._carregar()
+        filtro = dados['codigo'].isin(codigos) & dados['data'].between(str(inicio), str(fim))
+        return dados.loc[filtro, COLUNAS_FECHAMENTOS].reset_index(drop=True)
+
+
+class ProvedorYFinance(ProvedorPrecos):
+    """Fechamentos do Yahoo Finance, com vários ativos por requisição (códigos da B3 com sufixo .SA)."""
+
+    def __init__(self, sufixo: str = '.SA'):
+        self.sufixo = sufixo
+
+    def obter_fechamentos(self, codigos: List[str], inicio: date, fim: date) -> pd.DataFrame:
+        # Importado sob demanda: só é necessário quando escolhido como provedor
+        import yfinance as yf
+
+        simbolos = {f'{codigo}{self.sufixo}': codigo for codigo in codigos}
+        dados = yf.download(list(simbolos), start=str(inicio), end=str(fim + timedelta(days=1)),
+                            auto_adjust=False, progress=False, threads=True)
+        if dados.empty:
+            return pd.DataFrame(columns=COLUNAS_FECHAMENTOS)
+        fechamentos = dados['Close']
+        if isinstance(fechamentos, pd.Series):
+            fechamentos = fechamentos.to_frame(next(iter(simbolos)))
+        fechamentos = fechamentos.rename(columns=simbolos).rename_axis(index='data', columns='codigo')
+        resultado = fechamentos.stack().rename('fechamento').reset_index()
+        resultado['data'] = pd.to_datetime(resultado['data']).dt.strftime('%Y-%m-%d')
+        return resultado[COLUNAS_FECHAMENTOS]
+
+
+PROVEDORES = {
+    'arquivo': ProvedorArquivo,
+    'yfinance': ProvedorYFinance,
+}
+
+
+def criar_provedor(nome: str = PROVEDOR_PRECOS) -> ProvedorPrecos:
+    if nome not in PROVEDORES:
+        raise ValueError(f"Provedor de preços {nome} não suportado. Opções: {', '.join(PROVEDORES)}")
+    return PROVEDORES[nome]()
+
+
+def avaliar_posicoes(posicoes: pd.DataFrame) -> pd.DataFrame:
+    """Acrescenta valor de mercado e resultado não realizado às posições (colunas quantidade, custo_total, ultimo_preco).
+
+    Os valores saem na mesma unidade de `custo_total` e `ultimo_preco`.
+    Posições sem preço conhecido ficam com NaN nas colunas calculadas. Em posições vendidas,
+    quantidade, valor de mercado e custo (o valor recebido) são negativos.
+    """
+    avaliacao = posicoes.copy()
+    avaliacao['valor_mercado'] = avaliacao['quantidade'] * avaliacao['ultimo_preco']
+    avaliacao['resultado_nao_realizado'] = avaliacao['valor_mercado'] - avaliacao['custo_total']
+    custo = avaliacao['custo_total'].abs()
+    avaliacao['variacao'] = avaliacao['resultado_nao_realizado'] / custo.where(custo != 0)
+    return avaliacao
+
+
+class Precos:
+    """Histórico local de fechamentos (`precos`) e último preço de cada ativo (`ativos.ultimo_preco`).
+
+    `atualizar` busca no provedor apenas os dias que faltam desde o último fechamento
+    gravado de cada ativo, agrupando os ativos com a mesma data inicial em requisições
+    de até `tamanho_lote` ativos. A avaliação da carteira lê apenas o banco: nenhuma
+    consulta ao provedor é feita ao exibir os dados.
+    """
+
+    def __init__(self, database, provedor: Optional[ProvedorPrecos] = None,
+                 tamanho_lote: int = TAMANHO_LOTE_PRECOS):
+        self.db = database
+        self.provedor = provedor
+        self.tamanho_lote = tamanho_lote
+
+    def _pendencias(self, conn, codigos: Optional[Iterable[str]], ate: date) -> Dict[date, List]:
+        """Agrupa por data inicial os ativos cujo histórico não chega até `ate`."""
+        query = '''
+            SELECT a.id, a.codigo,
+                   (SELECT MAX(data) FROM precos WHERE ativo_id = a.id) AS ultimo_fechamento,
+                   (SELECT MIN(data) FROM operacoes WHERE ativo_id = a.id) AS primeira_operacao
+            FROM ativos a
+        '''
+        if codigos is None:
+            # Por padrão, só o que está em carteira
+            linhas = conn.execute(query + ' JOIN posicoes p ON p.ativo_id = a.id WHERE p.quantidade <> 0').fetchall()
+        else:
+            codigos = list(codigos)
+            linhas = conn.execute(query + f" WHERE a.codigo IN ({', '.join('?' * len(codigos))})", codigos).fetchall()
+
+        grupos = {}
+        sem_historico = []
+        for ativo_id, codigo, ultimo_fechamento, primeira_operacao in linhas:
+            if ultimo_fechamento:
+                inicio = date.fromisoformat(ultimo_fechamento) + timedelta(days=1)
+                if inicio <= ate:
+                    grupos.setdefault(inicio, []).append((ativo_id, codigo))
+            elif primeira_operacao:
+                sem_historico.append((date.fromisoformat(primeira_operacao[:10]), ativo_id, codigo))
+
+        if sem_historico:
+            # Ativos sem histórico vão juntos desde a primeira operação entre eles; o que vier
+            # antes da primeira operação de cada um também é gravado
+            inicio = min(primeira for primeira, _, _ in sem_historico)
+            if inicio <= ate:
+                grupos.setdefault(inicio, []).extend((ativo_id, codigo) for _, ativo_id, codigo in sem_historico)
+        return grupos
+
+    def atualizar(self, codigos: Optional[Iterable[str]] = None, ate: Optional[date] = None,
+                  progresso=None) -> int:
+        """Busca os fechamentos que faltam (dos ativos em carteira ou de `codigos`) e retorna quantos foram gravados.
+
+        `progresso(fração, mensagem)` é chamado após cada requisição ao provedor.
+        """
+        ate = ate or date.today()
+        if self.provedor is None:
+            self.provedor = criar_provedor()
+        with self.db.leitura() as conn:
+            grupos = self._pendencias(conn, codigos, ate)
+
+        lotes = [
+            (inicio, ativos[indice:indice + self.tamanho_lote])
+            for inicio, ativos in sorted(grupos.items())
+            for indice in range(0, len(ativos), self.tamanho_lote)
+        ]
+        gravados = 0
+        for numero, (inicio, lote) in enumerate(lotes, start=1):
+            ids = {codigo: ativo_id for ativo_id, codigo in lote}
+            fechamentos = self.provedor.obter_fechamentos(list(ids), inicio, ate)
+            fechamentos = fechamentos[fechamentos['codigo'].isin(ids.keys()) & fechamentos['fechamento'].notna()]
+            if not fechamentos.empty:
+                # Os provedores entregam reais; o banco guarda centavos
+                fechamentos = fechamentos.assign(fechamento=arredondar_centavos(
+                    fechamentos['fechamento'].to_numpy(dtype=np.float64) * CENTAVOS_POR_REAL
+                ))
+                self._gravar(ids, fechamentos)
+                gravados += len(fechamentos)
+            if progresso:
+                progresso(numero / len(lotes), f"Cotações: {numero} de {len(lotes)} requisições")
+
+        logger.info(f"{gravados} fechamentos gravados em {len(lotes)} requisições")
+        return gravados
+
+    def _gravar(self, ids: Dict[str, int], fechamentos: pd.DataFrame) -> None:
+        ativo_ids = fechamentos['codigo'].map(ids)
+        ultimos = fechamentos.assign(ativo_id=ativo_ids).sort_values('data').groupby('ativo_id').last()
+        with self.db.transaction() as conn:
+            conn.executemany(
+                'INSERT OR REPLACE INTO precos (ativo_id, data, fechamento) VALUES (?, ?, ?)',
+                zip(ativo_ids.tolist(), fechamentos['data'].tolist(), fechamentos['fechamento'].tolist())
+            )
+            conn.executemany('''
+                UPDATE ativos SET ultimo_preco = ?, data_ultimo_preco = ?
+                WHERE id = ? AND (data_ultimo_preco IS NULL OR data_ultimo_preco <= ?)
+            ''', [
+                (int(linha.fechamento), linha.data, int(ativo_id), linha.data)
+                for ativo_id, linha in ultimos.iterrows()
+            ])
+
+    def historico(self, codigos: List[str], data_inicio, data_fim) -> pd.DataFrame:
+        """Fechamentos gravados no período, uma coluna por ativo."""
+        historico = self.db.query_dataframe(f'''
+            SELECT a.codigo, p.data, {sql_reais('p.fechamento', 'fechamento')}
+            FROM precos p
+            JOIN ativos a ON a.id = p.ativo_id
+            WHERE a.codigo IN ({', '.join('?' * len(codigos))}) AND p.data BETWEEN ? AND ?
+        ''', params=[*codigos, str(data_inicio), str(data_fim)], parse_dates=['data'])
+        return historico.pivot(index='data', columns='codigo', values='fechamento')
+
+    def avaliar_carteira(self) -> pd.DataFrame:
+        """Posições abertas com o último preço gravado, valor de mercado e resultado não realizado."""
+        posicoes = self.db.query_dataframe('''
+            SELECT a.codigo, p.quantidade, p.preco_medio, p.custo_total, a.ultimo_preco, a.data_ultimo_preco
+            FROM posicoes p
+            JOIN ativos a ON a.id = p.ativo_id
+            WHERE p.quantidade <> 0
+            ORDER BY a.codigo
+        ''')
+        avaliacao = avaliar_posicoes(posicoes)
+        # Calculada em centavos; convertida para reais só na saída
+        monetarias = ['preco_medio', 'custo_total', 'ultimo_preco', 'valor_mercado', 'resultado_nao_realizado']
+        avaliacao[monetarias] = para_reais(avaliacao[monetarias].astype(np.float64))
+        return avaliacao
@@ -1,230 +1,255 @@
-import re
-from typing import Dict
-from datetime import datetime
+from typing import Callable, Dict, Iterator, List, Optional
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import closing
+from itertools import chain
+import multiprocessing
+import os
 import logging
-import PyPDF2
-from io import BytesIO
+from config.config import BACKEND_PDF, WORKERS_PROCESSAMENTO
+from models.extracao_pdf import calcular_hash, contar_paginas, iterar_paginas
+from models.layouts_corretoras import LAYOUTS
+from utils.cache_notas import CacheNotas
+from utils.metricas import cronometrado, executar_com_metricas, iniciar_processo_metricas, metricas, resultado_com_metricas
 
 logger = logging.getLogger(__name__)
 
-class ProcessadorNotas:
-    def __init__(self, database):
-        self.db = database
+# O pool é criado a partir das threads da fila de tarefas, em um processo com conexões e
+# locks do SQLite; um fork nessas condições pode herdar um lock preso. Os processos do
+# pool partem de um servidor limpo (forkserver) ou de um interpretador novo (spawn).
+CONTEXTO_PROCESSOS = multiprocessing.get_context(
+    'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+)
 
-    def processar_nota(self, arquivo_pdf, corretora: str) -> Dict:
-        """Processa uma nota de corretagem detectando a corretora e extraindo os dados."""
-        # Detectar a corretora e chamar o método de processamento correspondente
-        processadores = {
-            'CLEAR': self._processar_clear,
-            'XP': self._processar_xp,
-            'RICO': self._processar_rico,
-            'AGORA': self._processar_agora,
-            # Adicione outras corretoras aqui
-        }
-
-        if corretora not in processadores:
-            raise ValueError(f"Corretora {corretora} não suportada.")
 
-        # Abrir o arquivo PDF usando PyPDF2
-        try:
-            pdf_reader = PyPDF2.PdfReader(BytesIO(arquivo_pdf.read()))
-            texto_completo = ""
-            for page in pdf_reader.pages:
-                texto_completo += page.extract_text()
-            logger.debug(f"Texto completo extraído do PDF: {texto_completo}")
-            return processadores[corretora](texto_completo)
-        except Exception as e:
-            raise ValueError(f"Erro ao abrir o arquivo PDF: {e}")
+# Pontos de entrada dos processos do pool: não recebem conexão com o banco
+def _extrair_notas_em_processo(origem, corretora: str, backend: str) -> List[Dict]:
+    return ProcessadorNotas(None, backend=backend).extrair_notas(origem, corretora)
 
-    def salvar_operacoes(self, dados_nota: Dict) -> bool:
-        """Salva as operações extraídas no banco de dados."""
-        try:
-            for operacao in dados_nota['operacoes']:
-                query = '''
-                    INSERT INTO operacoes (corretora, tipo, ativo, quantidade, preco, data, numero_nota)
-                    VALUES (?, ?, ?, ?, ?, ?, ?)
-                '''
-                self.db.execute_query(query, (
-                    dados_nota['corretora'],
-                    operacao['tipo'],
-                    operacao['ativo'],
-                    operacao['quantidade'],
-                    operacao['preco'],
-                    dados_nota['data_pregao'],
-                    dados_nota.get('numero_nota', None)  # Use None if 'numero_nota' is not present
-                ))
-            return True
-        except Exception as e:
-            logger.error(f"Erro ao salvar operações: {e}")
-            return False
-
-    def _processar_clear(self, texto_completo) -> Dict:
-        # Implementação específica para notas da Clear
-        # ...
-        pass
-
-    def _processar_xp(self, texto_completo) -> Dict:
-        dados_nota = {
-            'corretora': 'XP',
-            'operacoes': [],
-            'taxas': {},
-            'data_pregao': None,
-            'numero_nota': None
-        }
-
-        # Extrair data do pregão
-        padrao_data = r'Data pregão:\s*(\d{2}/\d{2}/\d{4})'
-        if match := re.search(padrao_data, texto_completo):
-            dados_nota['data_pregao'] = datetime.strptime(match.group(1), '%d/%m/%Y')
-
-        # Tentar extrair o número da nota
-        padrao_nota = r'Nr\. nota:\s*(\d+)'
-        if match := re.search(padrao_nota, texto_completo):
-            dados_nota['numero_nota'] = match.group(1)
-
-        # Extrair operações
-        padrao_operacao = r'([A-Z0-9]+)\s+([CV])\s+(\d+)\s+([\d.,]+)'
-        for match in re.finditer(padrao_operacao, texto_completo):
-            ativo, tipo, quantidade, preco = match.groups()
-            operacao = {
-                'tipo': 'Compra' if tipo == 'C' else 'Venda',
-                'ativo': ativo,
-                'quantidade': int(quantidade),
-                'preco': float(preco.replace('.', '').replace(',', '.'))
-            }
-            dados_nota['operacoes'].append(operacao)
 
-        if not dados_nota['operacoes']:
-            logger.debug("Nenhuma operação encontrada.")
+def _extrair_paginas_em_processo(origem, backend: str, inicio: int, fim: int) -> List[str]:
+    return list(iterar_paginas(origem, backend, inicio, fim))
 
-        # Extrair taxas
-        dados_nota['taxas'] = self._extrair_taxas(texto_completo)
 
-        logger.debug(f"Número da nota extraído: {dados_nota['numero_nota']}")
-        logger.debug(f"Data do pregão extraída: {dados_nota['data_pregao']}")
-        logger.debug(f"Operações extraídas: {dados_nota['operacoes']}")
-        logger.debug(f"Taxas extraídas: {dados_nota['taxas']}")
+def _extrair_segmento_em_processo(corretora: str, paginas: List[str]) -> Dict:
+    return LAYOUTS[corretora].extrair_paginas(paginas)
 
-        return dados_nota
 
-    def _processar_rico(self, texto_completo) -> Dict:
-        dados_nota = {
-            'corretora': 'RICO',
-            'operacoes': [],
-            'taxas': {},
-            'data_pregao': None,
-            'numero_nota': None
-        }
-
-        # Extrair data do pregão
-        padrao_data = r'Data pregão:\s*(\d{2}/\d{2}/\d{4})'
-        if match := re.search(padrao_data, texto_completo):
-            dados_nota['data_pregao'] = datetime.strptime(match.group(1), '%d/%m/%Y')
-        else:
-            logger.debug("Data do pregão não encontrada.")
-
-        # Tentar extrair o número da nota
-        padrao_nota = r'Nr\. nota:\s*(\d+)'
-        if match := re.search(padrao_nota, texto_completo):
-            dados_nota['numero_nota'] = match.group(1)
-        else:
-            logger.debug("Número da nota não encontrado.")
-
-        # Extrair operações
-        padrao_operacao = r'(\d+)\s+(\d+)\s+([CV])\s+(VISTA|FRACIONARIO)\s+(\w+)\s+(\d+)\s+([\d.,]+)\s+([\d.,]+)'
-        for match in re.finditer(padrao_operacao, texto_completo):
-            _, _, tipo, mercado, ativo, quantidade, preco, valor = match.groups()
-            operacao = {
-                'tipo': 'Compra' if tipo == 'C' else 'Venda',
-                'ativo': ativo,
-                'quantidade': int(quantidade),
-                'preco': float(preco.replace('.', '').replace(',', '.')),
-                'valor': float(valor.replace('.', '').replace(',', '.')),
-                'mercado': mercado
-            }
-            dados_nota['operacoes'].append(operacao)
+def _criar_pool(workers: int) -> ProcessPoolExecutor:
+    # Processos novos não herdam o estado das métricas: o flag segue pelo initializer
+    return ProcessPoolExecutor(max_workers=workers, mp_context=CONTEXTO_PROCESSOS,
+                               initializer=iniciar_processo_metricas, initargs=(metricas.ativo,))
 
-        if not dados_nota['operacoes']:
-            logger.debug("Nenhuma operação encontrada.")
 
-        # Extrair taxas
-        dados_nota['taxas'] = self._extrair_taxas(texto_completo)
+class ProcessadorNotas:
+    # Incrementar quando a extração mudar, para invalidar as notas em cache
+    VERSAO_PARSER = 5
 
-        logger.debug(f"Número da nota extraído: {dados_nota['numero_nota']}")
-        logger.debug(f"Data do pregão extraída: {dados_nota['data_pregao']}")
-        logger.debug(f"Operações extraídas: {dados_nota['operacoes']}")
-        logger.debug(f"Taxas extraídas: {dados_nota['taxas']}")
+    def __init__(self, database, cache: Optional[CacheNotas] = None, backend: str = BACKEND_PDF):
+        self.db = database
+        self.cache = cache
+        self.backend = backend
+
+    @cronometrado('processador.processar_nota')
+    def processar_nota(self, arquivo_pdf, corretora: str) -> Dict:
+        """Processa uma nota de corretagem (caminho, bytes ou arquivo aberto) extraindo os dados.
+
+        Apenas a primeira nota do PDF é lida; para arquivos com várias notas use
+        `processar_arquivo`.
+        """
+        chave = CacheNotas.gerar_chave(calcular_hash(arquivo_pdf), corretora, f"{self.VERSAO_PARSER}-nota")
+        if self.cache and (dados_nota := self.cache.obter(chave)) is not None:
+            return dados_nota
+
+        dados_nota = self.processar_conteudo(arquivo_pdf, corretora)
+        if self.cache:
+            self.cache.salvar(chave, dados_nota)
+        return dados_nota
+
+    @cronometrado('processador.processar_arquivo')
+    def processar_arquivo(self, arquivo_pdf, corretora: str, workers: int = 1) -> List[Dict]:
+        """Processa um PDF com uma ou mais notas, retornando um `dados_nota` por nota encontrada."""
+        chave = CacheNotas.gerar_chave(calcular_hash(arquivo_pdf), corretora, self.VERSAO_PARSER)
+        if self.cache and (notas := self.cache.obter(chave)) is not None:
+            return notas
+
+        notas = self.extrair_notas(arquivo_pdf, corretora, workers)
+        if self.cache:
+            self.cache.salvar(chave, notas)
+        return notas
+
+    @cronometrado('processador.processar_lote')
+    def processar_lote(self, arquivos: List, corretora: str, workers: Optional[int] = None,
+                       callback: Optional[Callable[[int, int], None]] = None) -> List[Dict]:
+        """Processa vários PDFs em um pool de processos, devolvendo os resultados na ordem dos arquivos.
+
+        Cada resultado é um dicionário com 'arquivo', 'notas' (um `dados_nota` por nota do
+        PDF) e 'erro'; a falha de um arquivo não interrompe o lote. Arquivos já presentes no
+        cache não são reprocessados. Nenhuma escrita no banco é feita aqui: quem chama
+        registra as operações, mantendo um único escritor.
+        """
+        resultados = []
+        with closing(self.processar_em_fluxo(arquivos, corretora, workers)) as fluxo:
+            for resultado in fluxo:
+                resultados.append(resultado)
+                if callback:
+                    callback(len(resultados), len(arquivos))
+        return resultados
+
+    def processar_em_fluxo(self, arquivos: List, corretora: str, workers: Optional[int] = None) -> Iterator[Dict]:
+        """Como `processar_lote`, mas entrega cada resultado assim que ele e os anteriores ficam prontos.
+
+        Um único pool atende todos os arquivos, com até 2 * `workers` deles em
+        processamento por vez. O pool é encerrado ao fim da iteração ou quando o gerador é
+        fechado (`contextlib.closing`), e os arquivos que ainda não começaram são cancelados.
+        """
+        workers = workers or WORKERS_PROCESSAMENTO
+
+        def preparar(indice, arquivo):
+            """Resultado inicial do arquivo e a chave do cache (None se já resolvido)."""
+            resultado = {'arquivo': self._nome_arquivo(arquivo, indice), 'notas': None, 'erro': None}
+            try:
+                chave = CacheNotas.gerar_chave(calcular_hash(arquivo), corretora, self.VERSAO_PARSER)
+            except Exception as e:
+                logger.error(f"Erro ao ler {resultado['arquivo']}: {e}")
+                resultado['erro'] = str(e)
+                return resultado, None
+            if self.cache and (notas := self.cache.obter(chave)) is not None:
+                resultado['notas'] = notas
+                metricas.contar('processador.notas_em_cache')
+                return resultado, None
+            return resultado, chave
+
+        def concluir(resultado, chave, obter_notas):
+            try:
+                notas = obter_notas()
+            except Exception as e:
+                logger.error(f"Erro ao processar {resultado['arquivo']}: {e}")
+                resultado['erro'] = str(e)
+                return
+            resultado['notas'] = notas
+            if self.cache:
+                self.cache.salvar(chave, notas)
+
+        if workers <= 1 or len(arquivos) <= 1:
+            # Com um único arquivo, o paralelismo passa a ser entre as suas páginas
+            for indice, arquivo in enumerate(arquivos):
+                resultado, chave = preparar(indice, arquivo)
+                if chave is not None:
+                    concluir(resultado, chave, lambda: self.extrair_notas(arquivo, corretora, workers))
+                yield resultado
+            return
+
+        executor = None
+        em_andamento = deque()
+        restantes = iter(enumerate(arquivos))
+        try:
+            while True:
+                while len(em_andamento) < 2 * workers and (proximo := next(restantes, None)) is not None:
+                    indice, arquivo = proximo
+                    resultado, chave = preparar(indice, arquivo)
+                    futuro = None
+                    if chave is not None:
+                        executor = executor or _criar_pool(min(workers, len(arquivos)))
+                        # Caminhos seguem como estão (cada processo mapeia o arquivo); uploads seguem como bytes
+                        futuro = executor.submit(
+                            executar_com_metricas,
+                            _extrair_notas_em_processo, self._origem_serializavel(arquivo), corretora, self.backend
+                        )
+                    em_andamento.append((resultado, chave, futuro))
+                if not em_andamento:
+                    return
+                resultado, chave, futuro = em_andamento.popleft()
+                if futuro is not None:
+                    concluir(resultado, chave, lambda: resultado_com_metricas(futuro.result()))
+                yield resultado
+        finally:
+            if executor is not None:
+                executor.shutdown(wait=True, cancel_futures=True)
+
+    def processar_conteudo(self, origem, corretora: str) -> Dict:
+        """Processa a primeira nota do PDF lendo-o página a página."""
+        layout = self._obter_layout(corretora)
+        try:
+            with closing(iterar_paginas(origem, self.backend)) as paginas:
+                dados_nota = layout.extrair_paginas(paginas)
+        except Exception as e:
+            raise ValueError(f"Erro ao abrir o arquivo PDF: {e}")
 
+        self._registrar_log(dados_nota)
         return dados_nota
 
-    def _processar_agora(self, texto_completo) -> Dict:
-        dados_nota = {
-            'corretora': 'AGORA',
-            'operacoes': [],
-            'taxas': {},
-            'data_pregao': None,
-            'numero_nota': None
-        }
-
-        # Extrair data do pregão
-        padrao_data = r'Data pregão:\s*(\d{2}/\d{2}/\d{4})'
-        if match := re.search(padrao_data, texto_completo):
-            dados_nota['data_pregao'] = datetime.strptime(match.group(1), '%d/%m/%Y')
-        else:
-            logger.debug("Data do pregão não encontrada.")
-
-        # Tentar extrair o número da nota
-        padrao_nota = r'Nr\. nota:\s*(\d+)'
-        if match := re.search(padrao_nota, texto_completo):
-            dados_nota['numero_nota'] = match.group(1)
-        else:
-            logger.debug("Número da nota não encontrado.")
-
-        # Extrair operações
-        padrao_operacao = r'(\d+)\s+(\d+)\s+([CV])\s+(VISTA|FRACIONARIO)\s+(\w+)\s+(\d+)\s+([\d.,]+)\s+([\d.,]+)'
-        for match in re.finditer(padrao_operacao, texto_completo):
-            _, _, tipo, mercado, ativo, quantidade, preco, valor = match.groups()
-            operacao = {
-                'tipo': 'Compra' if tipo == 'C' else 'Venda',
-                'ativo': ativo,
-                'quantidade': int(quantidade),
-                'preco': float(preco.replace('.', '').replace(',', '.')),
-                'valor': float(valor.replace('.', '').replace(',', '.')),
-                'mercado': mercado
-            }
-            dados_nota['operacoes'].append(operacao)
+    def extrair_notas(self, origem, corretora: str, workers: int = 1) -> List[Dict]:
+        """Divide o PDF em notas e extrai cada uma delas.
+
+        Com `workers` > 1, as páginas são extraídas em faixas e as notas interpretadas
+        em paralelo.
+        """
+        layout = self._obter_layout(corretora)
+        try:
+            if workers <= 1:
+                with closing(iterar_paginas(origem, self.backend)) as paginas:
+                    notas = [layout.extrair_paginas(segmento) for segmento in layout.segmentar(paginas)]
+            else:
+                notas = self._extrair_notas_em_paralelo(origem, corretora, workers)
+        except Exception as e:
+            raise ValueError(f"Erro ao abrir o arquivo PDF: {e}")
+
+        for dados_nota in notas:
+            self._registrar_log(dados_nota)
+        return notas
+
+    def _extrair_notas_em_paralelo(self, origem, corretora: str, workers: int) -> List[Dict]:
+        total_paginas = contar_paginas(origem, self.backend)
+        if total_paginas == 0:
+            return []
+        tamanho_faixa = -(-total_paginas // workers)
+        faixas = [(inicio, inicio + tamanho_faixa) for inicio in range(0, total_paginas, tamanho_faixa)]
+        origem = self._origem_serializavel(origem)
+
+        with _criar_pool(min(workers, len(faixas))) as executor:
+            partes = executor.map(
+                executar_com_metricas,
+                [_extrair_paginas_em_processo] * len(faixas),
+                *zip(*[(origem, self.backend, inicio, fim) for inicio, fim in faixas])
+            )
+            segmentos = list(LAYOUTS[corretora].segmentar(chain.from_iterable(map(resultado_com_metricas, partes))))
+            notas = executor.map(
+                executar_com_metricas,
+                [_extrair_segmento_em_processo] * len(segmentos), [corretora] * len(segmentos), segmentos
+            )
+            return list(map(resultado_com_metricas, notas))
+
+    @staticmethod
+    def _obter_layout(corretora: str):
+        if corretora not in LAYOUTS:
+            raise ValueError(f"Corretora {corretora} não suportada.")
+        return LAYOUTS[corretora]
 
+    @staticmethod
+    def _registrar_log(dados_nota: Dict) -> None:
+        # As mensagens incluem todas as operações: só são montadas com o nível DEBUG ativo
+        if not logger.isEnabledFor(logging.DEBUG):
+            return
         if not dados_nota['operacoes']:
             logger.debug("Nenhuma operação encontrada.")
 
-        # Extrair taxas
-        dados_nota['taxas'] = self._extrair_taxas(texto_completo)
-
         logger.debug(f"Número da nota extraído: {dados_nota['numero_nota']}")
         logger.debug(f"Data do pregão extraída: {dados_nota['data_pregao']}")
         logger.debug(f"Operações extraídas: {dados_nota['operacoes']}")
         logger.debug(f"Taxas extraídas: {dados_nota['taxas']}")
 
-        return dados_nota
-
-    def _extrair_taxas(self, texto: str) -> Dict:
-        """Extrai as taxas do texto completo da nota de corretagem."""
-        taxas = {
-            'Taxa de liquidação': r'Taxa de liquidação\s+([\d.,]+)',
-            'Taxa de registro': r'Taxa de Registro\s+([\d.,]+)',
-            'Emolumentos': r'Emolumentos\s+([\d.,]+)',
-            'Taxa operacional': r'Taxa Operacional\s+([\d.,]+)',
-            'Execução': r'Execução\s+([\d.,]+)',
-            'Taxa de custódia': r'Taxa de Custódia\s+([\d.,]+)',
-            'Impostos': r'Impostos\s+([\d.,]+)',
-            'IRRF': r'I.R.R.F. s/ operações\s+([\d.,]+)',
-            'Outros': r'Outros\s+([\d.,]+)'
-        }
-
-        taxas_extraidas = {}
-        for nome_taxa, padrao in taxas.items():
-            if match := re.search(padrao, texto):
-                valor = float(match.group(1).replace('.', '').replace(',', '.'))
-                taxas_extraidas[nome_taxa] = valor
-
-        return taxas_extraidas
\ No newline at end of file
+    @staticmethod
+    def _nome_arquivo(arquivo, indice: int) -> str:
+        if isinstance(arquivo, (str, os.PathLike)):
+            return os.path.basename(arquivo)
+        return getattr(arquivo, 'name', str(indice))
+
+    @staticmethod
+    def _origem_serializavel(arquivo):
+        if isinstance(arquivo, (str, os.PathLike, bytes)):
+            return arquivo
+        if hasattr(arquivo, 'getvalue'):
+            return arquivo.getvalue()
+        arquivo.seek(0)
+        return arquivo.read()
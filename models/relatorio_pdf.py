@@ -0,0 +1,110 @@
+"""Renderização do relatório em PDF (fpdf).
+
+Fica separada de `models.relatorios` para que o fpdf só seja importado quando um
+relatório é gerado, e não na inicialização do aplicativo.
+"""
+from typing import Dict, Iterable, Sequence, Tuple
+from fpdf import FPDF
+from utils.metricas import cronometrado
+
+ALTURA_LINHA = 6
+
+# (título, largura em mm, alinhamento, formato)
+COLUNAS_ATIVOS = [
+    ('Ativo', 30, 'L', '{}'),
+    ('Operações', 22, 'R', '{:d}'),
+    ('Qtd. comprada', 28, 'R', '{:,.0f}'),
+    ('Valor comprado', 36, 'R', 'R$ {:,.2f}'),
+    ('Qtd. vendida', 28, 'R', '{:,.0f}'),
+    ('Valor vendido', 36, 'R', 'R$ {:,.2f}'),
+]
+COLUNAS_APURACAO = [
+    ('Mês', 20, 'L', '{}'),
+    ('Categoria', 28, 'L', '{}'),
+    ('Vendas', 32, 'R', 'R$ {:,.2f}'),
+    ('Resultado', 32, 'R', 'R$ {:,.2f}'),
+    ('Prejuízo a comp.', 32, 'R', 'R$ {:,.2f}'),
+    ('Imposto', 36, 'R', 'R$ {:,.2f}'),
+]
+COLUNAS_OPERACOES = [
+    ('Data', 26, 'L', '{}'),
+    ('Ativo', 26, 'L', '{}'),
+    ('Tipo', 22, 'L', '{}'),
+    ('Quantidade', 30, 'R', '{:,.0f}'),
+    ('Preço', 32, 'R', 'R$ {:,.2f}'),
+    ('Valor', 44, 'R', 'R$ {:,.2f}'),
+]
+
+
+class RelatorioPDF(FPDF):
+    """Relatório em PDF com seções tabulares paginadas.
+
+    Cada tabela usa uma única fonte por seção e repete o cabeçalho das colunas a cada
+    nova página. As linhas podem vir de um gerador, de modo que os dados não precisam
+    estar todos carregados antes da renderização.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.set_auto_page_break(True, 15)
+        self._colunas_tabela = None
+
+    def header(self):
+        # Chamado pelo FPDF a cada nova página: repete o cabeçalho da tabela em andamento
+        if self._colunas_tabela:
+            self._desenhar_cabecalho_tabela()
+
+    def _desenhar_cabecalho_tabela(self):
+        self.set_font('Arial', 'B', 9)
+        for titulo, largura, alinhamento, _ in self._colunas_tabela:
+            self.cell(largura, ALTURA_LINHA, titulo, border='B', align=alinhamento)
+        self.ln()
+        self.set_font('Arial', '', 9)
+
+    def secao(self, titulo: str):
+        self._colunas_tabela = None
+        self.add_page()
+        self.set_font('Arial', 'B', 12)
+        self.cell(0, 10, titulo, ln=1)
+
+    def tabela(self, colunas: Sequence[Tuple[str, int, str, str]], linhas: Iterable[Sequence]) -> int:
+        """Escreve as linhas na tabela e retorna quantas foram escritas."""
+        self._colunas_tabela = colunas
+        self._desenhar_cabecalho_tabela()
+        formatos = [(largura, alinhamento, formato) for _, largura, alinhamento, formato in colunas]
+        total = 0
+        for linha in linhas:
+            for (largura, alinhamento, formato), valor in zip(formatos, linha):
+                self.cell(largura, ALTURA_LINHA, '' if valor is None else formato.format(valor), align=alinhamento)
+            self.ln()
+            total += 1
+        self._colunas_tabela = None
+        return total
+
+    @cronometrado('relatorio.gerar_relatorio')
+    def gerar_relatorio(self, dados: Dict, caminho: str) -> str:
+        """Gera o relatório em `caminho` e retorna o caminho.
+
+        `dados` tem 'resumo' (dicionário de valores), e opcionalmente 'ativos', 'apuracao'
+        e 'operacoes', iteráveis de linhas na ordem de COLUNAS_ATIVOS, COLUNAS_APURACAO
+        e COLUNAS_OPERACOES.
+        """
+        self.secao("Resumo do Período")
+        self.set_font('Arial', '', 10)
+        for item, valor in dados['resumo'].items():
+            self.cell(0, 8, f"{item.replace('_', ' ').title()}: R$ {valor or 0:,.2f}", ln=1)
+
+        if dados.get('ativos') is not None:
+            self.secao("Resumo por Ativo")
+            self.tabela(COLUNAS_ATIVOS, dados['ativos'])
+
+        if dados.get('apuracao') is not None:
+            self.secao("Apuração Mensal de Impostos")
+            self.tabela(COLUNAS_APURACAO, dados['apuracao'])
+
+        if dados.get('operacoes') is not None:
+            self.secao("Operações do Período")
+            self.tabela(COLUNAS_OPERACOES, dados['operacoes'])
+
+        self.output(caminho, 'F')
+        return caminho
@@ -1,41 +1,108 @@
-from fpdf import FPDF
-from typing import Dict
-
-class RelatorioPDF(FPDF):
-    def __init__(self):
-        super().__init__()
-
-    def gerar_relatorio(self, dados: Dict) -> bytes:
-        self.add_page()
-        self.set_font('Arial', 'B', 12)
-        self.cell(0, 10, "Resumo do Período", ln=True)
-
-        self.set_font('Arial', '', 10)
-        for item, valor in dados['resumo'].items():
-            self.cell(0, 8, f"{item.replace('_', ' ').title()}: R$ {valor:,.2f}", ln=True)
-
-        # Operações
-        self.add_page()
-        self.set_font('Arial', 'B', 12)
-        self.cell(0, 10, "Operações do Período", ln=True)
-
-        for op in dados['operacoes']:
-            self.set_font('Arial', '', 10)
-            texto = (f"{op['data']} - {op['tipo']} {op['quantidade']} "
-                     f"{op['codigo']} @ R$ {op['preco']:,.2f}")
-            self.cell(0, 8, texto, ln=True)
-
-        # Impostos
-        self.add_page()
-        self.set_font('Arial', 'B', 12)
-        self.cell(0, 10, "Impostos Devidos", ln=True)
-
-        for item, valor in dados['impostos'].items():
-            self.set_font('Arial', '', 10)
-            self.cell(0, 8, f"{item.replace('_', ' ').title()}: R$ {valor:,.2f}", ln=True)
+import logging
+import os
+import tempfile
+from typing import Callable, Iterable, List, Optional, Tuple
+from config.config import TAREFAS_DIR
+from utils.dinheiro import sql_reais
 
+logger = logging.getLogger(__name__)
+
+TAMANHO_BLOCO_RELATORIO = 5_000
+
+
+class GeradorRelatorios:
+    """Monta o relatório de um período a partir de dados já agregados no banco.
+
+    Resumo por ativo e apuração mensal vêm de GROUP BY e da tabela `apuracao_mensal`; as
+    operações, quando incluídas, são lidas em blocos durante a renderização.
+    """
+
+    def __init__(self, database, tamanho_bloco: int = TAMANHO_BLOCO_RELATORIO):
+        self.db = database
+        self.tamanho_bloco = tamanho_bloco
+
+    def gerar(self, data_inicio, data_fim, incluir_operacoes: bool = True,
+              progresso: Optional[Callable[[float, str], None]] = None, diretorio: str = TAREFAS_DIR) -> str:
+        """Gera o relatório em um arquivo novo dentro de `diretorio` e retorna o caminho.
+
+        O arquivo pertence a quem chama: na fila de tarefas, é removido junto com o
+        registro da tarefa. `progresso(fração, etapa)` é chamado a cada etapa e a cada
+        bloco de operações.
+        """
+        inicio, fim = str(data_inicio), str(data_fim)
+        periodo = (inicio, fim)
+        avisar = progresso or (lambda fracao, etapa: None)
+
+        avisar(0.0, "Agregando dados")
+        with self.db.leitura() as conn:
+            # Somas em centavos no SQLite, convertidas para reais só no resultado
+            totais = conn.execute(f'''
+                SELECT {sql_reais("SUM(CASE WHEN tipo = 'Compra' THEN valor ELSE 0 END)", 'compras')},
+                       {sql_reais("SUM(CASE WHEN tipo = 'Venda' THEN valor ELSE 0 END)", 'vendas')},
+                       COUNT(*)
+                FROM operacoes WHERE data >= ? AND data < date(?, '+1 day')
+            ''', periodo).fetchone()
+            ativos = conn.execute(f'''
+                SELECT a.codigo, COUNT(*),
+                       SUM(CASE WHEN o.tipo = 'Compra' THEN o.quantidade ELSE 0 END),
+                       {sql_reais("SUM(CASE WHEN o.tipo = 'Compra' THEN o.valor ELSE 0 END)", 'valor_compra')},
+                       SUM(CASE WHEN o.tipo = 'Venda' THEN o.quantidade ELSE 0 END),
+                       {sql_reais("SUM(CASE WHEN o.tipo = 'Venda' THEN o.valor ELSE 0 END)", 'valor_venda')}
+                FROM operacoes o
+                JOIN ativos a ON a.id = o.ativo_id
+                WHERE o.data >= ? AND o.data < date(?, '+1 day')
+                GROUP BY a.codigo
+                ORDER BY a.codigo
+            ''', periodo).fetchall()
+            apuracao = conn.execute(f'''
+                SELECT mes, categoria, {sql_reais('vendas', 'vendas')}, {sql_reais('resultado', 'resultado')},
+                       {sql_reais('prejuizo_acumulado', 'prejuizo_acumulado')}, {sql_reais('imposto', 'imposto')}
+                FROM apuracao_mensal
+                WHERE mes BETWEEN ? AND ?
+                ORDER BY mes, categoria
+            ''', (inicio[:7], fim[:7])).fetchall()
+
+        dados = {
+            'resumo': {
+                'total_compras': totais[0],
+                'total_vendas': totais[1],
+                'lucro_prejuizo': sum(linha[3] for linha in apuracao),
+                'imposto_devido': sum(linha[5] for linha in apuracao),
+            },
+            'ativos': ativos,
+            'apuracao': apuracao,
+            'operacoes': self._iterar_operacoes(periodo, totais[2], avisar) if incluir_operacoes else None,
+        }
+
+        os.makedirs(diretorio, exist_ok=True)
+        descritor, caminho = tempfile.mkstemp(prefix='relatorio_', suffix='.pdf', dir=os.path.abspath(diretorio))
+        os.close(descritor)
         try:
-            return self.output(dest='S').encode('latin1')
-        except Exception as e:
-            print(f"Erro ao gerar relatório PDF: {e}")
-            return b''
\ No newline at end of file
+            avisar(0.1, "Gerando PDF")
+            # Importado aqui: o fpdf só é carregado quando um relatório é gerado
+            from models.relatorio_pdf import RelatorioPDF
+            RelatorioPDF().gerar_relatorio(dados, caminho)
+        except Exception:
+            os.remove(caminho)
+            raise
+        logger.info(f"Relatório de {inicio} a {fim} gerado em {caminho}")
+        return caminho
+
+    def _iterar_operacoes(self, periodo: Tuple[str, str], quantidade: int,
+                          avisar: Callable[[float, str], None]) -> Iterable[List]:
+        with self.db.leitura() as conn:
+            cursor = conn.cursor()
+            cursor.row_factory = None
+            cursor.execute(f'''
+                SELECT date(o.data), a.codigo, o.tipo, o.quantidade, {sql_reais('o.preco', 'preco')},
+                       {sql_reais('o.valor', 'valor')}
+                FROM operacoes o
+                LEFT JOIN ativos a ON a.id = o.ativo_id
+                WHERE o.data >= ? AND o.data < date(?, '+1 day')
+                ORDER BY o.data, o.id
+            ''', periodo)
+            total = 0
+            while linhas := cursor.fetchmany(self.tamanho_bloco):
+                yield from linhas
+                total += len(linhas)
+                avisar(0.1 + 0.85 * total / max(quantidade, 1), f"Gerando PDF: {total} de {quantidade} operações")
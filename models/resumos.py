@@ -0,0 +1,144 @@
+import logging
+from datetime import date, timedelta
+from typing import Dict, List, Tuple
+import pandas as pd
+from utils.dinheiro import sql_reais
+
+logger = logging.getLogger(__name__)
+
+# Colunas somadas nas tabelas resumo_diario e resumo_mensal
+COLUNAS_RESUMO = ('qtd_compra', 'valor_compra', 'qtd_venda', 'valor_venda', 'corretagem', 'num_operacoes')
+# Colunas em centavos, convertidas para reais nas consultas
+COLUNAS_MONETARIAS_RESUMO = ('valor_compra', 'valor_venda', 'corretagem')
+
+
+def _somar_operacoes(operacoes: List[tuple], tamanho_periodo: int) -> Dict[Tuple, List]:
+    """Soma as operações por (ativo_id, período), onde o período são os primeiros caracteres da data."""
+    somas = {}
+    for ativo_id, tipo, quantidade, data, valor, corretagem in operacoes:
+        soma = somas.setdefault((ativo_id, data[:tamanho_periodo]), [0, 0, 0, 0, 0, 0])
+        if tipo == 'Compra':
+            soma[0] += quantidade
+            soma[1] += valor
+        else:
+            soma[2] += quantidade
+            soma[3] += valor
+        soma[4] += corretagem or 0
+        soma[5] += 1
+    return somas
+
+
+class Resumos:
+    """Totais de operações por ativo e dia (`resumo_diario`) e por ativo e mês (`resumo_mensal`).
+
+    As tabelas são atualizadas a cada operação registrada, na mesma transação, e permitem
+    agregar períodos sem ler as operações: meses inteiros vêm de `resumo_mensal` e só as
+    pontas do intervalo de `resumo_diario`. Os valores são somados em centavos inteiros.
+    """
+
+    def __init__(self, database):
+        self.db = database
+        resultado = self.db.execute_query('''
+            SELECT EXISTS (SELECT 1 FROM operacoes) AND NOT EXISTS (SELECT 1 FROM resumo_diario)
+        ''')
+        if resultado and resultado[0][0]:
+            logger.info("Resumos vazios: reconstruindo a partir das operações")
+            self.reconstruir()
+
+    def reconstruir(self) -> None:
+        """Refaz os resumos diário e mensal a partir de todas as operações."""
+        with self.db.transaction() as conn:
+            for tabela, coluna_periodo, periodo in (
+                ('resumo_diario', 'data', 'date(data)'),
+                ('resumo_mensal', 'mes', 'substr(date(data), 1, 7)'),
+            ):
+                conn.execute(f'DELETE FROM {tabela}')
+                conn.execute(f'''
+                    INSERT INTO {tabela} (ativo_id, {coluna_periodo}, {', '.join(COLUNAS_RESUMO)})
+                    SELECT ativo_id, {periodo},
+                           SUM(CASE WHEN tipo = 'Compra' THEN quantidade ELSE 0 END),
+                           SUM(CASE WHEN tipo = 'Compra' THEN valor ELSE 0 END),
+                           SUM(CASE WHEN tipo = 'Compra' THEN 0 ELSE quantidade END),
+                           SUM(CASE WHEN tipo = 'Compra' THEN 0 ELSE valor END),
+                           SUM(COALESCE(corretagem, 0)),
+                           COUNT(*)
+                    FROM operacoes
+                    WHERE ativo_id IS NOT NULL AND data IS NOT NULL
+                    GROUP BY ativo_id, {periodo}
+                ''')
+
+    def aplicar(self, conn, operacoes: List[tuple]) -> None:
+        """Soma operações recém-inseridas aos resumos, na transação aberta em `conn`.
+
+        Cada operação é uma tupla (ativo_id, tipo, quantidade, data, valor, corretagem).
+        """
+        for tabela, coluna_periodo, tamanho_periodo in (('resumo_diario', 'data', 10), ('resumo_mensal', 'mes', 7)):
+            somas = _somar_operacoes(operacoes, tamanho_periodo)
+            conn.executemany(f'''
+                INSERT INTO {tabela} (ativo_id, {coluna_periodo}, {', '.join(COLUNAS_RESUMO)})
+                VALUES (?, ?, {', '.join('?' * len(COLUNAS_RESUMO))})
+                ON CONFLICT (ativo_id, {coluna_periodo}) DO UPDATE SET
+                {', '.join(f'{coluna} = {coluna} + excluded.{coluna}' for coluna in COLUNAS_RESUMO)}
+            ''', [chave + tuple(soma) for chave, soma in somas.items()])
+
+    @staticmethod
+    def _dividir_periodo(data_inicio: date, data_fim: date):
+        """Divide [data_inicio, data_fim] em meses inteiros e as pontas em dias.
+
+        Retorna (primeiro mês inteiro, último mês inteiro) ou None se não houver mês inteiro.
+        """
+        primeiro = data_inicio if data_inicio.day == 1 else (data_inicio.replace(day=28) + timedelta(days=4)).replace(day=1)
+        dia_seguinte = data_fim + timedelta(days=1)
+        ultimo = data_fim if dia_seguinte.day == 1 else data_fim.replace(day=1) - timedelta(days=1)
+        if primeiro > ultimo:
+            return None
+        return primeiro, ultimo
+
+    def resumo_por_ativo(self, data_inicio, data_fim, em_centavos: bool = False) -> pd.DataFrame:
+        """Totais de compras e vendas por ativo no período, agregados no SQLite.
+
+        Com `em_centavos`, os valores não são convertidos para reais (para somar resultados
+        parciais de várias contas sem arredondamento).
+        """
+        data_inicio, data_fim = pd.Timestamp(data_inicio).date(), pd.Timestamp(data_fim).date()
+        meses = self._dividir_periodo(data_inicio, data_fim)
+        somas = ', '.join(
+            sql_reais(f'SUM({coluna})', coluna) if coluna in COLUNAS_MONETARIAS_RESUMO and not em_centavos
+            else f'SUM({coluna}) AS {coluna}'
+            for coluna in COLUNAS_RESUMO
+        )
+        colunas = ', '.join(COLUNAS_RESUMO)
+
+        if meses is None:
+            partes = [f'SELECT ativo_id, {colunas} FROM resumo_diario WHERE data BETWEEN ? AND ?']
+            params = [str(data_inicio), str(data_fim)]
+        else:
+            primeiro, ultimo = meses
+            partes = [
+                f'SELECT ativo_id, {colunas} FROM resumo_mensal WHERE mes BETWEEN ? AND ?',
+                f'SELECT ativo_id, {colunas} FROM resumo_diario WHERE data >= ? AND data < ?',
+                f'SELECT ativo_id, {colunas} FROM resumo_diario WHERE data > ? AND data <= ?',
+            ]
+            params = [
+                str(primeiro)[:7], str(ultimo)[:7],
+                str(data_inicio), str(primeiro),
+                str(ultimo), str(data_fim),
+            ]
+
+        return self.db.query_dataframe(f'''
+            SELECT a.codigo, {somas}
+            FROM ({' UNION ALL '.join(partes)}) r
+            JOIN ativos a ON a.id = r.ativo_id
+            GROUP BY a.codigo
+            ORDER BY a.codigo
+        ''', params=params)
+
+    def serie_diaria(self, data_inicio, data_fim) -> pd.DataFrame:
+        """Valor negociado (compras + vendas) por ativo e dia no período."""
+        return self.db.query_dataframe(f'''
+            SELECT a.codigo, r.data, {sql_reais('(r.valor_compra + r.valor_venda)', 'valor')}
+            FROM resumo_diario r
+            JOIN ativos a ON a.id = r.ativo_id
+            WHERE r.data BETWEEN ? AND ?
+            ORDER BY r.data
+        ''', params=(str(data_inicio), str(data_fim)), parse_dates=['data'])
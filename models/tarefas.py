@@ -0,0 +1,242 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+from config.config import TAREFAS_DB_PATH, TAREFAS_MANTIDAS, TAREFAS_WORKERS
+
+logger = logging.getLogger(__name__)
+
+PENDENTE = 'pendente'
+EXECUTANDO = 'executando'
+CONCLUIDA = 'concluida'
+ERRO = 'erro'
+CANCELADA = 'cancelada'
+STATUS_FINAIS = (CONCLUIDA, ERRO, CANCELADA)
+
+TABELA_TAREFAS = '''
+    CREATE TABLE IF NOT EXISTS tarefas (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        tipo TEXT NOT NULL,
+        status TEXT NOT NULL DEFAULT 'pendente',
+        parametros TEXT NOT NULL DEFAULT '{}',
+        progresso REAL NOT NULL DEFAULT 0,
+        mensagem TEXT,
+        resultado TEXT,
+        erro TEXT,
+        cancelar INTEGER NOT NULL DEFAULT 0,
+        criada_em TEXT NOT NULL,
+        iniciada_em TEXT,
+        concluida_em TEXT
+    )
+'''
+
+
+class TarefaCancelada(Exception):
+    """Levantada dentro de uma tarefa quando o cancelamento foi pedido."""
+
+
+class ContextoTarefa:
+    """Passado à função da tarefa para informar o progresso e verificar o cancelamento."""
+
+    def __init__(self, fila: 'FilaTarefas', id_tarefa: int):
+        self.fila = fila
+        self.id_tarefa = id_tarefa
+
+    def progresso(self, fracao: float, mensagem: Optional[str] = None) -> None:
+        """Registra o progresso (0 a 1) e levanta TarefaCancelada se o cancelamento foi pedido."""
+        with self.fila._lock, self.fila.conn:
+            self.fila.conn.execute(
+                'UPDATE tarefas SET progresso = ?, mensagem = COALESCE(?, mensagem) WHERE id = ?',
+                (min(max(fracao, 0.0), 1.0), mensagem, self.id_tarefa)
+            )
+            cancelar = self.fila.conn.execute('SELECT cancelar FROM tarefas WHERE id = ?', (self.id_tarefa,)).fetchone()
+        if cancelar and cancelar['cancelar']:
+            raise TarefaCancelada()
+
+    def verificar_cancelamento(self) -> None:
+        linha = self.fila.obter(self.id_tarefa)
+        if linha and linha['cancelar']:
+            raise TarefaCancelada()
+
+
+def _agora() -> str:
+    return datetime.now().isoformat(timespec='seconds')
+
+
+class FilaTarefas:
+    """Fila de tarefas em segundo plano guardada em SQLite e executada por threads.
+
+    As tarefas ficam em um banco próprio (`TAREFAS_DB_PATH`), para que as atualizações de
+    progresso não alterem a versão dos dados de investimentos nem invalidem o cache de
+    consultas. Como o estado está no banco, as tarefas sobrevivem aos reruns do
+    Streamlit; as que estavam em execução quando o processo terminou voltam para a fila.
+
+    Cada tipo de tarefa é uma função `funcao(parametros, contexto) -> resultado`, com
+    parâmetros e resultado serializáveis em JSON. A `limpeza(resultado)` opcional do tipo
+    apaga o que o resultado aponta (arquivos gerados) quando o registro é removido; só
+    as `manter` tarefas finalizadas mais recentes são guardadas.
+    """
+
+    def __init__(self, db_path: str = TAREFAS_DB_PATH, workers: int = TAREFAS_WORKERS,
+                 manter: int = TAREFAS_MANTIDAS):
+        self.db_path = db_path
+        if db_path != ':memory:' and os.path.dirname(db_path):
+            os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        if db_path != ':memory:':
+            self.conn.execute('PRAGMA journal_mode = WAL')
+        self._lock = threading.RLock()
+        self._nova_tarefa = threading.Condition(self._lock)
+        self._tipos: Dict[str, Callable] = {}
+        self._limpezas: Dict[str, Callable[[Dict], None]] = {}
+        self.manter = manter
+        self._encerrar = False
+
+        with self._lock, self.conn:
+            self.conn.execute(TABELA_TAREFAS)
+            self.conn.execute('CREATE INDEX IF NOT EXISTS idx_tarefas_status ON tarefas (status, id)')
+            self.conn.execute("UPDATE tarefas SET status = ?, iniciada_em = NULL WHERE status = ?", (PENDENTE, EXECUTANDO))
+
+        self._threads = [
+            threading.Thread(target=self._trabalhar, name=f'tarefas-{indice}', daemon=True)
+            for indice in range(workers)
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def _executar(self, query: str, params=()) -> List[sqlite3.Row]:
+        with self._lock, self.conn:
+            return self.conn.execute(query, params).fetchall()
+
+    def registrar_tipo(self, tipo: str, funcao: Callable[[Dict, ContextoTarefa], object],
+                       limpeza: Optional[Callable[[Dict], None]] = None) -> None:
+        with self._nova_tarefa:
+            self._tipos[tipo] = funcao
+            if limpeza is not None:
+                self._limpezas[tipo] = limpeza
+            self._nova_tarefa.notify_all()
+
+    def enviar(self, tipo: str, parametros: Optional[Dict] = None, substituir: bool = False) -> int:
+        """Coloca uma tarefa na fila e retorna o seu id.
+
+        Com `substituir`, as tarefas finalizadas do mesmo tipo e da mesma 'conta' são
+        removidas antes, com os seus arquivos.
+        """
+        if substituir:
+            self._remover("tipo = ? AND json_extract(parametros, '$.conta') IS ?",
+                          (tipo, (parametros or {}).get('conta')))
+        with self._nova_tarefa:
+            with self.conn:
+                cursor = self.conn.execute(
+                    'INSERT INTO tarefas (tipo, parametros, criada_em) VALUES (?, ?, ?)',
+                    (tipo, json.dumps(parametros or {}, default=str), _agora())
+                )
+            self._nova_tarefa.notify()
+        return cursor.lastrowid
+
+    def cancelar(self, id_tarefa: int) -> None:
+        """Cancela uma tarefa pendente; se já estiver em execução, pede que ela pare."""
+        self._executar('UPDATE tarefas SET status = ?, concluida_em = ? WHERE id = ? AND status = ?',
+                       (CANCELADA, _agora(), id_tarefa, PENDENTE))
+        self._executar('UPDATE tarefas SET cancelar = 1 WHERE id = ? AND status = ?', (id_tarefa, EXECUTANDO))
+
+    def remover(self, id_tarefa: int) -> None:
+        """Apaga uma tarefa finalizada e os arquivos do seu resultado."""
+        self._remover('id = ?', (id_tarefa,))
+
+    def purgar(self) -> None:
+        """Apaga as tarefas finalizadas além das `manter` mais recentes."""
+        self._remover('id NOT IN (SELECT id FROM tarefas WHERE status IN ({}) ORDER BY id DESC LIMIT ?)'.format(
+            ', '.join('?' * len(STATUS_FINAIS))), (*STATUS_FINAIS, self.manter))
+
+    def _remover(self, condicao: str, params=()) -> None:
+        finais = ', '.join('?' * len(STATUS_FINAIS))
+        with self._lock, self.conn:
+            linhas = self.conn.execute(f'SELECT * FROM tarefas WHERE status IN ({finais}) AND {condicao}',
+                                       (*STATUS_FINAIS, *params)).fetchall()
+            self.conn.executemany('DELETE FROM tarefas WHERE id = ?', [(linha['id'],) for linha in linhas])
+        for linha in linhas:
+            tarefa = self._como_dicionario(linha)
+            limpeza = self._limpezas.get(tarefa['tipo'])
+            if limpeza is None or tarefa['resultado'] is None:
+                continue
+            try:
+                limpeza(tarefa['resultado'])
+            except Exception:
+                logger.exception(f"Erro ao limpar o resultado da tarefa {tarefa['id']}")
+
+    def obter(self, id_tarefa: int) -> Optional[Dict]:
+        linhas = self._executar('SELECT * FROM tarefas WHERE id = ?', (id_tarefa,))
+        return self._como_dicionario(linhas[0]) if linhas else None
+
+    def listar(self, limite: int = 20, tipo: Optional[str] = None) -> List[Dict]:
+        """Retorna as tarefas mais recentes primeiro."""
+        if tipo is None:
+            linhas = self._executar('SELECT * FROM tarefas ORDER BY id DESC LIMIT ?', (limite,))
+        else:
+            linhas = self._executar('SELECT * FROM tarefas WHERE tipo = ? ORDER BY id DESC LIMIT ?', (tipo, limite))
+        return [self._como_dicionario(linha) for linha in linhas]
+
+    @staticmethod
+    def _como_dicionario(linha: sqlite3.Row) -> Dict:
+        tarefa = dict(linha)
+        tarefa['parametros'] = json.loads(tarefa['parametros'])
+        tarefa['resultado'] = json.loads(tarefa['resultado']) if tarefa['resultado'] is not None else None
+        return tarefa
+
+    def _reservar(self) -> Optional[sqlite3.Row]:
+        """Marca a tarefa pendente mais antiga de um tipo conhecido como em execução."""
+        if not self._tipos:
+            return None
+        tipos = list(self._tipos)
+        with self.conn:
+            linha = self.conn.execute(f'''
+                SELECT id, tipo, parametros FROM tarefas
+                WHERE status = ? AND tipo IN ({', '.join('?' * len(tipos))})
+                ORDER BY id LIMIT 1
+            ''', (PENDENTE, *tipos)).fetchone()
+            if linha is not None:
+                self.conn.execute('UPDATE tarefas SET status = ?, iniciada_em = ? WHERE id = ?',
+                                  (EXECUTANDO, _agora(), linha['id']))
+        return linha
+
+    def _trabalhar(self) -> None:
+        while True:
+            with self._nova_tarefa:
+                while not self._encerrar and (tarefa := self._reservar()) is None:
+                    self._nova_tarefa.wait()
+                if self._encerrar:
+                    return
+
+            contexto = ContextoTarefa(self, tarefa['id'])
+            try:
+                resultado = self._tipos[tarefa['tipo']](json.loads(tarefa['parametros']), contexto)
+            except TarefaCancelada:
+                self._finalizar(tarefa['id'], CANCELADA)
+            except Exception as e:
+                logger.exception(f"Erro na tarefa {tarefa['id']} ({tarefa['tipo']})")
+                self._finalizar(tarefa['id'], ERRO, erro=str(e))
+            else:
+                self._finalizar(tarefa['id'], CONCLUIDA, resultado=resultado)
+
+    def _finalizar(self, id_tarefa: int, status: str, resultado=None, erro: Optional[str] = None) -> None:
+        self._executar('''
+            UPDATE tarefas SET status = ?, resultado = ?, erro = ?, concluida_em = ?,
+                   progresso = CASE WHEN ? = 'concluida' THEN 1 ELSE progresso END
+            WHERE id = ?
+        ''', (status, json.dumps(resultado, default=str) if resultado is not None else None, erro, _agora(),
+              status, id_tarefa))
+        self.purgar()
+
+    def encerrar(self) -> None:
+        """Para as threads depois das tarefas em andamento; as pendentes continuam na fila."""
+        with self._nova_tarefa:
+            self._encerrar = True
+            self._nova_tarefa.notify_all()
+        for thread in self._threads:
+            thread.join()
+        self.conn.close()
@@ -0,0 +1,26 @@
+import pytest
+from utils.dinheiro import converter_centavos, converter_centavos_lote
+
+
+@pytest.mark.parametrize('texto, centavos', [
+    ('1.234,56', 123_456),
+    ('1.234.567,89', 123_456_789),
+    ('0,01', 1),
+    ('12,5', 1_250),
+    ('37', 3_700),
+    ('0,005', 1),
+    ('0,004', 0),
+    ('2,345', 235),
+])
+def test_converter_centavos(texto, centavos):
+    assert converter_centavos(texto) == centavos
+
+
+@pytest.mark.parametrize('textos', [
+    ['1.234,56', '0,01', '10,00'],
+    ['1.234,56', '0,005', '12,5'],
+    [],
+])
+def test_converter_centavos_lote_igual_ao_unitario(textos):
+    assert converter_centavos_lote(textos) == [converter_centavos(texto) for texto in textos]
+
@@ -0,0 +1,75 @@
+import pandas as pd
+import pytest
+from database.database import Database
+from models.eventos import TIPO_FRACAO, calcular_fracoes, fatores_acumulados
+from models.operacoes import Operacoes
+
+
+def _fatores(*eventos) -> pd.DataFrame:
+    """(ativo_id, data, fator) -> fatores acumulados."""
+    return fatores_acumulados(pd.DataFrame(eventos, columns=['ativo_id', 'data', 'fator']))
+
+
+def test_fracoes_de_grupamentos_seguidos():
+    operacoes = pd.DataFrame({
+        'ativo_id': [1, 1],
+        'tipo': ['Compra', 'Compra'],
+        # 200 e 101 ações antes de cada grupamento, já na base atual (fatores 1/3 * 1/2 e 1/2)
+        'quantidade': [200 / 6, 101 / 2],
+        'data': ['2024-01-10', '2024-04-10'],
+    })
+    fracoes = calcular_fracoes(operacoes, _fatores((1, '2024-03-05', 1 / 3), (1, '2024-05-05', 1 / 2)))
+
+    assert fracoes['tipo'].tolist() == [TIPO_FRACAO, TIPO_FRACAO]
+    assert fracoes['data'].tolist() == ['2024-03-05', '2024-05-05']
+    # 200 / 3 = 66 e 2/3 (1/3 na base atual); depois, (66 + 101) / 2 = 83 e 1/2
+    assert fracoes['quantidade'].tolist() == pytest.approx([1 / 3, 1 / 2])
+
+
+@pytest.fixture
+def operacoes():
+    db = Database(':memory:')
+    yield Operacoes(db)
+    db.close()
+
+
+def test_grupamento_com_fracao(operacoes):
+    assert operacoes.registrar_operacoes([
+        {'codigo': 'ABCD3', 'tipo': 'Compra', 'quantidade': 100, 'preco': 1_000, 'data': '2024-01-10'},
+        {'codigo': 'ABCD3', 'tipo': 'Compra', 'quantidade': 100, 'preco': 1_200, 'data': '2024-02-10'},
+    ])
+    assert operacoes.registrar_evento('ABCD3', 'GRUPAMENTO', '2024-03-05', 3)
+    assert operacoes.registrar_operacoes([
+        {'codigo': 'ABCD3', 'tipo': 'Venda', 'quantidade': 66, 'preco': 4_000, 'data': '2024-04-10'},
+    ])
+
+    with operacoes.db.leitura() as conn:
+        posicao = conn.execute('SELECT quantidade, custo_total, lucro_realizado FROM posicoes').fetchone()
+        mensais = conn.execute('SELECT mes, quantidade, custo_total FROM posicoes_mensais ORDER BY mes').fetchall()
+        resultado = conn.execute('SELECT SUM(resultado) FROM apuracao_mensal').fetchone()[0]
+
+    # A fração (2/3 de ação, R$ 22,00 de custo) sai da posição pelo custo, sem resultado
+    assert tuple(posicao) == (0, 0, 264_000 - 217_800)
+    assert [tuple(linha) for linha in mensais] == [
+        ('2024-01', 100, 100_000), ('2024-02', 200, 220_000), ('2024-03', 66, 217_800), ('2024-04', 0, 0)
+    ]
+    assert resultado == posicao['lucro_realizado']
+
+
+def test_proventos_somados_em_centavos(operacoes):
+    assert operacoes.registrar_operacoes([
+        {'codigo': 'ABCD3', 'tipo': 'Compra', 'quantidade': 300, 'preco': 1_000, 'data': '2024-01-10'},
+    ])
+    # Proventos por ação com mais de duas casas decimais
+    assert operacoes.registrar_evento('ABCD3', 'DIVIDENDO', '2024-02-01', 0.0123)
+    assert operacoes.registrar_evento('ABCD3', 'JCP', '2024-02-15', 0.4567)
+
+    rendimentos = operacoes.eventos.rendimentos()
+    assert rendimentos['valor'].tolist() == pytest.approx([0.0123, 0.4567])
+    # 300 * 1,23 = 369 centavos; 300 * 45,67 = 13.701 centavos, 85% = 11.645,85 -> 11.646
+    assert rendimentos['bruto'].tolist() == [3.69, 137.01]
+    assert rendimentos['liquido'].tolist() == [3.69, 116.46]
+
+    resumo = operacoes.eventos.resumo_mensal().set_index('mes')
+    assert resumo.loc['2024-02', ['dividendos', 'jcp', 'jcp_liquido']].tolist() == [3.69, 137.01, 116.46]
+    assert resumo.loc['2024-01', 'compras'] == 3_000.0
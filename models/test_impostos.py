@@ -0,0 +1,113 @@
+import pandas as pd
+import pytest
+from database.database import Database
+from models.impostos import apurar_mensal
+from models.operacoes import Operacoes
+
+
+def _operacoes(*linhas) -> pd.DataFrame:
+    """(ativo_id, tipo, quantidade, valor em centavos, data) -> DataFrame no formato de `apurar_mensal`."""
+    df = pd.DataFrame(linhas, columns=['ativo_id', 'tipo', 'quantidade', 'valor', 'data'])
+    return df.assign(corretagem=0)
+
+
+def _categoria(apuracao: pd.DataFrame, mes: str, categoria: str) -> pd.Series:
+    linhas = apuracao[(apuracao['mes'] == mes) & (apuracao['categoria'] == categoria)]
+    assert len(linhas) == 1
+    return linhas.iloc[0]
+
+
+@pytest.mark.parametrize('vendas, isento', [(2_000_000, True), (2_000_001, False)])
+def test_isencao_vendas_ate_20_mil(vendas, isento):
+    apuracao, _ = apurar_mensal(_operacoes(
+        (1, 'Compra', 100, 1_000_000, '2024-01-02'),
+        (1, 'Venda', 100, vendas, '2024-01-10'),
+    ))
+    swing = _categoria(apuracao, '2024-01', 'swing_trade')
+    assert swing['resultado'] == vendas - 1_000_000
+    assert bool(swing['isento']) is isento
+    assert swing['imposto'] == (0 if isento else round((vendas - 1_000_000) * 0.15))
+
+
+def test_day_trade_separado_do_swing_trade():
+    apuracao, posicoes = apurar_mensal(_operacoes(
+        (1, 'Compra', 100, 100_000, '2024-01-02'),
+        (1, 'Compra', 100, 200_000, '2024-01-05'),
+        (1, 'Venda', 150, 450_000, '2024-01-05'),
+    ))
+    # No dia 5: 100 em day trade (compra a R$ 20, venda a R$ 30); as 50 restantes saem da posição a R$ 10
+    day_trade = _categoria(apuracao, '2024-01', 'day_trade')
+    assert day_trade['vendas'] == 300_000
+    assert day_trade['resultado'] == 100_000
+    assert day_trade['imposto'] == 20_000
+    swing = _categoria(apuracao, '2024-01', 'swing_trade')
+    assert swing['vendas'] == 150_000
+    assert swing['resultado'] == 100_000
+    assert bool(swing['isento'])
+    assert posicoes['quantidade'].tolist() == [50]
+    assert posicoes['custo_total'].tolist() == [50_000]
+
+
+def test_prejuizo_compensado_nos_meses_seguintes():
+    apuracao, _ = apurar_mensal(_operacoes(
+        (1, 'Compra', 1000, 5_000_000, '2024-01-02'),
+        (1, 'Venda', 1000, 3_000_000, '2024-01-20'),
+        # Lucro isento não consome o prejuízo
+        (1, 'Compra', 100, 500_000, '2024-02-02'),
+        (1, 'Venda', 100, 1_000_000, '2024-02-20'),
+        (1, 'Compra', 1000, 3_000_000, '2024-03-02'),
+        (1, 'Venda', 1000, 6_000_000, '2024-03-20'),
+        (1, 'Compra', 1000, 3_000_000, '2024-04-02'),
+        (1, 'Venda', 1000, 5_500_000, '2024-04-20'),
+    ))
+    meses = apuracao[apuracao['categoria'] == 'swing_trade'].set_index('mes')
+    assert meses['prejuizo_acumulado'].tolist() == [2_000_000, 2_000_000, 0, 0]
+    assert meses['base_calculo'].tolist() == [0, 0, 1_000_000, 2_500_000]
+    assert meses['imposto'].tolist() == [0, 0, 150_000, 375_000]
+
+
+def test_prejuizo_inicial_por_categoria():
+    apuracao, _ = apurar_mensal(_operacoes(
+        (1, 'Compra', 100, 100_000, '2024-05-02'),
+        (1, 'Venda', 100, 160_000, '2024-05-02'),
+    ), prejuizos_iniciais={'day_trade': 40_000, 'swing_trade': 1_000_000})
+    day_trade = _categoria(apuracao, '2024-05', 'day_trade')
+    assert day_trade['base_calculo'] == 20_000
+    assert day_trade['prejuizo_acumulado'] == 0
+
+
+@pytest.fixture
+def operacoes():
+    db = Database(':memory:')
+    yield Operacoes(db)
+    db.close()
+
+
+def _gravado(operacoes: Operacoes):
+    with operacoes.db.leitura() as conn:
+        return (
+            pd.read_sql_query('SELECT * FROM apuracao_mensal ORDER BY mes, categoria', conn),
+            pd.read_sql_query('SELECT * FROM posicoes_mensais ORDER BY ativo_id, mes', conn),
+        )
+
+
+def test_atualizacao_incremental_igual_ao_recalculo(operacoes):
+    lotes = [
+        [{'codigo': 'PETR4', 'tipo': 'Compra', 'quantidade': 300, 'preco': 2_000, 'valor': 600_000, 'data': '2024-01-10'},
+         {'codigo': 'VALE3', 'tipo': 'Compra', 'quantidade': 100, 'preco': 7_000, 'valor': 700_000, 'data': '2024-01-15'}],
+        [{'codigo': 'PETR4', 'tipo': 'Venda', 'quantidade': 100, 'preco': 1_500, 'valor': 150_000, 'data': '2024-02-05'},
+         {'codigo': 'VALE3', 'tipo': 'Venda', 'quantidade': 100, 'preco': 7_500, 'valor': 750_000, 'data': '2024-02-05'},
+         {'codigo': 'VALE3', 'tipo': 'Compra', 'quantidade': 100, 'preco': 7_400, 'valor': 740_000, 'data': '2024-02-05'}],
+        [{'codigo': 'PETR4', 'tipo': 'Venda', 'quantidade': 200, 'preco': 16_000, 'valor': 3_200_000, 'data': '2024-04-01'}],
+        # Fora de ordem: refaz a apuração a partir de março
+        [{'codigo': 'VALE3', 'tipo': 'Venda', 'quantidade': 50, 'preco': 8_000, 'valor': 400_000, 'data': '2024-03-20'}],
+    ]
+    for lote in lotes:
+        assert operacoes.registrar_operacoes(lote)
+    incremental = _gravado(operacoes)
+
+    operacoes.apuracao.recalcular()
+    completo = _gravado(operacoes)
+    pd.testing.assert_frame_equal(incremental[0], completo[0])
+    pd.testing.assert_frame_equal(incremental[1], completo[1])
+    assert incremental[0]['mes'].unique().tolist() == ['2024-01', '2024-02', '2024-03', '2024-04']
@@ -0,0 +1,42 @@
+import pytest
+from database.database import Database
+from models.operacoes import Operacoes
+
+
+@pytest.fixture
+def operacoes():
+    db = Database(':memory:')
+    yield Operacoes(db)
+    db.close()
+
+
+def _nota(**campos) -> dict:
+    nota = {
+        'numero_nota': '123',
+        'corretora': 'XP',
+        'data_pregao': '2024-03-05',
+        'taxas': {'emolumentos': 30, 'liquidacao': 25},
+        'operacoes': [{'codigo': 'PETR4', 'tipo': 'Compra', 'quantidade': 100, 'preco': 3_500}],
+    }
+    return {**nota, **campos}
+
+
+def _contar(operacoes: Operacoes, tabela: str) -> int:
+    with operacoes.db.leitura() as conn:
+        return conn.execute(f'SELECT COUNT(*) FROM {tabela}').fetchone()[0]
+
+
+def test_nota_repetida_nao_duplica_operacoes(operacoes):
+    assert operacoes.registrar_nota(_nota()) is True
+    assert operacoes.registrar_nota(_nota()) is False
+    assert operacoes.registrar_nota(_nota(numero_nota='124')) is True
+    assert _contar(operacoes, 'notas_corretagem') == 2
+    assert _contar(operacoes, 'operacoes') == 2
+
+
+@pytest.mark.parametrize('campo', ['numero_nota', 'corretora', 'data_pregao'])
+def test_nota_sem_campo_da_chave_e_recusada(operacoes, campo):
+    with pytest.raises(ValueError, match=campo):
+        operacoes.registrar_nota(_nota(**{campo: None}))
+    assert _contar(operacoes, 'notas_corretagem') == 0
+    assert _contar(operacoes, 'operacoes') == 0
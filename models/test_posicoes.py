@@ -0,0 +1,120 @@
+import numpy as np
+import pandas as pd
+import pytest
+from database.database import Database
+from models.operacoes import Operacoes
+from models.posicoes import _custo_sequencial, calcular_custo_medio
+from utils.dinheiro import arredondar_centavos
+
+
+def _operacoes(*linhas) -> pd.DataFrame:
+    """(ativo_id, tipo, quantidade, valor em centavos) -> DataFrame no formato de `calcular_custo_medio`."""
+    df = pd.DataFrame(linhas, columns=['ativo_id', 'tipo', 'quantidade', 'valor'])
+    return df.assign(corretagem=0)
+
+
+def _sequencial(df: pd.DataFrame) -> np.ndarray:
+    compra = (df['tipo'] == 'Compra').to_numpy()
+    return _custo_sequencial(compra, df['quantidade'].to_numpy(dtype=np.float64),
+                             np.where(compra, -1.0, 1.0) * df['valor'].to_numpy(dtype=np.float64), df['ativo_id'].to_numpy())
+
+
+def test_ciclo_compra_venda_zerada_recompra():
+    df = _operacoes(
+        (1, 'Compra', 100, 100_000),
+        (1, 'Compra', 200, 260_000),
+        (1, 'Venda', 100, 150_000),
+        (1, 'Venda', 200, 200_000),
+        # Posição zerada: a recompra começa um novo preço médio
+        (1, 'Compra', 50, 75_000),
+        (1, 'Venda', 20, 40_000),
+        (2, 'Compra', 3, 1_000),
+        (2, 'Venda', 1, 500),
+    )
+    resultado = calcular_custo_medio(df)
+
+    assert resultado['quantidade_acumulada'].tolist() == [100, 300, 200, 0, 50, 30, 3, 2]
+    assert resultado['custo_acumulado'].tolist() == arredondar_centavos(_sequencial(df)).tolist()
+    assert resultado['custo_acumulado'].tolist() == [100_000, 360_000, 240_000, 0, 75_000, 45_000, 1_000, 667]
+    assert resultado['lucro'].tolist() == [0, 0, 30_000, -40_000, 0, 10_000, 0, 167]
+    assert resultado['preco_medio'].iloc[4] == 1_500
+
+
+def test_custo_conservado_em_historico_aleatorio():
+    rng = np.random.default_rng(7)
+    linhas, posicoes = [], {}
+    for ativo_id in np.sort(rng.integers(0, 5, 2_000)):
+        posicao = posicoes.get(ativo_id, 0)
+        if posicao and rng.random() < 0.45:
+            # Vende parte, às vezes tudo, sem ficar a descoberto
+            quantidade = posicao if rng.random() < 0.1 else int(rng.integers(1, posicao + 1))
+            linhas.append((ativo_id, 'Venda', quantidade, int(rng.integers(100, 1_000_000))))
+            posicoes[ativo_id] = posicao - quantidade
+        else:
+            quantidade = int(rng.integers(1, 20)) * 100
+            linhas.append((ativo_id, 'Compra', quantidade, int(rng.integers(100, 1_000_000))))
+            posicoes[ativo_id] = posicao + quantidade
+    df = _operacoes(*linhas)
+    resultado = calcular_custo_medio(df)
+
+    assert resultado['custo_acumulado'].tolist() == arredondar_centavos(_sequencial(df)).tolist()
+    # Lucros realizados + custo final = vendas - compras, ao centavo
+    for _, operacoes in resultado.groupby('ativo_id'):
+        fluxo = np.where(operacoes['tipo'] == 'Compra', -operacoes['valor'], operacoes['valor']).sum()
+        assert operacoes['lucro'].sum() == fluxo + operacoes['custo_acumulado'].iloc[-1]
+
+
+def test_venda_a_descoberto_recomprada_em_outro_dia():
+    df = _operacoes(
+        (1, 'Venda', 100, 120_000),
+        (1, 'Venda', 100, 100_000),
+        (1, 'Compra', 50, 50_000),
+        # Compra acima da posição vendida: zera e abre uma posição comprada com o excedente
+        (1, 'Compra', 250, 275_000),
+    )
+    resultado = calcular_custo_medio(df)
+
+    assert resultado['quantidade_acumulada'].tolist() == [-100, -200, -150, 100]
+    assert resultado['custo_acumulado'].tolist() == arredondar_centavos(_sequencial(df)).tolist()
+    assert resultado['custo_acumulado'].tolist() == [-120_000, -220_000, -165_000, 110_000]
+    assert resultado['lucro'].tolist() == [0, 0, 5_000, 0]
+    assert resultado['preco_medio'].tolist() == [1_200, 1_100, 1_100, 1_100]
+
+
+@pytest.fixture
+def operacoes():
+    db = Database(':memory:')
+    yield Operacoes(db)
+    db.close()
+
+
+def _posicao(operacoes: Operacoes):
+    with operacoes.db.leitura() as conn:
+        return tuple(conn.execute('SELECT quantidade, custo_total, lucro_realizado FROM posicoes').fetchone())
+
+
+@pytest.mark.parametrize('lotes', [
+    [[('Venda', 100, 1_200), ('Compra', 100, 1_100)]],
+    [[('Venda', 100, 1_200)], [('Compra', 100, 1_100)]],
+])
+def test_day_trade_com_venda_antes_da_compra(operacoes, lotes):
+    for lote in lotes:
+        assert operacoes.registrar_operacoes([
+            {'codigo': 'PETR4', 'tipo': tipo, 'quantidade': quantidade, 'preco': preco, 'data': '2024-03-05'}
+            for tipo, quantidade, preco in lote
+        ])
+    assert _posicao(operacoes) == (0, 0, 10_000)
+    operacoes.posicoes.reconstruir()
+    assert _posicao(operacoes) == (0, 0, 10_000)
+    with operacoes.db.leitura() as conn:
+        assert conn.execute('SELECT SUM(resultado) FROM apuracao_mensal').fetchone()[0] == 10_000
+
+
+def test_day_trade_sobre_posicao_existente(operacoes):
+    """A compra e a venda do dia se compensam; a posição anterior mantém o preço médio."""
+    assert operacoes.registrar_operacoes([
+        {'codigo': 'PETR4', 'tipo': 'Compra', 'quantidade': 100, 'preco': 1_000, 'data': '2024-03-01'},
+        {'codigo': 'PETR4', 'tipo': 'Venda', 'quantidade': 100, 'preco': 1_200, 'data': '2024-03-05'},
+        {'codigo': 'PETR4', 'tipo': 'Compra', 'quantidade': 100, 'preco': 1_100, 'data': '2024-03-05'},
+    ])
+    assert _posicao(operacoes) == (100, 100_000, 10_000)
@@ -0,0 +1,44 @@
+from datetime import date
+import pandas as pd
+import pytest
+from database.database import Database
+from models.operacoes import Operacoes
+from models.precos import COLUNAS_FECHAMENTOS, Precos, ProvedorPrecos
+
+
+class ProvedorFixo(ProvedorPrecos):
+    def __init__(self, linhas):
+        self.linhas = pd.DataFrame(linhas, columns=COLUNAS_FECHAMENTOS)
+
+    def obter_fechamentos(self, codigos, inicio, fim):
+        return self.linhas[self.linhas['codigo'].isin(codigos)]
+
+
+@pytest.fixture
+def operacoes():
+    db = Database(':memory:')
+    yield Operacoes(db)
+    db.close()
+
+
+def test_fechamentos_gravados_em_centavos(operacoes):
+    assert operacoes.registrar_operacoes([
+        {'codigo': 'PETR4', 'tipo': 'Compra', 'quantidade': 100, 'preco': 3_000, 'data': '2024-03-01'},
+    ])
+    # Fechamentos de fontes externas chegam como float, com resíduo binário
+    precos = Precos(operacoes.db, ProvedorFixo([
+        ('PETR4', '2024-03-01', 36.40999984741211),
+        ('PETR4', '2024-03-04', 37.369998931884766),
+    ]))
+    assert precos.atualizar(ate=date(2024, 3, 4)) == 2
+
+    with operacoes.db.leitura() as conn:
+        assert [tuple(linha) for linha in conn.execute('SELECT data, fechamento FROM precos ORDER BY data')] == [
+            ('2024-03-01', 3_641), ('2024-03-04', 3_737)
+        ]
+        assert conn.execute('SELECT ultimo_preco FROM ativos').fetchone()[0] == 3_737
+
+    avaliacao = precos.avaliar_carteira()
+    assert avaliacao[['ultimo_preco', 'valor_mercado', 'custo_total', 'resultado_nao_realizado']].iloc[0].tolist() == [
+        37.37, 3_737.0, 3_000.0, 737.0
+    ]
@@ -0,0 +1,41 @@
+import os
+import time
+import pytest
+from models.tarefas import STATUS_FINAIS, FilaTarefas
+
+
+@pytest.fixture
+def fila(tmp_path):
+    fila = FilaTarefas(':memory:', workers=1, manter=2)
+
+    def gerar(parametros, contexto):
+        caminho = tmp_path / f"{parametros['nome']}.pdf"
+        caminho.write_bytes(b'%PDF')
+        return {'caminho': str(caminho)}
+
+    fila.registrar_tipo('relatorio', gerar, limpeza=lambda resultado: os.remove(resultado['caminho']))
+    yield fila
+    fila.encerrar()
+
+
+def _concluir(fila: FilaTarefas, parametros: dict, substituir: bool = False) -> dict:
+    id_tarefa = fila.enviar('relatorio', parametros, substituir=substituir)
+    while (tarefa := fila.obter(id_tarefa))['status'] not in STATUS_FINAIS:
+        time.sleep(0.01)
+    return tarefa
+
+
+def test_arquivos_apagados_com_as_tarefas(fila, tmp_path):
+    tarefas = [_concluir(fila, {'nome': nome, 'conta': 'A'}) for nome in ('a', 'b', 'c')]
+    # Só as duas mais recentes ficam guardadas
+    assert [tarefa['id'] for tarefa in fila.listar()] == [tarefas[2]['id'], tarefas[1]['id']]
+    assert sorted(os.listdir(tmp_path)) == ['b.pdf', 'c.pdf']
+
+    fila.remover(tarefas[2]['id'])
+    assert sorted(os.listdir(tmp_path)) == ['b.pdf']
+
+    # Substituir só afeta a mesma conta
+    _concluir(fila, {'nome': 'd', 'conta': 'B'}, substituir=True)
+    assert sorted(os.listdir(tmp_path)) == ['b.pdf', 'd.pdf']
+    _concluir(fila, {'nome': 'e', 'conta': 'A'}, substituir=True)
+    assert sorted(os.listdir(tmp_path)) == ['d.pdf', 'e.pdf']
@@ -0,0 +1,99 @@
+import functools
+import logging
+import sys
+import threading
+from collections import OrderedDict
+import pandas as pd
+from config.config import CACHE_CONSULTAS_TAMANHO_MAXIMO
+
+logger = logging.getLogger(__name__)
+
+
+def estimar_tamanho(valor) -> int:
+    """Estima em bytes a memória ocupada por um resultado de consulta."""
+    if isinstance(valor, (pd.DataFrame, pd.Series)):
+        return int(valor.memory_usage(deep=True).sum())
+    if isinstance(valor, (list, tuple)):
+        return sys.getsizeof(valor) + sum(sys.getsizeof(item) for item in valor)
+    return sys.getsizeof(valor)
+
+
+class CacheConsultas:
+    """Cache LRU em memória de resultados de consulta, limitado pelo tamanho total.
+
+    Uma mesma instância é compartilhada por todas as sessões do Streamlit (ver
+    `cache_compartilhado`); o acesso é protegido por um lock.
+    """
+
+    def __init__(self, tamanho_maximo: int = CACHE_CONSULTAS_TAMANHO_MAXIMO):
+        self.tamanho_maximo = tamanho_maximo
+        self._entradas = OrderedDict()
+        self._tamanho_atual = 0
+        self._lock = threading.Lock()
+        self.acertos = 0
+        self.falhas = 0
+
+    def obter(self, chave):
+        """Retorna (encontrado, valor), marcando a entrada como usada recentemente."""
+        with self._lock:
+            try:
+                valor, _ = self._entradas[chave]
+            except KeyError:
+                self.falhas += 1
+                return False, None
+            self._entradas.move_to_end(chave)
+            self.acertos += 1
+            return True, valor
+
+    def salvar(self, chave, valor, tamanho: int = None) -> None:
+        """Guarda o valor; `tamanho` (bytes) substitui a estimativa para objetos que ela não mede bem."""
+        if tamanho is None:
+            tamanho = estimar_tamanho(valor)
+        if tamanho > self.tamanho_maximo:
+            return
+        with self._lock:
+            if chave in self._entradas:
+                self._tamanho_atual -= self._entradas.pop(chave)[1]
+            self._entradas[chave] = (valor, tamanho)
+            self._tamanho_atual += tamanho
+            while self._tamanho_atual > self.tamanho_maximo:
+                _, (_, tamanho_removido) = self._entradas.popitem(last=False)
+                self._tamanho_atual -= tamanho_removido
+
+    def limpar(self) -> None:
+        with self._lock:
+            self._entradas.clear()
+            self._tamanho_atual = 0
+
+    def __len__(self):
+        return len(self._entradas)
+
+
+cache_compartilhado = CacheConsultas()
+
+
+def em_cache(metodo):
+    """Guarda em `self.cache` o resultado de um método de leitura.
+
+    A chave reúne o método, os argumentos e `self.db.versao_dados`, de modo que qualquer
+    escrita no banco invalida os resultados anteriores. DataFrames são devolvidos como
+    cópia para que o chamador não altere a entrada em cache.
+    """
+    @functools.wraps(metodo)
+    def consultar(self, *args, **kwargs):
+        cache = getattr(self, 'cache', None)
+        if cache is None:
+            return metodo(self, *args, **kwargs)
+
+        chave = (metodo.__qualname__, args, tuple(sorted(kwargs.items())), self.db.versao_dados)
+        try:
+            encontrado, valor = cache.obter(chave)
+        except TypeError:
+            # Argumentos não hasheáveis: consulta sem cache
+            return metodo(self, *args, **kwargs)
+        if not encontrado:
+            valor = metodo(self, *args, **kwargs)
+            cache.salvar(chave, valor)
+        return valor.copy() if isinstance(valor, pd.DataFrame) else valor
+
+    return consultar
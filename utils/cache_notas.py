@@ -0,0 +1,88 @@
+import logging
+import os
+import pickle
+from config.config import CACHE_NOTAS_DIR, CACHE_NOTAS_TAMANHO_MAXIMO
+
+logger = logging.getLogger(__name__)
+
+class CacheNotas:
+    """Cache em disco das notas já processadas, endereçado pelo conteúdo do PDF.
+
+    Cada entrada é um arquivo com o `dados_nota` serializado. O horário de modificação
+    do arquivo é atualizado a cada leitura, e as entradas menos usadas recentemente são
+    removidas quando o tamanho total ultrapassa `tamanho_maximo`.
+    """
+
+    EXTENSAO = '.pkl'
+
+    def __init__(self, diretorio: str = CACHE_NOTAS_DIR, tamanho_maximo: int = CACHE_NOTAS_TAMANHO_MAXIMO):
+        self.diretorio = diretorio
+        self.tamanho_maximo = tamanho_maximo
+        os.makedirs(self.diretorio, exist_ok=True)
+        self._tamanho_atual = sum(tamanho for _, _, tamanho in self._listar_entradas())
+
+    @staticmethod
+    def gerar_chave(hash_conteudo: str, corretora: str, versao=1) -> str:
+        """Gera a chave da entrada a partir do hash do PDF, da corretora e da versão do parser."""
+        return f"{hash_conteudo}_{corretora}_v{versao}"
+
+    def obter(self, chave: str):
+        """Retorna o valor em cache (nota ou lista de notas) ou None."""
+        caminho = self._caminho(chave)
+        try:
+            with open(caminho, 'rb') as arquivo:
+                dados_nota = pickle.load(arquivo)
+            os.utime(caminho)
+            return dados_nota
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            logger.warning(f"Entrada de cache inválida {chave}: {e}")
+            self._remover(caminho)
+            return None
+
+    def salvar(self, chave: str, dados_nota) -> None:
+        """Grava os dados da nota no cache, removendo as entradas antigas se necessário."""
+        caminho = self._caminho(chave)
+        temporario = f"{caminho}.{os.getpid()}.tmp"
+        try:
+            with open(temporario, 'wb') as arquivo:
+                pickle.dump(dados_nota, arquivo, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(temporario, caminho)
+        except Exception as e:
+            logger.error(f"Erro ao gravar cache da nota: {e}")
+            self._remover(temporario)
+            return
+
+        self._tamanho_atual += os.path.getsize(caminho)
+        if self._tamanho_atual > self.tamanho_maximo:
+            self._remover_excedente()
+
+    def _remover_excedente(self) -> None:
+        entradas = sorted(self._listar_entradas())
+        self._tamanho_atual = sum(tamanho for _, _, tamanho in entradas)
+        for _, caminho, tamanho in entradas:
+            if self._tamanho_atual <= self.tamanho_maximo:
+                break
+            self._remover(caminho)
+            self._tamanho_atual -= tamanho
+
+    def _listar_entradas(self):
+        """Lista (horário de acesso, caminho, tamanho) de cada entrada."""
+        entradas = []
+        with os.scandir(self.diretorio) as itens:
+            for item in itens:
+                if item.name.endswith(self.EXTENSAO):
+                    estado = item.stat()
+                    entradas.append((estado.st_mtime, item.path, estado.st_size))
+        return entradas
+
+    def _caminho(self, chave: str) -> str:
+        return os.path.join(self.diretorio, chave + self.EXTENSAO)
+
+    @staticmethod
+    def _remover(caminho: str) -> None:
+        try:
+            os.remove(caminho)
+        except OSError:
+            pass
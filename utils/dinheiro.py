@@ -0,0 +1,59 @@
+"""Valores monetários em centavos inteiros.
+
+Preços, valores e taxas são lidos das notas direto para centavos (int), gravados em
+colunas INTEGER e somados em int64, sem erro de arredondamento binário. A conversão
+para reais (float) acontece só na saída: consultas exibidas, relatórios e exportação.
+"""
+from typing import List, Sequence
+import numpy as np
+
+CENTAVOS_POR_REAL = 100
+TOLERANCIA_ARREDONDAMENTO = 1e-6
+
+
+def converter_centavos(texto: str) -> int:
+    """Converte um número no formato brasileiro (1.234,56) para centavos, sem passar por float.
+
+    Casas decimais além da segunda são arredondadas (meio para cima).
+    """
+    inteiro, _, decimais = texto.replace('.', '').partition(',')
+    if len(decimais) == 2:
+        return int(inteiro + decimais)
+    if len(decimais) < 2:
+        return int(inteiro or 0) * CENTAVOS_POR_REAL + int(decimais.ljust(2, '0'))
+    centavos = int(inteiro + decimais[:2])
+    return centavos + (decimais[2] >= '5')
+
+
+def converter_centavos_lote(textos: Sequence[str]) -> List[int]:
+    """Converte uma coluna de números no formato brasileiro para centavos de uma só vez.
+
+    No caso comum (todos com duas casas decimais), a coluna é unida em um único texto e
+    convertida pelo numpy; senão, cada número passa por `converter_centavos`.
+    """
+    if all(texto[-3:-2] == ',' for texto in textos):
+        return np.fromstring(' '.join(textos).replace('.', '').replace(',', ''), dtype=np.int64, sep=' ').tolist()
+    return [converter_centavos(texto) for texto in textos]
+
+
+def para_centavos(reais) -> int:
+    """Converte reais (float, digitados ou de fontes externas) para centavos."""
+    return int(round(reais * CENTAVOS_POR_REAL))
+
+
+def para_reais(centavos) -> float:
+    return centavos / CENTAVOS_POR_REAL
+
+
+def sql_reais(expressao: str, nome: str) -> str:
+    """Trecho de SELECT que converte uma coluna (ou soma) em centavos para reais."""
+    return f'{expressao} / {CENTAVOS_POR_REAL}.0 AS {nome}'
+
+
+def arredondar_centavos(valores):
+    """Arredonda valores fracionários de centavos (ex.: custo proporcional) para int64, meio para cima.
+
+    A tolerância absorve o erro de ponto flutuante nos empates (10,4999999 centavos vira 11),
+    para que caminhos de cálculo diferentes arredondem o mesmo valor da mesma forma.
+    """
+    return np.floor(np.asarray(valores, dtype=np.float64) + (0.5 + TOLERANCIA_ARREDONDAMENTO)).astype(np.int64)
@@ -0,0 +1,236 @@
+import cProfile
+import functools
+import io
+import json
+import logging
+import pstats
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Dict, Optional
+import numpy as np
+from config.config import METRICAS_AMOSTRAS, METRICAS_ATIVAS
+
+logger = logging.getLogger(__name__)
+
+
+class _Medicao:
+    """Mede a duração de um bloco `with`; `bytes` pode ser ajustado dentro do bloco."""
+
+    __slots__ = ('metricas', 'nome', 'bytes', 'inicio')
+
+    def __init__(self, metricas: 'Metricas', nome: str, bytes: int):
+        self.metricas = metricas
+        self.nome = nome
+        self.bytes = bytes
+
+    def __enter__(self):
+        self.inicio = time.perf_counter()
+        return self
+
+    def __exit__(self, *excecao):
+        self.metricas.registrar(self.nome, time.perf_counter() - self.inicio, self.bytes)
+        return False
+
+
+class _MedicaoNula:
+    """Usada quando as métricas estão desativadas: não mede nada."""
+
+    __slots__ = ('bytes',)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *excecao):
+        return False
+
+
+_MEDICAO_NULA = _MedicaoNula()
+
+
+class Metricas:
+    """Tempos e contadores dos pontos críticos (extração de PDF, parsers, SQLite, relatórios).
+
+    Desativadas, `medir` devolve um objeto compartilhado que não faz nada e `cronometrado`
+    só verifica `ativo` antes de chamar a função. Ativadas, cada métrica guarda contagem,
+    tempo total, bytes processados e as últimas `amostras` durações para os percentis.
+
+    Os valores são do processo atual; os processos do pool de extração devolvem suas
+    amostras junto com o resultado (`retirar_amostras` / `incorporar`).
+    """
+
+    def __init__(self, ativo: bool = METRICAS_ATIVAS, amostras: int = METRICAS_AMOSTRAS):
+        self.ativo = ativo
+        self.amostras = amostras
+        self._tempos: Dict[str, Dict] = {}
+        self._contadores: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def medir(self, nome: str, bytes: int = 0):
+        """Context manager que registra a duração do bloco em `nome`."""
+        if not self.ativo:
+            return _MEDICAO_NULA
+        return _Medicao(self, nome, bytes)
+
+    def registrar(self, nome: str, duracao: float, bytes: int = 0) -> None:
+        with self._lock:
+            metrica = self._tempos.get(nome)
+            if metrica is None:
+                metrica = self._tempos[nome] = {
+                    'contagem': 0, 'total': 0.0, 'bytes': 0, 'duracoes': deque(maxlen=self.amostras)
+                }
+            metrica['contagem'] += 1
+            metrica['total'] += duracao
+            metrica['bytes'] += bytes
+            metrica['duracoes'].append(duracao)
+
+    def contar(self, nome: str, quantidade: int = 1) -> None:
+        if not self.ativo:
+            return
+        with self._lock:
+            self._contadores[nome] = self._contadores.get(nome, 0) + quantidade
+
+    def resumo(self) -> Dict:
+        """Retorna {'tempos': {nome: estatísticas em ms}, 'contadores': {nome: valor}}."""
+        with self._lock:
+            tempos = {nome: (dict(metrica), np.array(metrica['duracoes'])) for nome, metrica in self._tempos.items()}
+            contadores = dict(self._contadores)
+
+        estatisticas = {}
+        for nome, (metrica, duracoes) in sorted(tempos.items()):
+            p50, p95 = np.percentile(duracoes, [50, 95]) * 1000 if len(duracoes) else (0.0, 0.0)
+            estatisticas[nome] = {
+                'contagem': metrica['contagem'],
+                'total_ms': metrica['total'] * 1000,
+                'media_ms': metrica['total'] * 1000 / metrica['contagem'],
+                'p50_ms': float(p50),
+                'p95_ms': float(p95),
+                'max_ms': float(duracoes.max() * 1000) if len(duracoes) else 0.0,
+                'bytes': metrica['bytes'],
+            }
+        return {'tempos': estatisticas, 'contadores': contadores}
+
+    def exportar_json(self, caminho: Optional[str] = None) -> str:
+        """Retorna o resumo em JSON e, se `caminho` for informado, grava-o no arquivo."""
+        conteudo = json.dumps(self.resumo(), ensure_ascii=False, indent=2)
+        if caminho:
+            with open(caminho, 'w', encoding='utf-8') as arquivo:
+                arquivo.write(conteudo)
+        return conteudo
+
+    def retirar_amostras(self) -> Optional[Dict]:
+        """Retorna e zera as amostras coletadas, para enviá-las de um processo a outro."""
+        if not self.ativo:
+            return None
+        with self._lock:
+            amostras = {
+                'tempos': {nome: {**metrica, 'duracoes': list(metrica['duracoes'])} for nome, metrica in self._tempos.items()},
+                'contadores': self._contadores,
+            }
+            self._tempos = {}
+            self._contadores = {}
+        return amostras
+
+    def incorporar(self, amostras: Optional[Dict]) -> None:
+        """Soma as amostras vindas de outro processo."""
+        if not amostras or not self.ativo:
+            return
+        with self._lock:
+            for nome, outra in amostras['tempos'].items():
+                metrica = self._tempos.get(nome)
+                if metrica is None:
+                    metrica = self._tempos[nome] = {
+                        'contagem': 0, 'total': 0.0, 'bytes': 0, 'duracoes': deque(maxlen=self.amostras)
+                    }
+                metrica['contagem'] += outra['contagem']
+                metrica['total'] += outra['total']
+                metrica['bytes'] += outra['bytes']
+                metrica['duracoes'].extend(outra['duracoes'])
+            for nome, valor in amostras['contadores'].items():
+                self._contadores[nome] = self._contadores.get(nome, 0) + valor
+
+    def limpar(self) -> None:
+        with self._lock:
+            self._tempos = {}
+            self._contadores = {}
+
+
+metricas = Metricas()
+
+
+def cronometrado(nome: Optional[str] = None):
+    """Decorador que registra em `metricas` a duração de cada chamada (padrão: nome qualificado)."""
+    def decorador(funcao):
+        rotulo = nome or funcao.__qualname__
+
+        @functools.wraps(funcao)
+        def executar(*args, **kwargs):
+            if not metricas.ativo:
+                return funcao(*args, **kwargs)
+            inicio = time.perf_counter()
+            try:
+                return funcao(*args, **kwargs)
+            finally:
+                metricas.registrar(rotulo, time.perf_counter() - inicio)
+
+        return executar
+
+    return decorador
+
+
+def iniciar_processo_metricas(ativo: bool) -> None:
+    """Initializer dos processos do pool: repete neles o estado das métricas do processo pai."""
+    metricas.ativo = ativo
+
+
+def executar_com_metricas(funcao, *args):
+    """Executa `funcao` em um processo do pool e devolve (resultado, amostras de métricas).
+
+    Amostras anteriores do processo (de tarefas já executadas por ele) são descartadas
+    antes da execução.
+    """
+    metricas.retirar_amostras()
+    return funcao(*args), metricas.retirar_amostras()
+
+
+def resultado_com_metricas(par):
+    """Incorpora as amostras de `executar_com_metricas` e devolve só o resultado."""
+    resultado, amostras = par
+    metricas.incorporar(amostras)
+    return resultado
+
+
+@contextmanager
+def perfilar(caminho: Optional[str] = None, linhas: int = 30):
+    """Captura um perfil cProfile do bloco; grava em `caminho` (formato pstats) e loga as funções mais caras.
+
+    Só o processo atual é perfilado: para incluir a extração dos PDFs, use um único worker.
+    """
+    perfil = cProfile.Profile()
+    perfil.enable()
+    try:
+        yield perfil
+    finally:
+        perfil.disable()
+        if caminho:
+            perfil.dump_stats(caminho)
+        saida = io.StringIO()
+        pstats.Stats(perfil, stream=saida).sort_stats('cumulative').print_stats(linhas)
+        logger.info(f"Perfil da execução:\n{saida.getvalue()}")
+
+
+@contextmanager
+def medir_etapa(tempos: Dict[str, float], nome: str):
+    """Guarda em `tempos[nome]` a duração do bloco em segundos, com as métricas ativas ou não.
+
+    Usado na medição da inicialização; com as métricas ativas, a duração também é
+    registrada em `inicializacao.<nome>`.
+    """
+    inicio = time.perf_counter()
+    try:
+        yield
+    finally:
+        tempos[nome] = time.perf_counter() - inicio
+        if metricas.ativo:
+            metricas.registrar(f'inicializacao.{nome}', tempos[nome])